@@ -0,0 +1,79 @@
+"""
+已驗證使用者快取
+
+get_current_user 每個請求都要以 JWT 的 sub 查詢 users 表。此處以 token 為鍵，
+短時間快取不可變的 Principal，命中時不需再查詢資料庫。
+使用者資料更新、停權或修改密碼時需呼叫 invalidate_user()。
+快取只存在於目前行程，其他 worker 在 TTL 到期後才會讀到新資料。
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from .config import settings
+from .principal import Principal
+
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class AuthenticatedUserCache:
+    """以 token 為鍵的 Principal LRU 快取"""
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries or settings.AUTH_CACHE_MAX_ENTRIES
+        self._entries: "OrderedDict[str, Tuple[float, Principal]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[Principal]:
+        if settings.AUTH_CACHE_TTL_SECONDS <= 0:
+            return None
+        key = _token_key(token)
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, principal = item
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return principal
+
+    def set(self, token: str, principal: Principal, token_exp: Optional[float] = None) -> None:
+        """
+        快取已驗證的 Principal
+
+        Args:
+            token_exp: JWT 的 exp（Unix 時間），快取不會超過 token 本身的有效期限
+        """
+        ttl = settings.AUTH_CACHE_TTL_SECONDS
+        if token_exp is not None:
+            ttl = min(ttl, token_exp - time.time())
+        if ttl <= 0:
+            return
+
+        key = _token_key(token)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, principal)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """移除某位使用者所有 token 的快取"""
+        with self._lock:
+            for key in [key for key, (_, principal) in self._entries.items() if principal.id == user_id]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# 全局已驗證使用者快取
+authenticated_user_cache = AuthenticatedUserCache()
@@ -1,7 +1,9 @@
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from .config import settings
+from .db_pool import instrument_pool, pool_options
 
 # 創建SQLAlchemy引擎
 # 確保使用 psycopg 驅動
@@ -10,16 +12,34 @@ if database_url.startswith("postgresql://"):
     database_url = database_url.replace("postgresql://", "postgresql+psycopg://", 1)
 
 # 連線到 PgBouncer（交易模式）時，server‑side prepared statements 會在連線被重用時失效，
-# 因此關閉 prepared statements 並預先檢測連線健康度。
+# 因此關閉 prepared statements。連線池大小、recycle、pre-ping 與是否改用 NullPool 由 settings 設定。
 engine = create_engine(
     database_url,
     connect_args={"prepare_threshold": 0},  # 關閉 server-side prepared statements
-    pool_pre_ping=True,
+    **pool_options(),
 )
+instrument_pool(engine.pool, "sync")
 
 # 創建SessionLocal類
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 非同步引擎：同一個 psycopg 驅動，create_async_engine 會自動使用其 async 版本。
+# 高流量的讀取路由使用此引擎，查詢等待期間不會阻塞事件迴圈。
+async_engine = create_async_engine(
+    database_url,
+    connect_args={"prepare_threshold": 0},  # 與同步引擎相同，相容 PgBouncer 交易模式
+    **pool_options(is_async=True),
+)
+instrument_pool(async_engine.sync_engine.pool, "async")
+
+# expire_on_commit=False：提交後仍可讀取物件屬性，避免在 async 環境觸發隱式延遲載入
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
 # 創建Base類，所有模型將繼承此類
 Base = declarative_base()
 
@@ -31,6 +51,12 @@ def get_db():
     finally:
         db.close()
 
+# 獲取非同步數據庫會話
+# 既有以同步 Session 撰寫的服務可透過 `await db.run_sync(func, *args)` 重用
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 # 創建所有表格
 def create_tables():
     Base.metadata.create_all(bind=engine) 
@@ -0,0 +1,184 @@
+"""
+資料庫連線池設定與統計
+
+依 settings 組出 create_engine / create_async_engine 的連線池參數，並記錄：
+- 取得連線的等待時間（含逾時次數），用於判斷交班尖峰時是否耗盡連線池
+- 目前借出數量與飽和度（借出數 / (pool_size + max_overflow)）
+- 連線流動（新建、關閉、失效次數），用於評估 recycle 與 NullPool 設定
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+
+from .config import settings
+
+
+class PoolMetrics:
+    """單一引擎的連線池統計"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.pool = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "checkouts": 0,
+            "checkins": 0,
+            "connects": 0,
+            "closes": 0,
+            "invalidations": 0,
+            "timeouts": 0,
+            "wait_total_ms": 0.0,
+            "wait_max_ms": 0.0,
+        }
+        self._checked_out = 0
+        self._checked_out_max = 0
+
+    def _incr(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def record_wait(self, wait_ms: float, timed_out: bool = False) -> None:
+        with self._lock:
+            self._stats["wait_total_ms"] += wait_ms
+            self._stats["wait_max_ms"] = max(self._stats["wait_max_ms"], wait_ms)
+            if timed_out:
+                self._stats["timeouts"] += 1
+
+    def attach(self, pool) -> None:
+        """在連線池上註冊事件監聽"""
+        self.pool = pool
+
+        @event.listens_for(pool, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            self._incr("connects")
+
+        @event.listens_for(pool, "close")
+        def on_close(dbapi_connection, connection_record):
+            self._incr("closes")
+
+        @event.listens_for(pool, "invalidate")
+        def on_invalidate(dbapi_connection, connection_record, exception):
+            self._incr("invalidations")
+
+        @event.listens_for(pool, "checkout")
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            with self._lock:
+                self._stats["checkouts"] += 1
+                self._checked_out += 1
+                self._checked_out_max = max(self._checked_out_max, self._checked_out)
+
+        @event.listens_for(pool, "checkin")
+        def on_checkin(dbapi_connection, connection_record):
+            with self._lock:
+                self._stats["checkins"] += 1
+                self._checked_out = max(self._checked_out - 1, 0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            checked_out = self._checked_out
+            checked_out_max = self._checked_out_max
+
+        # NullPool 或不限 overflow（-1）時沒有固定上限
+        capacity: Optional[int] = None
+        if isinstance(self.pool, QueuePool) and settings.DB_MAX_OVERFLOW >= 0:
+            capacity = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+
+        checkouts = stats["checkouts"]
+        return {
+            "pool_class": type(self.pool).__name__ if self.pool is not None else None,
+            "capacity": capacity,
+            "checked_out": checked_out,
+            "checked_out_max": checked_out_max,
+            "saturation": round(checked_out / capacity, 3) if capacity else None,
+            "status": self.pool.status() if self.pool is not None else None,
+            **{key: round(value, 2) if isinstance(value, float) else value for key, value in stats.items()},
+            "wait_avg_ms": round(stats["wait_total_ms"] / checkouts, 2) if checkouts else 0.0,
+        }
+
+
+def _timed_do_get(pool_class):
+    """建立在 _do_get（自連線池取得連線）前後計時的連線池類別"""
+
+    class TimedPool(pool_class):
+        def _do_get(self):
+            metrics: Optional[PoolMetrics] = getattr(self, "_pool_metrics", None)
+            started_at = time.perf_counter()
+            try:
+                connection = super()._do_get()
+            except PoolTimeoutError:
+                if metrics is not None:
+                    metrics.record_wait((time.perf_counter() - started_at) * 1000, timed_out=True)
+                raise
+            if metrics is not None:
+                metrics.record_wait((time.perf_counter() - started_at) * 1000)
+            return connection
+
+        def recreate(self):
+            # dispose() 會以 recreate 建立新連線池（事件監聽會一併沿用），統計也沿用同一組
+            pool = super().recreate()
+            metrics = getattr(self, "_pool_metrics", None)
+            if metrics is not None:
+                pool._pool_metrics = metrics
+                metrics.pool = pool
+            return pool
+
+    TimedPool.__name__ = f"Timed{pool_class.__name__}"
+    return TimedPool
+
+
+TimedQueuePool = _timed_do_get(QueuePool)
+TimedAsyncAdaptedQueuePool = _timed_do_get(AsyncAdaptedQueuePool)
+TimedNullPool = _timed_do_get(NullPool)
+
+
+def pool_options(is_async: bool = False) -> Dict[str, Any]:
+    """依設定組出引擎的連線池參數"""
+    options: Dict[str, Any] = {"pool_pre_ping": settings.DB_POOL_PRE_PING}
+    if settings.DB_USE_NULL_POOL:
+        # PgBouncer 交易模式：由 PgBouncer 管理連線，應用端不保留連線
+        options["poolclass"] = TimedNullPool
+        return options
+
+    options.update(
+        poolclass=TimedAsyncAdaptedQueuePool if is_async else TimedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_use_lifo=settings.DB_POOL_USE_LIFO,
+    )
+    return options
+
+
+# 各引擎的連線池統計（sync / async）
+pool_metrics: Dict[str, PoolMetrics] = {}
+
+
+def instrument_pool(pool, name: str) -> PoolMetrics:
+    """為引擎的連線池掛上統計"""
+    metrics = PoolMetrics(name)
+    pool._pool_metrics = metrics
+    metrics.attach(pool)
+    pool_metrics[name] = metrics
+    return metrics
+
+
+def get_pool_metrics() -> Dict[str, Any]:
+    return {
+        "settings": {
+            "null_pool": settings.DB_USE_NULL_POOL,
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+            "pool_recycle": settings.DB_POOL_RECYCLE,
+            "pre_ping": settings.DB_POOL_PRE_PING,
+            "use_lifo": settings.DB_POOL_USE_LIFO,
+        },
+        "pools": {name: metrics.snapshot() for name, metrics in pool_metrics.items()},
+    }
@@ -0,0 +1,88 @@
+"""
+密碼雜湊執行緒池
+
+bcrypt 每次驗證 / 雜湊約需 100–300ms，直接在 async 路由中執行會阻塞事件迴圈。
+此處以固定大小的執行緒池執行，並限制等待中的工作數量（超過時拒絕），
+同時記錄排隊與執行時間，供觀察登入尖峰時的壓力。
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from .config import settings
+
+
+class PasswordPoolBusy(Exception):
+    """等待中的密碼雜湊工作已達上限"""
+
+
+class PasswordHashPool:
+    """有上限的密碼雜湊執行緒池與其統計資料"""
+
+    def __init__(self, max_workers: Optional[int] = None, max_pending: Optional[int] = None):
+        self.max_workers = max_workers or settings.PASSWORD_HASH_WORKERS
+        self.max_pending = max_pending or settings.PASSWORD_HASH_MAX_PENDING
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "rejected": 0,
+            "queue_wait_total_ms": 0.0,
+            "queue_wait_max_ms": 0.0,
+            "run_total_ms": 0.0,
+            "run_max_ms": 0.0,
+        }
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """在執行緒池中執行 func，等待中的工作已達上限時拋出 PasswordPoolBusy"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._stats["rejected"] += 1
+                raise PasswordPoolBusy()
+            self._pending += 1
+            self._stats["submitted"] += 1
+        enqueued_at = time.perf_counter()
+
+        def task():
+            started_at = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                finished_at = time.perf_counter()
+                wait_ms = (started_at - enqueued_at) * 1000
+                run_ms = (finished_at - started_at) * 1000
+                with self._lock:
+                    self._stats["completed"] += 1
+                    self._stats["queue_wait_total_ms"] += wait_ms
+                    self._stats["queue_wait_max_ms"] = max(self._stats["queue_wait_max_ms"], wait_ms)
+                    self._stats["run_total_ms"] += run_ms
+                    self._stats["run_max_ms"] = max(self._stats["run_max_ms"], run_ms)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, task)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            pending = self._pending
+        completed = stats["completed"]
+        return {
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "pending": pending,
+            **{key: round(value, 2) if isinstance(value, float) else value for key, value in stats.items()},
+            "queue_wait_avg_ms": round(stats["queue_wait_total_ms"] / completed, 2) if completed else 0.0,
+            "run_avg_ms": round(stats["run_total_ms"] / completed, 2) if completed else 0.0,
+        }
+
+
+# 全局密碼雜湊執行緒池
+password_hash_pool = PasswordHashPool()
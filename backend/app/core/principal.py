@@ -0,0 +1,39 @@
+"""
+已驗證使用者的輕量身分物件
+
+由 get_current_user 產生並供所有權限相依函式使用。只包含授權判斷與日誌需要的欄位，
+不綁定任何資料庫 Session，也不會觸發關聯的延遲載入；
+需要修改使用者資料的路由應以 principal.id 自行載入 ORM User。
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+
+from ..models.user import User
+
+
+@dataclass(frozen=True)
+class Principal:
+    __slots__ = ("id", "username", "full_name", "role", "identity", "is_active")
+
+    id: int
+    username: str
+    full_name: Optional[str]
+    role: Optional[str]
+    identity: Optional[str]
+    is_active: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            username=user.username,
+            full_name=user.full_name,
+            role=user.role,
+            identity=user.identity,
+            is_active=bool(user.is_active)
+        )
+
+    @property
+    def is_head_nurse_or_admin(self) -> bool:
+        return self.role in ("head_nurse", "admin") or self.username == "admin"
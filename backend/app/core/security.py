@@ -8,6 +8,9 @@ from sqlalchemy.orm import Session
 from .config import settings
 from ..models.user import User
 from .database import get_db
+from .auth_cache import authenticated_user_cache
+from .principal import Principal
+from .password_pool import password_hash_pool, PasswordPoolBusy
 import ipaddress
 
 # 密碼上下文
@@ -22,6 +25,24 @@ def get_password_hash(password: str) -> str:
     """生成密碼哈希"""
     return pwd_context.hash(password)
 
+async def _run_in_password_pool(func, *args):
+    try:
+        return await password_hash_pool.run(func, *args)
+    except PasswordPoolBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="系統忙碌中，請稍後再試",
+            headers={"Retry-After": "1"},
+        )
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """在密碼雜湊執行緒池中驗證密碼，不阻塞事件迴圈"""
+    return await _run_in_password_pool(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """在密碼雜湊執行緒池中生成密碼哈希，不阻塞事件迴圈"""
+    return await _run_in_password_pool(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """創建訪問令牌"""
     to_encode = data.copy()
@@ -45,8 +66,8 @@ def check_ip_restriction(user: User, client_ip: str) -> bool:
 
 async def get_current_user(
     db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
-) -> User:
-    """獲取當前用戶"""
+) -> Principal:
+    """獲取當前用戶（返回不綁定 Session 的 Principal，需修改用戶資料時請自行載入 User）"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="無效的身份驗證憑據",
@@ -62,29 +83,36 @@ async def get_current_user(
     except jwt.JWTError:
         raise credentials_exception
     
+    # token 已驗證過簽章與期限，命中快取時不需再查詢 users 表
+    principal = authenticated_user_cache.get(token)
+    if principal is not None:
+        return principal
+    
     user = db.query(User).filter(User.username == username).first()
     if user is None:
         raise credentials_exception
     
-    return user
+    principal = Principal.from_user(user)
+    authenticated_user_cache.set(token, principal, payload.get("exp"))
+    return principal
 
 async def get_current_active_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: Principal = Depends(get_current_user)
+) -> Principal:
     """獲取當前用戶（用於需要登入權限的操作）
     不檢查 is_active 狀態，直接返回已認證的用戶"""
     return current_user
 
-def get_head_nurse_user(current_user: User = Depends(get_current_user)) -> User:
+def get_head_nurse_user(current_user: Principal = Depends(get_current_user)) -> Principal:
     """獲取護理長用戶（用於需要護理長權限的操作）"""
-    if current_user.role != "head_nurse" and current_user.role != "admin" and current_user.username != "admin":
+    if not current_user.is_head_nurse_or_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="沒有足夠的權限執行此操作"
         )
     return current_user
 
-def get_shift_swap_privileged_user(request: Request, current_user: User = Depends(get_current_user)) -> User:
+def get_shift_swap_privileged_user(request: Request, current_user: Principal = Depends(get_current_user)) -> Principal:
     """換班特權用戶（允許在換班工作流程中修改排班）
     
     此函數用於換班功能相關的API，允許一般護理師在處理換班時獲得臨時權限來修改資料庫。
@@ -107,7 +135,7 @@ def get_shift_swap_privileged_user(request: Request, current_user: User = Depend
     is_overtime_request = "overtime" in path
     
     # 如果用戶已經是護理長或管理員，直接允許
-    if current_user.role == "head_nurse" or current_user.role == "admin" or current_user.username == "admin":
+    if current_user.is_head_nurse_or_admin:
         return current_user
     
     # 如果請求來自換班功能，允許一般護理師獲得臨時權限
@@ -1,9 +1,9 @@
 from .user import User
-from .schedule import MonthlySchedule, ScheduleVersion
+from .schedule import MonthlySchedule, MonthlyScheduleRow, ScheduleVersion
 from .shift_swap import ShiftSwapRequest, ShiftRule
 from .announcement import AnnouncementCategory, Announcement, AnnouncementPermission
 from .log import Log
-from .overtime import OvertimeRecord
+from .overtime import OvertimeRecord, OvertimeMonthlyScore, OvertimeScoreBalance
 from .doctor_schedule import DoctorSchedule, DayShiftDoctor, DoctorScheduleUpdateLog
 from .formula import FormulaSchedule, FormulaSchedulePattern, NurseFormulaAssignment, PatternNurseAssignment
 from .webauthn import WebAuthnCredential 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, ForeignKey, DateTime, Text
+from sqlalchemy import Column, Integer, String, Date, ForeignKey, DateTime, Text, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from ..core.database import Base
@@ -16,6 +16,11 @@ class OvertimeRecord(Base):
     # 關聯
     user = relationship("User")
 
+    __table_args__ = (
+        # 每人每天一筆，批量寫入以 ON CONFLICT (user_id, date) 新增或更新
+        Index('uq_overtime_records_user_date', 'user_id', 'date', unique=True),
+    )
+
 class OvertimeMonthlyScore(Base):
     __tablename__ = "overtime_monthly_scores"
     
@@ -27,4 +32,22 @@ class OvertimeMonthlyScore(Base):
     details = Column(Text)
     
     # 關聯
-    user = relationship("User") 
\ No newline at end of file
+    user = relationship("User")
+
+    __table_args__ = (
+        # 每人每月一筆，批量寫入以 ON CONFLICT (user_id, year, month) 新增或更新
+        Index('uq_overtime_monthly_scores_user_year_month', 'user_id', 'year', 'month', unique=True),
+    )
+
+class OvertimeScoreBalance(Base):
+    """每位人員的累計加班分數，月度分數變動後鎖定該人員的列並由月度分數重新加總"""
+    __tablename__ = "overtime_score_balances"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, unique=True)
+    total_score = Column(Integer, nullable=False, default=0)  # 與月度分數相同，以 0.01 分為單位
+    months_count = Column(Integer, nullable=False, default=0)  # 已計分的月份數
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    # 關聯
+    user = relationship("User")
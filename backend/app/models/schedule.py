@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Date, Text, Boolean, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Date, Text, Boolean, JSON, UniqueConstraint, Index
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
 from ..core.database import Base
 
@@ -21,6 +21,30 @@ class MonthlySchedule(Base):
     user = relationship("User", back_populates="monthly_schedules")
     version = relationship("ScheduleVersion", back_populates="schedules")
 
+    # 熱門查詢條件：version_id = ?、(user_id, date, version_id)、(user_id, date)
+    __table_args__ = (
+        Index('uq_monthly_schedules_version_user_date', 'version_id', 'user_id', 'date', unique=True),
+        Index('ix_monthly_schedules_user_date', 'user_id', 'date'),
+    )
+
+class MonthlyScheduleRow(Base):
+    """緊湊月班表，每個版本每位人員一列，與 monthly_schedules 逐日記錄同步維護"""
+    __tablename__ = "monthly_schedule_rows"
+
+    id = Column(Integer, primary_key=True, index=True)
+    version_id = Column(Integer, ForeignKey("schedule_versions.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    shifts = Column(JSON)  # 整月班次陣列，索引 0 為 1 號
+    area_codes = Column(JSON)  # 整月區域代碼陣列
+    special_type = Column(String)  # 特殊分類標記 (SNP/LNP)
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    # 唯一約束
+    __table_args__ = (
+        UniqueConstraint('version_id', 'user_id'),
+    )
+
 class ScheduleVersion(Base):
     __tablename__ = "schedule_versions"
 
@@ -32,6 +56,10 @@ class ScheduleVersion(Base):
     is_published = Column(Boolean, default=False)  # 是否已發布
     published_by = Column(Integer, ForeignKey("users.id"))
     is_base_version = Column(Boolean, default=False)  # 是否為基準版本
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())  # 版本內容最後更新時間
+    # 版本歷史的最新修訂與其排班狀態，寫入時直接比較，不必重播歷史差異
+    history_revision = Column(Integer, default=0, nullable=False, server_default="0")
+    history_cells = deferred(Column(JSON))  # 約上千格，僅寫入歷史時讀取
     
     # 關聯
     schedules = relationship("MonthlySchedule", back_populates="version")
@@ -40,6 +68,11 @@ class ScheduleVersion(Base):
     diffs = relationship("ScheduleVersionDiff", foreign_keys="[ScheduleVersionDiff.version_id]", back_populates="version")
     base_for_diffs = relationship("ScheduleVersionDiff", foreign_keys="[ScheduleVersionDiff.base_version_id]", back_populates="base_version")
 
+    # 月份最新版本查詢（month = ? ORDER BY id DESC LIMIT 1）使用的複合索引
+    __table_args__ = (
+        Index('ix_schedule_versions_month_id', 'month', 'id'),
+    )
+
 class ScheduleVersionDiff(Base):
     """排班表版本差異模型，儲存版本間的差異"""
     __tablename__ = "schedule_version_diffs"
@@ -48,8 +81,15 @@ class ScheduleVersionDiff(Base):
     version_id = Column(Integer, ForeignKey("schedule_versions.id"))  # 當前版本ID
     base_version_id = Column(Integer, ForeignKey("schedule_versions.id"))  # 基準版本ID
     diff_data = Column(JSON)  # 差異數據，格式為JSON
+    revision = Column(Integer)  # 版本歷史的修訂編號（版本比較的差異為 NULL）
     created_at = Column(DateTime, default=func.now())
     
     # 關聯
     version = relationship("ScheduleVersion", foreign_keys=[version_id], back_populates="diffs")
-    base_version = relationship("ScheduleVersion", foreign_keys=[base_version_id], back_populates="base_for_diffs") 
\ No newline at end of file
+    base_version = relationship("ScheduleVersion", foreign_keys=[base_version_id], back_populates="base_for_diffs")
+
+    __table_args__ = (
+        # 同一版本的修訂編號不可重複；版本比較的差異 revision 為 NULL，不受限制
+        Index('uq_schedule_version_diffs_version_revision', 'version_id', 'revision', unique=True),
+        Index('ix_schedule_version_diffs_version_base', 'version_id', 'base_version_id'),
+    ) 
\ No newline at end of file
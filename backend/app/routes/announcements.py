@@ -1,12 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from typing import List, Optional
 from datetime import datetime, timedelta
 import logging
 
-from ..core.database import get_db
+from ..core.database import get_db, get_async_db
 from ..core.security import get_current_active_user
+from ..core.principal import Principal
 from ..models.user import User
 from ..models.announcement import Announcement, AnnouncementCategory
 from ..schemas.announcement import (
@@ -24,10 +27,54 @@ router = APIRouter(
     tags=["announcements"]
 )
 
+def _announcement_with_refs():
+    """公告連同分類名稱與作者（LEFT JOIN，一次查詢取得）"""
+    return select(Announcement, AnnouncementCategory.name, User).outerjoin(
+        AnnouncementCategory, AnnouncementCategory.id == Announcement.category_id
+    ).outerjoin(
+        User, User.id == Announcement.author_id
+    )
+
+def _announcement_to_dict(ann: Announcement, category_name: Optional[str], author: Optional[User]) -> dict:
+    author_info = None
+    if author:
+        author_info = {
+            "id": author.id,
+            "full_name": author.full_name,
+            "email": author.email,
+            "role": author.role,
+            "identity": author.identity
+        }
+    
+    return {
+        "id": ann.id,
+        "title": ann.title,
+        "content": ann.content,
+        "category_id": ann.category_id,
+        "category": category_name or "未分類",
+        "author_id": ann.author_id,
+        "author": author_info,
+        "is_active": ann.is_active,
+        "is_pinned": bool(ann.is_pinned),
+        "created_at": ann.created_at,
+        "updated_at": ann.updated_at
+    }
+
+def _load_announcement_dict(db: Session, announcement_id: int) -> dict:
+    """以同步 Session 取得單一公告的回應內容（寫入路由使用）"""
+    row = db.execute(
+        _announcement_with_refs().where(Announcement.id == announcement_id)
+    ).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="公告不存在")
+    
+    ann, category_name, author = row
+    return _announcement_to_dict(ann, category_name, author)
+
 @router.get("/", response_model=List[dict])
 async def get_all_announcements(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_active_user),
     skip: int = 0,
     limit: int = 100,
     active_only: bool = True,
@@ -36,76 +83,33 @@ async def get_all_announcements(
     """
     取得所有公告列表
     """
-    query = db.query(Announcement)
+    query = _announcement_with_refs()
     
     # 根據參數篩選
     if active_only:
-        query = query.filter(Announcement.is_active == True)
+        query = query.where(Announcement.is_active == True)
     
     if category_id:
-        query = query.filter(Announcement.category_id == category_id)
+        query = query.where(Announcement.category_id == category_id)
     
-    # 嘗試使用is_pinned排序，如果失敗則降級為僅使用created_at
-    try:
-        # 獲取公告記錄
-        announcements = query.order_by(Announcement.is_pinned.desc(), Announcement.created_at.desc()).offset(skip).limit(limit).all()
-    except Exception as e:
-        # 如果發生錯誤（例如is_pinned欄位不存在），則只按創建時間排序
-        logger.warning(f"排序時發生錯誤，降級使用僅創建時間排序: {str(e)}")
-        announcements = query.order_by(Announcement.created_at.desc()).offset(skip).limit(limit).all()
-    
-    # 處理響應，同時添加所需資訊
-    result = []
-    for ann in announcements:
-        # 獲取分類名稱
-        category = db.query(AnnouncementCategory).filter(AnnouncementCategory.id == ann.category_id).first()
-        category_name = category.name if category else "未分類"
-        
-        # 獲取作者資訊
-        author = db.query(User).filter(User.id == ann.author_id).first()
-        author_info = None
-        if author:
-            author_info = {
-                "id": author.id,
-                "full_name": author.full_name,
-                "email": author.email,
-                "role": author.role,
-                "identity": author.identity
-            }
-        
-        # 構建響應
-        announcement_data = {
-            "id": ann.id,
-            "title": ann.title,
-            "content": ann.content,
-            "category_id": ann.category_id,
-            "category": category_name,
-            "author_id": ann.author_id,
-            "author": author_info,
-            "is_active": ann.is_active,
-            "created_at": ann.created_at,
-            "updated_at": ann.updated_at
-        }
-        
-        # 如果存在is_pinned欄位，則添加到響應中
-        try:
-            announcement_data["is_pinned"] = ann.is_pinned
-        except:
-            announcement_data["is_pinned"] = False
-        
-        result.append(announcement_data)
+    query = query.order_by(
+        Announcement.is_pinned.desc(), Announcement.created_at.desc()
+    ).offset(skip).limit(limit)
     
-    return result
+    rows = (await db.execute(query)).all()
+    return [_announcement_to_dict(ann, category_name, author) for ann, category_name, author in rows]
 
 @router.get("/categories", response_model=List[dict])
 async def get_categories(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     獲取所有公告類別
     """
-    categories = db.query(AnnouncementCategory).filter(AnnouncementCategory.is_active == True).all()
+    categories = (await db.execute(
+        select(AnnouncementCategory).where(AnnouncementCategory.is_active == True)
+    )).scalars().all()
     
     result = []
     for cat in categories:
@@ -123,54 +127,26 @@ async def get_categories(
 @router.get("/{announcement_id}", response_model=dict)
 async def get_announcement(
     announcement_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     取得單一公告詳細資訊
     """
-    ann = db.query(Announcement).filter(Announcement.id == announcement_id).first()
-    if not ann:
+    row = (await db.execute(
+        _announcement_with_refs().where(Announcement.id == announcement_id)
+    )).first()
+    if not row:
         raise HTTPException(status_code=404, detail="公告不存在")
     
-    # 獲取分類名稱
-    category = db.query(AnnouncementCategory).filter(AnnouncementCategory.id == ann.category_id).first()
-    category_name = category.name if category else "未分類"
-    
-    # 獲取作者資訊
-    author = db.query(User).filter(User.id == ann.author_id).first()
-    author_info = None
-    if author:
-        author_info = {
-            "id": author.id,
-            "full_name": author.full_name,
-            "email": author.email,
-            "role": author.role,
-            "identity": author.identity
-        }
-    
-    # 構建響應
-    result = {
-        "id": ann.id,
-        "title": ann.title,
-        "content": ann.content,
-        "category_id": ann.category_id,
-        "category": category_name,
-        "author_id": ann.author_id,
-        "author": author_info,
-        "is_active": ann.is_active,
-        "is_pinned": ann.is_pinned,
-        "created_at": ann.created_at,
-        "updated_at": ann.updated_at
-    }
-    
-    return result
+    ann, category_name, author = row
+    return _announcement_to_dict(ann, category_name, author)
 
 @router.post("/", response_model=dict)
 async def create_announcement(
     announcement: AnnouncementCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     創建新公告
@@ -210,7 +186,7 @@ async def create_announcement(
         db.refresh(db_announcement)
         
         # 獲取完整的公告信息用於返回
-        result = await get_announcement(db_announcement.id, db, current_user)
+        result = _load_announcement_dict(db, db_announcement.id)
         
         return {
             "success": True,
@@ -228,7 +204,7 @@ async def update_announcement(
     announcement_id: int,
     announcement: AnnouncementUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     更新公告内容
@@ -251,7 +227,7 @@ async def update_announcement(
         db.refresh(db_announcement)
         
         # 獲取完整的公告信息用於返回
-        result = await get_announcement(announcement_id, db, current_user)
+        result = _load_announcement_dict(db, announcement_id)
         
         return {
             "success": True,
@@ -268,7 +244,7 @@ async def update_announcement(
 async def delete_announcement(
     announcement_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     刪除公告
@@ -298,7 +274,7 @@ async def delete_announcement(
 async def pin_announcement(
     announcement_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     置頂公告
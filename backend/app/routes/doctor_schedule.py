@@ -1,14 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Dict, Optional
 from datetime import datetime, timedelta
 import logging
 from pydantic import BaseModel
 
-from ..core.database import get_db
+from ..core.database import get_db, get_async_db
 from ..services.doctor_schedule_service import DoctorScheduleService
 from ..core.security import get_current_user
-from ..models.user import User
+from ..core.principal import Principal
 from ..core.config import settings
 from ..utils.timezone import now, get_timezone_info
 
@@ -23,8 +24,8 @@ router = APIRouter(prefix="/doctor-schedules", tags=["醫師班表"])
 async def get_doctor_schedules(
     start_date: str,
     end_date: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     獲取指定日期範圍的醫師班表
@@ -35,8 +36,8 @@ async def get_doctor_schedules(
         if len(start_date) != 8 or len(end_date) != 8:
             raise HTTPException(status_code=400, detail="日期格式錯誤，請使用YYYYMMDD格式")
         
-        # 獲取班表資料
-        schedules = DoctorScheduleService.get_schedules_by_date_range(db, start_date, end_date)
+        # 獲取班表資料（服務以同步 Session 撰寫，透過 run_sync 執行，查詢時不阻塞事件迴圈）
+        schedules = await db.run_sync(DoctorScheduleService.get_schedules_by_date_range, start_date, end_date)
         
         return {
             "success": True,
@@ -59,8 +60,8 @@ async def get_doctor_schedules(
 
 @router.get("/today", response_model=Dict)
 async def get_today_schedule(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """獲取今日班表"""
     try:
@@ -68,7 +69,7 @@ async def get_today_schedule(
         current_time = now()
         logger.info(f"獲取今日班表請求，當前時間: {current_time}")
         
-        schedule = DoctorScheduleService.get_today_schedule(db)
+        schedule = await db.run_sync(DoctorScheduleService.get_today_schedule)
         if not schedule:
             return {"message": "今日無班表資料", "data": None}
         
@@ -79,7 +80,7 @@ async def get_today_schedule(
 
 @router.get("/public/today", response_model=Dict)
 async def get_public_today_schedule(
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """獲取今日班表 - 公開端點，不需要授權"""
     try:
@@ -87,7 +88,7 @@ async def get_public_today_schedule(
         current_time = now()
         logger.info(f"獲取今日班表請求（公開端點），當前時間: {current_time}")
         
-        schedule = DoctorScheduleService.get_today_schedule(db)
+        schedule = await db.run_sync(DoctorScheduleService.get_today_schedule)
         if not schedule:
             return {"message": "今日無班表資料", "data": None}
         
@@ -99,7 +100,7 @@ async def get_public_today_schedule(
 @router.get("/public/date/{date}", response_model=Dict)
 async def get_public_date_schedule(
     date: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """獲取指定日期的班表 - 公開端點，不需要授權"""
     try:
@@ -118,7 +119,7 @@ async def get_public_date_schedule(
         current_time = now()
         logger.info(f"獲取指定日期班表請求（公開端點），請求日期: {date}，當前時間: {current_time}")
         
-        schedule = DoctorScheduleService.get_schedule_by_date(db, date)
+        schedule = await db.run_sync(DoctorScheduleService.get_schedule_by_date, date)
         if not schedule:
             return {"message": f"指定日期({date})無班表資料", "data": None}
         
@@ -133,7 +134,7 @@ async def get_public_date_schedule(
 async def update_schedules_from_external(
     start_date: str = Query(..., description="開始日期 YYYYMMDD"),
     end_date: str = Query(..., description="結束日期 YYYYMMDD"),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     從外部API更新醫師班表資料
@@ -161,7 +162,7 @@ async def update_schedules_from_external(
 
 @router.post("/update-future-four-months")
 async def update_future_four_months_schedules(
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     手動觸發更新未來四個月醫師班表資料（從明天開始）
@@ -228,7 +229,7 @@ async def update_future_four_months_schedules(
 
 @router.get("/scheduler-status")
 async def get_scheduler_status(
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     獲取定時任務狀態
@@ -275,7 +276,7 @@ async def update_doctor_area_code(
     doctor_id: int,
     new_area_code: AreaCodeUpdateRequest,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     更新醫師的工作區域代碼
@@ -306,7 +307,7 @@ async def update_doctor_area_code(
 async def toggle_doctor_active_status(
     doctor_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """切換醫師的上下班狀態"""
     try:
@@ -331,7 +332,7 @@ async def toggle_doctor_active_status(
 async def toggle_doctor_leave_status(
     doctor_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """切換醫師的請假狀態"""
     try:
@@ -357,7 +358,7 @@ async def toggle_doctor_leave_status(
 async def get_update_logs(
     limit: int = Query(50, description="返回記錄數量限制"),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """獲取班表更新日誌"""
     try:
@@ -411,7 +412,7 @@ async def set_doctor_meeting_time(
     doctor_id: int,
     meeting_time_data: dict,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     設定醫師開會時間
@@ -444,7 +445,7 @@ async def set_doctor_meeting_time(
 async def delete_doctor_meeting_time(
     doctor_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     刪除醫師開會時間
@@ -476,7 +477,7 @@ async def update_doctor_status_backup(
     doctor_id: int,
     status_data: dict,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     更新醫師狀態的備用端點
@@ -518,7 +519,7 @@ async def update_doctor_status_alternative(
     doctor_id: int,
     status_data: dict,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     備用的醫師狀態更新端點
@@ -557,7 +558,7 @@ async def update_doctor_status_alternative(
 @router.post("/check-auto-off-duty")
 async def check_auto_off_duty(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     手動觸發醫師自動下班檢測
@@ -6,8 +6,9 @@ import logging
 
 from ..core.database import get_db
 from ..core.security import get_current_active_user
-from ..models.user import User
+from ..core.principal import Principal
 from ..models.formula import FormulaSchedule, FormulaSchedulePattern
+from ..services.formula_catalog import formula_catalog, get_formula_catalog
 
 # 設置logger
 logger = logging.getLogger(__name__)
@@ -20,30 +21,24 @@ router = APIRouter(
 @router.get("/patterns", response_model=List[Dict])
 async def get_all_formula_patterns(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
     formula_id: Optional[int] = None,
     group_number: Optional[int] = None
 ):
     """
     獲取所有公式班表模式數據，可選擇通過formula_id或group_number過濾
     """
-    query = db.query(FormulaSchedulePattern)
+    catalog = get_formula_catalog(db)
     
-    # 添加可選過濾條件
-    if formula_id is not None:
-        query = query.filter(FormulaSchedulePattern.formula_id == formula_id)
-    
-    if group_number is not None:
-        query = query.filter(FormulaSchedulePattern.group_number == group_number)
-    
-    # 執行查詢
-    patterns = query.all()
-    
-    # 構建結果
+    # 構建結果（可選過濾條件）
     result = []
-    for pattern in patterns:
-        # 獲取關聯的公式班表資訊
-        formula = db.query(FormulaSchedule).filter(FormulaSchedule.id == pattern.formula_id).first()
+    for pattern in catalog.patterns:
+        if formula_id is not None and pattern.formula_id != formula_id:
+            continue
+        if group_number is not None and pattern.group_number != group_number:
+            continue
+        
+        formula = catalog.formulas.get(pattern.formula_id)
         formula_name = formula.name if formula else "未知公式班表"
         
         result.append({
@@ -54,7 +49,7 @@ async def get_all_formula_patterns(
             "day_offset": pattern.day_offset,
             "pattern": pattern.pattern,
             "shift_type": pattern.shift_type,
-            "pattern_data": pattern.pattern_data if hasattr(pattern, 'pattern_data') else None,
+            "pattern_data": None,
             "created_at": pattern.created_at,
             "updated_at": pattern.updated_at
         })
@@ -64,63 +59,29 @@ async def get_all_formula_patterns(
 @router.get("/", response_model=List[Dict])
 async def get_all_formula_schedules(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
     include_patterns: bool = False,
     include_assignments: bool = False
 ):
     """
     獲取所有公式班表設定
     """
-    formula_schedules = db.query(FormulaSchedule).filter(FormulaSchedule.is_active == True).all()
-    
-    result = []
-    for formula in formula_schedules:
-        formula_data = {
-            "id": formula.id,
-            "name": formula.name,
-            "identity": formula.identity,
-            "num_groups": formula.num_groups,
-            "description": formula.description,
-            "is_active": formula.is_active,
-            "created_at": formula.created_at,
-            "updated_at": formula.updated_at
-        }
-        
-        # 如果需要包含模式信息
-        if include_patterns:
-            patterns = db.query(FormulaSchedulePattern).filter(
-                FormulaSchedulePattern.formula_id == formula.id
-            ).all()
-            
-            formula_data["patterns"] = [
-                {
-                    "id": pattern.id,
-                    "group_number": pattern.group_number,
-                    "day_offset": pattern.day_offset,
-                    "pattern": pattern.pattern,
-                    "shift_type": pattern.shift_type
-                }
-                for pattern in patterns
-            ]
-        
-        result.append(formula_data)
-    
-    return result
+    return [
+        formula.to_dict(include_patterns=include_patterns)
+        for formula in get_formula_catalog(db).active_formulas()
+    ]
 
 @router.get("/{formula_id}", response_model=Dict)
 async def get_formula_schedule(
     formula_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
     include_patterns: bool = False
 ):
     """
     獲取特定公式班表的詳細信息
     """
-    formula = db.query(FormulaSchedule).filter(
-        FormulaSchedule.id == formula_id,
-        FormulaSchedule.is_active == True
-    ).first()
+    formula = get_formula_catalog(db).get_active(formula_id)
     
     if not formula:
         raise HTTPException(
@@ -128,42 +89,14 @@ async def get_formula_schedule(
             detail="找不到指定的公式班表"
         )
     
-    formula_data = {
-        "id": formula.id,
-        "name": formula.name,
-        "identity": formula.identity,
-        "num_groups": formula.num_groups,
-        "description": formula.description,
-        "is_active": formula.is_active,
-        "created_at": formula.created_at,
-        "updated_at": formula.updated_at
-    }
-    
-    # 如果需要包含模式信息
-    if include_patterns:
-        patterns = db.query(FormulaSchedulePattern).filter(
-            FormulaSchedulePattern.formula_id == formula.id
-        ).all()
-        
-        formula_data["patterns"] = [
-            {
-                "id": pattern.id,
-                "group_number": pattern.group_number,
-                "day_offset": pattern.day_offset,
-                "pattern": pattern.pattern,
-                "shift_type": pattern.shift_type
-            }
-            for pattern in patterns
-        ]
-    
-    return formula_data
+    return formula.to_dict(include_patterns=include_patterns)
 
 @router.put("/{formula_id}", response_model=Dict)
 async def update_formula_schedule(
     formula_id: int,
     update_data: Dict,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     更新公式班表設定，包括基本信息和班表模式
@@ -276,6 +209,7 @@ async def update_formula_schedule(
         # 提交更改
         db.commit()
         db.refresh(formula)
+        formula_catalog.invalidate()
         
         # 獲取更新後的pattern列表
         patterns = db.query(FormulaSchedulePattern).filter(
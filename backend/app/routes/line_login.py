@@ -19,6 +19,7 @@ from app.models.line_account import LineAccount
 from app.models.user import User
 from app.schemas.line import LineLoginStartResponse
 from ..core.security import verify_password, get_current_user
+from ..core.principal import Principal
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/auth/line", tags=["LINE Login"])
@@ -184,7 +185,7 @@ async def line_login_callback(request: Request, code: str, state: str, db: Sessi
 async def line_bind(
     request: Request,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     """
     將 pending 的 LINE user 綁定到目前登入帳號（無需再輸入員工編號/密碼）。
@@ -322,7 +323,7 @@ async def line_qr_status(session_id: str):
 @router.get("/status")
 async def line_status(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     account = db.query(LineAccount).filter(LineAccount.user_id == current_user.id).first()
     if not account:
@@ -338,7 +339,7 @@ async def line_status(
 @router.delete("/unbind")
 async def line_unbind(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     account = db.query(LineAccount).filter(LineAccount.user_id == current_user.id).first()
     if not account:
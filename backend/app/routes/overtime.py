@@ -1,13 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+from datetime import date, datetime
 import logging
 
-from ..core.database import get_db
+from ..core.database import get_db, get_async_db
 from ..core.security import get_current_active_user, get_head_nurse_user, get_current_user, get_shift_swap_privileged_user
+from ..core.principal import Principal
 from ..models.user import User
-from ..models.overtime import OvertimeRecord, OvertimeMonthlyScore
+from ..models.overtime import OvertimeRecord, OvertimeMonthlyScore, OvertimeScoreBalance
 from ..models.log import Log
 from ..schemas.overtime import (
     OvertimeRecordCreate,
@@ -19,8 +22,14 @@ from ..schemas.overtime import (
     OvertimeMonthlyScoreCreate,
     OvertimeMonthlyScoreUpdate,
     OvertimeMonthlyScore as OvertimeMonthlyScoreSchema,
-    BulkOvertimeMonthlyScoreUpdate
+    BulkOvertimeMonthlyScoreUpdate,
+    OvertimeAllocationRequest,
+    OvertimeScoreBalance as OvertimeScoreBalanceSchema
 )
+from ..services.overtime_allocation import allocate_overtime
+from ..services.overtime_ledger import rebuild_balances, refresh_overtime_scores
+from ..services.overtime_records import replace_month_overtime, upsert_monthly_scores, upsert_overtime_rows
+from ..services.schedule_batch import month_range
 
 # 設置logger
 logger = logging.getLogger(__name__)
@@ -32,18 +41,18 @@ router = APIRouter()
 async def get_my_overtime_records(
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """獲取當前用戶的加班記錄"""
-    query = db.query(OvertimeRecord).filter(OvertimeRecord.user_id == current_user.id)
+    query = select(OvertimeRecord).where(OvertimeRecord.user_id == current_user.id)
     
     if start_date:
-        query = query.filter(OvertimeRecord.date >= start_date)
+        query = query.where(OvertimeRecord.date >= start_date)
     if end_date:
-        query = query.filter(OvertimeRecord.date <= end_date)
+        query = query.where(OvertimeRecord.date <= end_date)
         
-    records = query.order_by(OvertimeRecord.date).all()
+    records = (await db.execute(query.order_by(OvertimeRecord.date))).scalars().all()
     return records
 
 # 創建加班記錄 - 僅限護理長和admin
@@ -51,7 +60,7 @@ async def get_my_overtime_records(
 async def create_overtime_record(
     record_in: OvertimeRecordCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_head_nurse_user)  # 修改為僅限護理長
+    current_user: Principal = Depends(get_head_nurse_user)  # 修改為僅限護理長
 ):
     """創建加班記錄（僅限護理長）"""
     # 檢查是否已存在該日期的記錄
@@ -74,6 +83,7 @@ async def create_overtime_record(
     )
     
     db.add(db_record)
+    refresh_overtime_scores(db, [(current_user.id, record_in.date)])
     db.commit()
     db.refresh(db_record)
     
@@ -95,7 +105,7 @@ async def create_user_overtime_record(
     user_id: int,
     record_in: OvertimeRecordCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_head_nurse_user)
+    current_user: Principal = Depends(get_head_nurse_user)
 ):
     """為特定用戶創建加班記錄（僅護理長可操作）"""
     # 檢查用戶是否存在
@@ -126,6 +136,7 @@ async def create_user_overtime_record(
     )
     
     db.add(db_record)
+    refresh_overtime_scores(db, [(user_id, record_in.date)])
     db.commit()
     db.refresh(db_record)
     
@@ -146,7 +157,7 @@ async def create_user_overtime_record(
 async def bulk_create_overtime_records(
     bulk_records: BulkOvertimeRecordCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_shift_swap_privileged_user),  # 允許換班操作特權
+    current_user: Principal = Depends(get_shift_swap_privileged_user),  # 允許換班操作特權
     request: Request = None  # 添加可選的請求參數
 ):
     """批量創建加班記錄（護理長或換班流程可操作）"""
@@ -161,32 +172,11 @@ async def bulk_create_overtime_records(
                 detail="用戶不存在"
             )
     
-    created_records = []
-    for record_data in bulk_records.records:
-        # 檢查是否已存在該日期的記錄
-        existing_record = db.query(OvertimeRecord).filter(
-            OvertimeRecord.user_id == user_id,
-            OvertimeRecord.date == record_data.date
-        ).first()
-        
-        if existing_record:
-            # 更新現有記錄
-            existing_record.overtime_shift = record_data.overtime_shift
-            existing_record.updated_at = datetime.now()
-            db.commit()
-            db.refresh(existing_record)
-            created_records.append(existing_record)
-        else:
-            # 創建新記錄
-            db_record = OvertimeRecord(
-                user_id=user_id,
-                date=record_data.date,
-                overtime_shift=record_data.overtime_shift
-            )
-            db.add(db_record)
-            db.commit()
-            db.refresh(db_record)
-            created_records.append(db_record)
+    # 整批以單一 INSERT ... ON CONFLICT (user_id, date) 新增或更新
+    created_records = upsert_overtime_rows(db, [
+        {"user_id": user_id, "date": record_data.date, "overtime_shift": record_data.overtime_shift}
+        for record_data in bulk_records.records
+    ], returning=True)
     
     # 記錄操作日誌
     log = Log(
@@ -196,6 +186,7 @@ async def bulk_create_overtime_records(
         description=f"批量創建加班記錄: {len(created_records)} 條記錄"
     )
     db.add(log)
+    refresh_overtime_scores(db, [(user_id, record.date) for record in bulk_records.records])
     db.commit()
     
     return created_records
@@ -205,127 +196,98 @@ async def bulk_create_overtime_records(
 async def bulk_month_update_overtime_records(
     updates: MultipleDatesOvertimeUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_shift_swap_privileged_user),  # 允許換班操作特權
+    current_user: Principal = Depends(get_shift_swap_privileged_user),  # 允許換班操作特權
     request: Request = None  # 添加可選的請求參數
 ):
-    """批量更新多個日期的加班記錄（護理長或換班流程可操作）"""
-    total_updated_count = 0
-    
-    # 記錄詳細的處理過程
-    logger.info(f"處理整月加班批量更新: 共 {len(updates.records)} 條更新記錄")
-    logger.info(f"更新記錄詳情: {updates.records}")
-    
-    # 收集所有需要更新的用戶ID和日期，用於清理舊數據
-    all_user_ids = set()
-    all_dates = set()
-    
-    # 先分析所有記錄，收集用戶ID和日期信息
-    for record in updates.records:
-        try:
-            # 檢查 record 是否是字典類型
-            if not isinstance(record, dict):
-                logger.warning(f"跳過非字典類型記錄: {record}")
-                continue
-                
-            date_str = record.get('date')
-            user_ids = record.get('user_ids', [])
-            
-            if not date_str or not user_ids:
-                logger.warning(f"跳過缺少日期或用戶ID的記錄: {record}")
-                continue
-                
-            # 解析日期
-            try:
-                update_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-                all_dates.add(update_date)
-                
-                # 添加用戶ID
-                for user_id in user_ids:
-                    all_user_ids.add(user_id)
-            except ValueError as e:
-                logger.error(f"日期格式解析錯誤: {date_str}, 錯誤: {str(e)}")
-                continue
-        except Exception as e:
-            logger.error(f"分析記錄時出錯: {str(e)}, 記錄: {record}")
-            continue
-    
-    # 如果有收集到日期和用戶，先清理整月的加班記錄
-    if all_dates and all_user_ids:
-        # 獲取月份的第一天和最後一天
-        first_date = min(all_dates)
-        last_date = max(all_dates)
-        month_start = datetime(first_date.year, first_date.month, 1).date()
-        month_end = (datetime(first_date.year, first_date.month + 1, 1) - timedelta(days=1)).date()
-        
-        logger.info(f"正在清理 {month_start} 到 {month_end} 期間的加班記錄...")
-        
-        # 刪除該月份所有相關用戶的加班記錄
-        delete_count = db.query(OvertimeRecord).filter(
-            OvertimeRecord.user_id.in_(list(all_user_ids)),
-            OvertimeRecord.date >= month_start,
-            OvertimeRecord.date <= month_end
-        ).delete(synchronize_session=False)
-        
-        logger.info(f"已刪除 {delete_count} 條舊的加班記錄")
+    """批量更新多個日期的加班記錄（護理長或換班流程可操作），返回寫入的記錄數"""
+    result = replace_month_overtime(db, updates.records)
+    
+    if result.skipped_records:
+        logger.warning(f"整月加班批量更新略過 {result.skipped_records} 條格式不正確的記錄")
+    if result.unknown_user_ids:
+        logger.warning(f"整月加班批量更新略過不存在的用戶: {result.unknown_user_ids}")
+    logger.info(
+        f"整月加班批量更新: {len(updates.records)} 個批次，"
+        f"刪除 {result.deleted} 條、寫入 {result.inserted} 條記錄"
+    )
     
     # 記錄操作日誌
     log = Log(
         user_id=current_user.id,
         action="bulk_month_update_overtime",
         operation_type="update",
-        description=f"批量更新多個日期的加班記錄: {len(updates.records)} 個批次"
+        description=f"批量更新多個日期的加班記錄: {len(updates.records)} 個批次，刪除 {result.deleted} 條、寫入 {result.inserted} 條"
     )
     db.add(log)
     
-    # 迭代每個更新記錄
-    for record in updates.records:
-        try:
-            date_str = record.get('date')
-            overtime_shift = record.get('overtime_shift')
-            user_ids = record.get('user_ids', [])
-            
-            # 參數驗證
-            if not date_str or not user_ids:
-                continue
-                
-            # 解析日期
-            try:
-                update_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-            except ValueError:
-                continue
-                
-            # 處理overtime_shift的值
-            if overtime_shift == "null" or overtime_shift == "undefined" or overtime_shift is None:
-                overtime_shift = ""
-            
-            # 更新用戶記錄
-            batch_updated = 0
-            for user_id in user_ids:
-                # 檢查用戶是否存在
-                user = db.query(User).filter(User.id == user_id).first()
-                if not user:
-                    continue
-                
-                # 由於已刪除舊記錄，直接創建新記錄
-                if overtime_shift:  # 只有當班次不為空時才創建記錄
-                    record = OvertimeRecord(
-                        user_id=user_id,
-                        date=update_date,
-                        overtime_shift=overtime_shift
-                    )
-                    db.add(record)
-                    batch_updated += 1
-            
-            total_updated_count += batch_updated
-            
-        except Exception as e:
-            logger.error(f"處理批量更新時出錯: {str(e)}")
-            continue
+    # 更新受影響人員當月的加班分數
+    refresh_overtime_scores(db, result.entries)
     
     # 提交所有更改
     db.commit()
     
-    return total_updated_count
+    return result.inserted
+
+# 護理長：伺服器端自動分配加班
+@router.post("/overtime/allocate", response_model=Dict[str, Any])
+async def allocate_overtime_records(
+    request: OvertimeAllocationRequest,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_head_nurse_user)
+):
+    """依月班表以統一分數導向輪次分配加班（僅護理長可操作），dry_run 時只返回結果不寫入"""
+    try:
+        months = month_range(request.start_year, request.start_month, request.end_year, request.end_month)
+        
+        result = allocate_overtime(
+            db,
+            months,
+            mode=request.mode,
+            include_zero_score_shifts=request.include_zero_score_shifts,
+            seed=request.seed,
+            dry_run=bool(request.dry_run)
+        )
+        
+        range_label = f"{months[0][0]}年{months[0][1]}月至{months[-1][0]}年{months[-1][1]}月"
+        if request.dry_run:
+            return {
+                "success": True,
+                "message": f"已計算 {range_label} 加班分配（未保存到資料庫）",
+                "months": result["months"],
+                "is_temporary": True
+            }
+        
+        log = Log(
+            user_id=current_user.id,
+            action="allocate_overtime",
+            operation_type="update",
+            description=f"自動分配 {range_label} 加班（{request.mode}），寫入 {result['records_count']} 筆記錄"
+        )
+        db.add(log)
+        db.commit()
+        
+        return {
+            "success": True,
+            "message": f"成功分配 {range_label} 加班",
+            "months": result["months"],
+            "records_count": result["records_count"]
+        }
+    
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+    except Exception as e:
+        import traceback
+        error_msg = f"自動分配加班時發生錯誤: {str(e)}"
+        logger.error(error_msg)
+        logger.error(traceback.format_exc())
+        db.rollback()
+        raise HTTPException(
+            status_code=500,
+            detail=error_msg
+        )
 
 # 更新加班記錄 - 允許換班流程或護理長操作
 @router.put("/overtime/{record_id}", response_model=OvertimeRecordSchema)
@@ -333,7 +295,7 @@ async def update_overtime_record(
     record_id: int,
     record_in: OvertimeRecordUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_shift_swap_privileged_user)  # 允許換班操作特權
+    current_user: Principal = Depends(get_shift_swap_privileged_user)  # 允許換班操作特權
 ):
     """更新加班記錄（護理長或換班流程可操作）"""
     db_record = db.query(OvertimeRecord).filter(OvertimeRecord.id == record_id).first()
@@ -347,6 +309,7 @@ async def update_overtime_record(
     # 更新記錄
     db_record.overtime_shift = record_in.overtime_shift
     db_record.updated_at = datetime.now()
+    refresh_overtime_scores(db, [(db_record.user_id, db_record.date)])
     
     db.commit()
     db.refresh(db_record)
@@ -368,7 +331,7 @@ async def update_overtime_record(
 async def delete_overtime_record(
     record_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_head_nurse_user)  # 修改為僅限護理長
+    current_user: Principal = Depends(get_head_nurse_user)  # 修改為僅限護理長
 ):
     """刪除加班記錄（僅限護理長）"""
     db_record = db.query(OvertimeRecord).filter(OvertimeRecord.id == record_id).first()
@@ -390,6 +353,7 @@ async def delete_overtime_record(
     
     # 刪除記錄
     db.delete(db_record)
+    refresh_overtime_scores(db, [(db_record.user_id, db_record.date)])
     db.commit()
     
     return db_record
@@ -403,8 +367,8 @@ async def get_all_overtime_records(
     end_date: Optional[date] = None,
     user_id: Optional[int] = None,
     _cb: Optional[str] = None,  # 添加緩存破壞參數，但不使用它
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """獲取加班記錄（所有用戶均可訪問所有用戶的記錄）"""
     # 詳細記錄所有收到的請求參數
@@ -412,7 +376,7 @@ async def get_all_overtime_records(
     logger.debug(f"請求參數: start_date={start_date} ({type(start_date)}), end_date={end_date} ({type(end_date)}), user_id={user_id} ({type(user_id)}), _cb={_cb}")
     logger.debug(f"當前用戶: id={current_user.id}, username={current_user.username}, role={current_user.role}")
     
-    query = db.query(OvertimeRecord)
+    query = select(OvertimeRecord)
     
     # 移除權限檢查，允許所有用戶查看所有記錄
     # 如果指定了user_id，則過濾特定用戶
@@ -421,7 +385,7 @@ async def get_all_overtime_records(
         if isinstance(user_id, str) and user_id.isdigit():
             user_id = int(user_id)
             logger.debug(f"將字符串user_id轉換為整數: {user_id}")
-        query = query.filter(OvertimeRecord.user_id == user_id)
+        query = query.where(OvertimeRecord.user_id == user_id)
         logger.debug(f"查詢特定用戶ID: {user_id}")
     else:
         logger.debug(f"查詢所有用戶記錄")
@@ -430,13 +394,13 @@ async def get_all_overtime_records(
     try:
         if start_date:
             logger.debug(f"過濾開始日期: {start_date}, 類型: {type(start_date)}")
-            query = query.filter(OvertimeRecord.date >= start_date)
+            query = query.where(OvertimeRecord.date >= start_date)
         if end_date:
             logger.debug(f"過濾結束日期: {end_date}, 類型: {type(end_date)}")
-            query = query.filter(OvertimeRecord.date <= end_date)
+            query = query.where(OvertimeRecord.date <= end_date)
         
         # 執行查詢
-        records = query.order_by(OvertimeRecord.date).all()
+        records = (await db.execute(query.order_by(OvertimeRecord.date))).scalars().all()
         logger.info(f"查詢成功，返回 {len(records)} 條加班記錄")
         
         # 日誌記錄查詢結果
@@ -459,18 +423,18 @@ async def get_all_overtime_records(
 async def get_my_monthly_scores(
     year: Optional[int] = None,
     month: Optional[int] = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """獲取當前用戶的月度加班分數"""
-    query = db.query(OvertimeMonthlyScore).filter(OvertimeMonthlyScore.user_id == current_user.id)
+    query = select(OvertimeMonthlyScore).where(OvertimeMonthlyScore.user_id == current_user.id)
     
     if year:
-        query = query.filter(OvertimeMonthlyScore.year == year)
+        query = query.where(OvertimeMonthlyScore.year == year)
     if month:
-        query = query.filter(OvertimeMonthlyScore.month == month)
+        query = query.where(OvertimeMonthlyScore.month == month)
         
-    monthly_scores = query.all()
+    monthly_scores = (await db.execute(query)).scalars().all()
     return monthly_scores
 
 # 獲取所有用戶的月度加班分數 - 僅限護理長和admin
@@ -479,28 +443,38 @@ async def get_all_monthly_scores(
     year: Optional[int] = None,
     month: Optional[int] = None,
     user_id: Optional[int] = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_head_nurse_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_head_nurse_user)
 ):
     """獲取所有用戶的月度加班分數（僅限護理長和admin）"""
-    query = db.query(OvertimeMonthlyScore)
+    query = select(OvertimeMonthlyScore)
     
     if user_id:
-        query = query.filter(OvertimeMonthlyScore.user_id == user_id)
+        query = query.where(OvertimeMonthlyScore.user_id == user_id)
     if year:
-        query = query.filter(OvertimeMonthlyScore.year == year)
+        query = query.where(OvertimeMonthlyScore.year == year)
     if month:
-        query = query.filter(OvertimeMonthlyScore.month == month)
+        query = query.where(OvertimeMonthlyScore.month == month)
         
-    monthly_scores = query.all()
+    monthly_scores = (await db.execute(query)).scalars().all()
     return monthly_scores
 
+# 獲取所有用戶的累計加班分數 - 僅限護理長和admin
+@router.get("/overtime/score-balances", response_model=List[OvertimeScoreBalanceSchema])
+async def get_score_balances(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_head_nurse_user)
+):
+    """獲取所有用戶的累計加班分數（每人一筆，由加班分數帳本維護）"""
+    query = select(OvertimeScoreBalance).order_by(OvertimeScoreBalance.user_id)
+    return (await db.execute(query)).scalars().all()
+
 # 創建或更新月度加班分數 - 僅限護理長和admin
 @router.post("/overtime/monthly-scores", response_model=OvertimeMonthlyScoreSchema)
 async def create_or_update_monthly_score(
     score_data: OvertimeMonthlyScoreCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_head_nurse_user)
+    current_user: Principal = Depends(get_head_nurse_user)
 ):
     """創建或更新月度加班分數（僅限護理長和admin）"""
     # 檢查用戶是否存在
@@ -522,6 +496,7 @@ async def create_or_update_monthly_score(
         # 更新已存在的記錄
         existing_score.total_score = score_data.total_score
         existing_score.details = score_data.details
+        rebuild_balances(db, [score_data.user_id])
         db.commit()
         db.refresh(existing_score)
         
@@ -546,6 +521,7 @@ async def create_or_update_monthly_score(
             details=score_data.details
         )
         db.add(new_score)
+        rebuild_balances(db, [score_data.user_id])
         db.commit()
         db.refresh(new_score)
         
@@ -566,44 +542,11 @@ async def create_or_update_monthly_score(
 async def bulk_create_or_update_monthly_scores(
     bulk_data: BulkOvertimeMonthlyScoreUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_head_nurse_user)
+    current_user: Principal = Depends(get_head_nurse_user)
 ):
     """批量創建或更新月度加班分數（僅限護理長和admin）"""
-    result = []
-    
-    for score_data in bulk_data.scores:
-        # 檢查用戶是否存在
-        user = db.query(User).filter(User.id == score_data.user_id).first()
-        if not user:
-            continue  # 如果用戶不存在，跳過此記錄
-        
-        # 檢查是否已存在該用戶的該月記錄
-        existing_score = db.query(OvertimeMonthlyScore).filter(
-            OvertimeMonthlyScore.user_id == score_data.user_id,
-            OvertimeMonthlyScore.year == score_data.year,
-            OvertimeMonthlyScore.month == score_data.month
-        ).first()
-        
-        if existing_score:
-            # 更新已存在的記錄
-            existing_score.total_score = score_data.total_score
-            existing_score.details = score_data.details
-            db.commit()
-            db.refresh(existing_score)
-            result.append(existing_score)
-        else:
-            # 創建新記錄
-            new_score = OvertimeMonthlyScore(
-                user_id=score_data.user_id,
-                year=score_data.year,
-                month=score_data.month,
-                total_score=score_data.total_score,
-                details=score_data.details
-            )
-            db.add(new_score)
-            db.commit()
-            db.refresh(new_score)
-            result.append(new_score)
+    # 整批以單一 INSERT ... ON CONFLICT (user_id, year, month) 新增或更新，不存在的用戶會被略過
+    result = upsert_monthly_scores(db, [score_data.dict() for score_data in bulk_data.scores])
     
     # 記錄操作日誌
     log = Log(
@@ -613,6 +556,7 @@ async def bulk_create_or_update_monthly_scores(
         description=f"批量更新月度加班分數: {len(result)} 條記錄"
     )
     db.add(log)
+    rebuild_balances(db, {score.user_id for score in result})
     db.commit()
     
     return result
@@ -622,7 +566,7 @@ async def bulk_create_or_update_monthly_scores(
 async def delete_monthly_score(
     score_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_head_nurse_user)
+    current_user: Principal = Depends(get_head_nurse_user)
 ):
     """刪除月度加班分數（僅限護理長和admin）"""
     db_score = db.query(OvertimeMonthlyScore).filter(OvertimeMonthlyScore.id == score_id).first()
@@ -644,6 +588,7 @@ async def delete_monthly_score(
     
     # 刪除記錄
     db.delete(db_score)
+    rebuild_balances(db, [db_score.user_id])
     db.commit()
     
     return db_score 
\ No newline at end of file
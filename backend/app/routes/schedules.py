@@ -1,15 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Any, Dict, Optional
 from datetime import datetime, date
 import calendar
-import json
 import copy
 import logging
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
-from ..core.database import get_db
+from ..core.database import get_db, get_async_db
 from ..core.security import get_current_active_user, get_head_nurse_user, get_current_user, get_shift_swap_privileged_user
+from ..core.principal import Principal
 from ..models.user import User
 from ..models.schedule import MonthlySchedule, ScheduleVersion, ScheduleVersionDiff
 from ..models.log import Log
@@ -17,9 +20,22 @@ from ..schemas.schedule import (
     MonthlyScheduleCreate, MonthlyScheduleUpdate, MonthlySchedule as MonthlyScheduleSchema,
     ScheduleVersionCreate, ScheduleVersionUpdate, ScheduleVersion as ScheduleVersionSchema,
     ScheduleVersionDiffCreate, ScheduleVersionDiff as ScheduleVersionDiffSchema,
-    GenerateMonthScheduleRequest
+    GenerateMonthScheduleRequest, GenerateScheduleBatchRequest
 )
-from ..models.formula import FormulaSchedule, FormulaSchedulePattern
+from ..services.formula_catalog import get_formula_catalog
+from ..services.roster import get_roster
+from ..services.schedule_generator import MonthlyScheduleGenerator, preserve_existing_month
+from ..services.schedule_batch import generate_schedule_batch, month_range
+from ..services.schedule_persistence import build_month_rows, bulk_insert_monthly_schedules, apply_month_diff
+from ..services.schedule_rows import load_packed_rows, pack_rows, refresh_packed_rows, replace_packed_rows, version_days_in_month
+from ..services.schedule_cache import monthly_schedule_cache, mark_version_changed
+from ..services.schedule_diff import compare_schedule_versions
+from ..services.schedule_versions import get_latest_version, latest_version_resolver
+from ..services.schedule_export import EXPORT_FORMATS, export_stream, months_in_range
+from ..services.schedule_history import cells_to_schedule, list_revisions, reconstruct_cells, record_revision
+from ..services.overtime_ledger import refresh_month_scores, refresh_version_scores
+from ..services.overtime_scoring import DAY_SHIFT
+from ..utils.http_cache import content_digest, etag_matches, make_etag, not_modified, set_etag_headers
 
 # 設置logger
 logger = logging.getLogger(__name__)
@@ -30,7 +46,7 @@ router = APIRouter()
 async def generate_monthly_schedule(
     request: GenerateMonthScheduleRequest,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_head_nurse_user)
+    current_user: Principal = Depends(get_head_nurse_user)
 ):
     """生成月度排班表（僅護理長可操作）"""
     
@@ -42,14 +58,10 @@ async def generate_monthly_schedule(
         
         # 年份範圍檢測已移除，允許任意年份
             
-        # 創建目標月份的第一天
-        first_day = date(request.year, request.month, 1)
-        
-        # 計算該月的天數
-        _, days_in_month = calendar.monthrange(request.year, request.month)
-        
-        # 計算月份的第一天是星期幾 (0-6 代表週一到週日)
-        first_day_weekday = first_day.weekday()
+        # 由行程共用的公式目錄取得已編譯的 (公式, 組別) × 星期 班次矩陣
+        generator = MonthlyScheduleGenerator(
+            request.year, request.month, week_matrices=get_formula_catalog(db).week_matrices
+        )
         
         # 檢查請求中是否包含 temporary 參數
         is_temporary = getattr(request, 'temporary', False)
@@ -57,9 +69,7 @@ async def generate_monthly_schedule(
         # 取得現有班表資料，用於保留夜班人員班表
         existing_shift_data = {}
         month_str = f"{request.year}{request.month:02d}"
-        existing_version = db.query(ScheduleVersion).filter(
-            ScheduleVersion.month == month_str
-        ).order_by(ScheduleVersion.id.desc()).first()
+        existing_version = get_latest_version(db, month_str)
         
         if existing_version:
             # 獲取現有班表資料
@@ -104,41 +114,12 @@ async def generate_monthly_schedule(
                 db.add(version)
                 db.commit()
                 db.refresh(version)
+                latest_version_resolver.remember(version)
             
             version_id = version.id
         
-        # 獲取所有公式班表及其patterns
-        formulas = db.query(FormulaSchedule).all()
-        
-        # 建立公式名稱到ID的映射
-        formula_name_to_id = {}
-        formula_id_to_name = {}
-        formula_patterns = {}
-        for formula in formulas:
-            formula_name_to_id[formula.name] = formula.id
-            formula_id_to_name[formula.id] = formula.name
-            
-            patterns = db.query(FormulaSchedulePattern).filter(
-                FormulaSchedulePattern.formula_id == formula.id
-            ).order_by(FormulaSchedulePattern.group_number).all()
-            
-            # 使用字典去重複，確保每個group_number只有一個pattern
-            patterns_dict = {}
-            for pattern in patterns:
-                if pattern.group_number not in patterns_dict:
-                    patterns_dict[pattern.group_number] = pattern
-            
-            # 轉換為列表並按group_number排序
-            formula_patterns[formula.id] = sorted(
-                patterns_dict.values(),
-                key=lambda p: p.group_number
-            )
-        
-        # 獲取所有護理師
-        all_nurses = db.query(User).filter(
-            User.role.in_(['nurse', 'secretary', 'leader', 'head_nurse', 'supervise_nurse']),
-            User.is_active == True
-        ).all()
+        # 由名冊快照取得所有參與排班的人員（group_data 已預先解析）
+        all_nurses = get_roster(db).scheduled()
         
         if not all_nurses:
             raise ValueError("未找到任何啟用的護理師，無法生成班表")
@@ -149,245 +130,50 @@ async def generate_monthly_schedule(
         
         # 處理每個護理師的排班
         for nurse in all_nurses:
-            # 收集這位護理師的排班信息，用於臨時模式
-            nurse_shifts = ['O'] * days_in_month  # 預設全休假
-            
-            # 判斷該護理師是否為夜班人員
-            is_night_shift_nurse = False
             special_type = None
-            
-            # 檢查group_data是否有夜班標記
-            if nurse.group_data:
-                try:
-                    group_data = json.loads(nurse.group_data)
-                    if isinstance(group_data, list) and len(group_data) >= 2:
-                        if group_data[1] == 'SNP' or group_data[1] == 'LNP':
-                            is_night_shift_nurse = True
-                            special_type = group_data[1]
-                except Exception:
-                    pass
+            area_codes = None
             
             # 夜班人員且存在現有班表，則保留現有班表
-            if is_night_shift_nurse and nurse.id in existing_shift_data:
+            if nurse.night_type and nurse.id in existing_shift_data:
                 logger.info(f"保留夜班人員 {nurse.full_name} (ID: {nurse.id}) 的現有班表")
                 
-                for day in range(1, days_in_month + 1):
-                    entry_date = date(request.year, request.month, day)
-                    
-                    # 獲取現有班表數據
-                    existing_data = existing_shift_data.get(nurse.id, {}).get(day, {})
-                    shift_type = existing_data.get('shift_type', 'O')
-                    area_code = existing_data.get('area_code', nurse.identity)
-                    
-                    # 更新臨時模式的班表
-                    nurse_shifts[day-1] = shift_type
-                    
-                    # 如果不是臨時模式，創建排班記錄
-                    if not is_temporary:
-                        schedule_entry = MonthlySchedule(
-                            user_id=nurse.id,
-                            date=entry_date,
-                            shift_type=shift_type,
-                            area_code=area_code,
-                            special_type=special_type,
-                            version_id=version_id
-                        )
-                        schedule_entries.append(schedule_entry)
-                
-                # 對於臨時模式，添加到臨時排班表中
-                if is_temporary:
-                    temporary_schedule.append({
-                        "id": nurse.id,
-                        "name": nurse.full_name,
-                        "role": nurse.role,
-                        "identity": nurse.identity,
-                        "special_type": special_type,
-                        "shifts": nurse_shifts
-                    })
-                
-                continue
-            
-            # 護理長特殊處理：週一至週五為A班，週六日為O休假
-            if nurse.role == 'head_nurse':
-                # 為護理長生成特殊班表
-                for day in range(1, days_in_month + 1):
-                    entry_date = date(request.year, request.month, day)
-                    
-                    # 計算當前日期是一週中的第幾天 (0=週一, 6=週日)
-                    day_of_week = entry_date.weekday()
-                    
-                    # 週一至週五為A班，週六日為O休假
-                    shift_type = 'A' if day_of_week < 5 else 'O'
-                    
-                    # 更新臨時數組
-                    nurse_shifts[day-1] = shift_type
-                    
-                    # 如果不是臨時模式，創建排班記錄
-                    if not is_temporary:
-                        schedule_entry = MonthlySchedule(
-                            user_id=nurse.id,
-                            date=entry_date,
-                            shift_type=shift_type,
-                            area_code=nurse.identity,
-                            version_id=version_id
-                        )
-                        schedule_entries.append(schedule_entry)
-                
-                # 對於臨時模式，添加到臨時排班表中
-                if is_temporary:
-                    temporary_schedule.append({
-                        "id": nurse.id,
-                        "name": nurse.full_name,
-                        "role": nurse.role,
-                        "identity": nurse.identity,
-                        "shifts": nurse_shifts
-                    })
-                
-                continue
-                
-            # 檢查group_data是否有值
-            formula_id = None
-            start_pattern = 1
-            
-            if nurse.group_data:
-                try:
-                    # 解析group_data JSON
-                    group_data = json.loads(nurse.group_data)
-                    
-                    # group_data應是["公式ID", "起始組別"]格式的數組
-                    if isinstance(group_data, list) and len(group_data) >= 2:
-                        # 第一個元素是公式ID
-                        formula_id = int(group_data[0])
-                        # 第二個元素是起始pattern組
-                        start_pattern = int(group_data[1])
-                    else:
-                        formula_id = None
-                except Exception as e:
-                    formula_id = None
+                special_type = nurse.night_type
+                shifts, area_codes = preserve_existing_month(
+                    existing_shift_data[nurse.id], generator.days_in_month, nurse.identity
+                )
             else:
-                # 對於臨時模式，添加到臨時排班表中
-                if is_temporary:
-                    temporary_schedule.append({
-                        "id": nurse.id,
-                        "name": nurse.full_name,
-                        "role": nurse.role,
-                        "identity": nurse.identity,
-                        "shifts": nurse_shifts
-                    })
-                    continue
-                
-                # 為這個護理師生成全休假排班
-                for day in range(1, days_in_month + 1):
-                    entry_date = date(request.year, request.month, day)
-                    
-                    if not is_temporary:
-                        schedule_entry = MonthlySchedule(
-                            user_id=nurse.id,
-                            date=entry_date,
-                            shift_type='O',  # 休假
-                            area_code=nurse.identity,
-                            version_id=version_id
-                        )
-                        schedule_entries.append(schedule_entry)
-                continue
-            
-            # 獲取該公式班表的所有patterns
-            patterns = formula_patterns.get(formula_id, [])
-            
-            # 如果沒有找到有效的公式班表或patterns，則生成預設休假排班
-            if formula_id is None or not patterns:
-                # 對於臨時模式，添加到臨時排班表中
-                if is_temporary:
-                    temporary_schedule.append({
-                        "id": nurse.id,
-                        "name": nurse.full_name,
-                        "role": nurse.role,
-                        "identity": nurse.identity,
-                        "shifts": nurse_shifts
-                    })
-                    continue
-                
-                # 為這個護理師生成全休假排班
-                for day in range(1, days_in_month + 1):
-                    entry_date = date(request.year, request.month, day)
-                    
-                    if not is_temporary:
-                        schedule_entry = MonthlySchedule(
-                            user_id=nurse.id,
-                            date=entry_date,
-                            shift_type='O',  # 休假
-                            area_code=nurse.identity,
-                            version_id=version_id
-                        )
-                        schedule_entries.append(schedule_entry)
-                continue
+                # 護理長、公式班表或全休假，由生成器直接給出整月班次
+                shifts = generator.shifts_for(nurse.role, nurse.formula_id, nurse.start_group)
             
-            # 計算pattern的最大組別數
-            max_group = max(p.group_number for p in patterns)
-            
-            # 為這個護理師生成整月排班
-            for day in range(1, days_in_month + 1):
-                entry_date = date(request.year, request.month, day)
-                
-                # 計算當前日期是一週中的第幾天 (0=週一, 6=週日)
-                day_of_week = entry_date.weekday()
-                
-                # 計算第一天到當前日期過了多少周（向下取整，第一周從0開始）
-                current_week = ((day - 1) + first_day_weekday) // 7
-                
-                # 根據周數確定當前使用的pattern組
-                # 從起始pattern組開始，每過一周增加1，循環使用
-                current_pattern = (start_pattern + current_week - 1) % max_group
-                if current_pattern == 0:
-                    current_pattern = max_group  # 如果餘數為0，則使用最大組別
-                
-                # 查找對應的pattern
-                pattern = next((p for p in patterns if p.group_number == current_pattern), None)
-                
-                # 默認班次為休息
-                shift_type = 'O'
-                
-                if pattern and pattern.pattern:
-                    # pattern字串通常格式為"DDDAAOO"，表示週一到週日的班次
-                    pattern_str = pattern.pattern
-                    
-                    # 獲取當天對應的班次，注意pattern中的第一個字符代表週一
-                    if 0 <= day_of_week < len(pattern_str):
-                        shift_type = pattern_str[day_of_week]
-                    else:
-                        # 如果pattern字串不夠長，默認休假
-                        pass
-                
-                # 更新臨時模式的班表
-                if is_temporary:
-                    nurse_shifts[day-1] = shift_type
-                
-                # 如果不是臨時模式，創建排班記錄
-                if not is_temporary:
-                    # 創建排班記錄
-                    schedule_entry = MonthlySchedule(
-                        user_id=nurse.id,
-                        date=entry_date,
-                        shift_type=shift_type,
-                        area_code=nurse.identity,
-                        version_id=version_id
-                    )
-                    schedule_entries.append(schedule_entry)
-            
-            # 對於臨時模式，添加到臨時排班表中
             if is_temporary:
-                temporary_schedule.append({
+                nurse_schedule = {
                     "id": nurse.id,
                     "name": nurse.full_name,
                     "role": nurse.role,
                     "identity": nurse.identity,
-                    "shifts": nurse_shifts
-                })
+                    "shifts": list(shifts)
+                }
+                if special_type:
+                    nurse_schedule["special_type"] = special_type
+                temporary_schedule.append(nurse_schedule)
+                continue
+            
+            schedule_entries.extend(build_month_rows(
+                version_id, nurse.id, generator.dates, shifts,
+                area_codes=area_codes,
+                special_type=special_type,
+                default_area_code=nurse.identity
+            ))
         
         # 如果不是臨時模式，將排班記錄保存到資料庫
         if not is_temporary:
-            # 批量添加排班記錄
-            db.add_all(schedule_entries)
+            # 整月排班以單一批次寫入（COPY / 多列 INSERT），與刪除舊記錄同一交易提交
+            bulk_insert_monthly_schedules(db, schedule_entries)
+            replace_packed_rows(db, version, schedule_entries)
+            mark_version_changed(version)
+            record_revision(db, version, "generate", current_user.id)
+            # 新版本剛建立，最新版本快取可能尚未更新，直接以此版本重新計分
+            refresh_month_scores(db, version, request.year, request.month)
             db.commit()
             
             # 添加操作日誌
@@ -448,14 +234,116 @@ async def generate_monthly_schedule(
             detail=f"獲取排班表時發生錯誤: {str(e)}"
         )
 
+@router.post("/schedules/generate/batch", response_model=Dict[str, Any])
+async def generate_schedule_batch_route(
+    request: GenerateScheduleBatchRequest,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_head_nurse_user)
+):
+    """一次生成多個月份的排班表（僅護理長可操作），dry_run 時只返回結果不寫入"""
+    try:
+        months = month_range(request.start_year, request.start_month, request.end_year, request.end_month)
+        
+        # 資料庫讀寫與計算皆為同步操作，放到執行緒中執行以免阻塞事件迴圈
+        result = await run_in_threadpool(
+            generate_schedule_batch,
+            db,
+            months,
+            get_formula_catalog(db).week_matrices,
+            current_user,
+            description=request.description,
+            as_base_version=bool(request.as_base_version),
+            dry_run=bool(request.dry_run)
+        )
+        
+        range_label = f"{months[0][0]}年{months[0][1]}月至{months[-1][0]}年{months[-1][1]}月"
+        if request.dry_run:
+            return {
+                "success": True,
+                "message": f"已生成 {range_label} 臨時排班表（未保存到資料庫）",
+                "months": result["months"],
+                "is_temporary": True
+            }
+        
+        # 添加操作日誌
+        log = Log(
+            user_id=current_user.id,
+            action="generate_schedule_batch",
+            operation_type="generate_schedule",
+            description=f"批次生成 {range_label} 排班表，共 {result['entries_count']} 條記錄"
+        )
+        db.add(log)
+        db.commit()
+        
+        return {
+            "success": True,
+            "message": f"成功生成 {range_label} 排班表",
+            "months": result["months"],
+            "entries_count": result["entries_count"]
+        }
+    
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+    except Exception as e:
+        import traceback
+        error_msg = f"批次生成排班表時發生錯誤: {str(e)}"
+        error_trace = traceback.format_exc()
+        
+        # 記錄錯誤信息到日誌
+        logger.error(error_msg)
+        logger.error(error_trace)
+        db.rollback()
+        
+        # 添加到系統日誌表
+        try:
+            log = Log(
+                user_id=current_user.id if current_user else None,
+                action="generate_schedule_batch_error",
+                operation_type="error",
+                description=error_msg
+            )
+            db.add(log)
+            db.commit()
+        except Exception:
+            # 如果記錄日誌失敗，忽略它，不要再產生異常
+            pass
+            
+        raise HTTPException(
+            status_code=500,
+            detail=error_msg
+        )
+
+def _load_monthly_data(db: Session, version: ScheduleVersion, days_in_month: int):
+    """讀取版本的每人班次與名冊（同步 Session，由 get_monthly_schedule 透過 run_sync 呼叫）"""
+    # 優先讀取每位人員一列的緊湊月班表；功能關閉或尚無緊湊列時改由逐日記錄組合
+    packed_rows = load_packed_rows(db, version)
+    if packed_rows is None:
+        schedules = db.query(MonthlySchedule).filter(
+            MonthlySchedule.version_id == version.id
+        ).order_by(MonthlySchedule.date, MonthlySchedule.id).all()
+        packed = pack_rows(schedules, days_in_month)
+    else:
+        packed = {
+            row.user_id: {"shifts": row.shifts or [], "special_type": row.special_type}
+            for row in packed_rows
+        }
+    
+    # 護理師資料與排序組別取自名冊快照
+    return packed, get_roster(db).by_id
+
 @router.get("/schedules/monthly/{year}/{month}", response_model=Dict[str, Any])
 async def get_monthly_schedule(
     year: int,
     month: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_active_user)
 ):
-    """獲取特定月份的排班表"""
+    """獲取特定月份的排班表，支援 ETag / If-None-Match 條件式請求"""
     try:
         # 確保年月有效
         if month < 1 or month > 12:
@@ -463,10 +351,8 @@ async def get_monthly_schedule(
         
         month_str = f"{year}{month:02d}"
         
-        # 獲取該月份的排班版本，修改為獲取最新版本
-        version = db.query(ScheduleVersion).filter(
-            ScheduleVersion.month == month_str
-        ).order_by(ScheduleVersion.id.desc()).first()
+        # 獲取該月份的最新排班版本
+        version = await db.run_sync(get_latest_version, month_str)
         
         if not version:
             # 返回新的格式結構，但保持為空
@@ -484,58 +370,40 @@ async def get_monthly_schedule(
                 }
             }
         
-        # 獲取所有排班記錄
-        schedules = db.query(MonthlySchedule).filter(
-            MonthlySchedule.version_id == version.id
-        ).all()
+        # 版本與其更新時間未變時直接返回快取的回應
+        cached = monthly_schedule_cache.get(month_str, version)
+        if cached is not None:
+            cached_result, etag = cached
+            if etag_matches(request, etag):
+                return not_modified(etag)
+            set_etag_headers(response, etag)
+            return cached_result
         
-        # 獲取所有相關的護理師信息
-        user_ids = set([s.user_id for s in schedules])
-        users = db.query(User).filter(User.id.in_(user_ids)).all()
-        users_dict = {user.id: user for user in users}
+        days_in_month = calendar.monthrange(year, month)[1]
+        
+        packed, users_dict = await db.run_sync(_load_monthly_data, version, days_in_month)
         
         # 處理排班數據，按護理師分組
-        schedules_by_user = {}
-        for schedule in schedules:
-            user_id = schedule.user_id
-            if user_id not in schedules_by_user:
-                user = users_dict.get(user_id)
-                # 從 User 模型的 last_login_ip 欄位獲取 formula_group
-                formula_group = 0
-                if user and user.last_login_ip and user.last_login_ip.isdigit():
-                    formula_group = int(user.last_login_ip)
-                
-                schedules_by_user[user_id] = {
-                    "id": user_id,
-                    "name": user.full_name if user else f"User {user_id}",
-                    "role": user.role if user else "member",
-                    "identity": user.identity if user else "",
-                    "group": formula_group,
-                    "shifts": ["O"] * 31,  # 最大31天，用O填充
-                    "special_type": None,  # 初始化 special_type 為 None
-                    "vacationDays": 0,
-                    "accumulatedLeave": 0
-                }
+        schedule_list = []
+        for user_id, entry in packed.items():
+            user = users_dict.get(user_id)
+            formula_group = user.sort_group if user else 0
             
-            # 獲取日期的天數部分 (1-31)
-            day = schedule.date.day - 1  # 轉為0-based索引
+            # 修剪或以O補齊shifts到當月實際天數
+            shifts = list(entry["shifts"][:days_in_month])
+            shifts.extend(["O"] * (days_in_month - len(shifts)))
             
-            # 確保不會超出數組範圍
-            if 0 <= day < 31:
-                schedules_by_user[user_id]["shifts"][day] = schedule.shift_type
-                
-                # 如果這條記錄有 special_type，且用戶的 special_type 為空，則設置它
-                if schedule.special_type and not schedules_by_user[user_id]["special_type"]:
-                    schedules_by_user[user_id]["special_type"] = schedule.special_type
-        
-        # 將字典轉換為數組，並修剪shifts到當月實際天數
-        import calendar
-        days_in_month = calendar.monthrange(year, month)[1]
-        
-        schedule_list = []
-        for user_id, user_data in schedules_by_user.items():
-            user_data["shifts"] = user_data["shifts"][:days_in_month]
-            schedule_list.append(user_data)
+            schedule_list.append({
+                "id": user_id,
+                "name": user.full_name if user else f"User {user_id}",
+                "role": user.role if user else "member",
+                "identity": user.identity if user else "",
+                "group": formula_group,
+                "shifts": shifts,
+                "special_type": entry["special_type"],
+                "vacationDays": 0,
+                "accumulatedLeave": 0
+            })
         
         # 按組別和姓名排序
         schedule_list.sort(key=lambda x: (x["group"], x["name"]))
@@ -555,6 +423,14 @@ async def get_monthly_schedule(
             }
         }
         
+        # ETag 由版本、版本更新時間與回應內容（含人員資料）共同決定
+        etag = make_etag("monthly", version.id, version.updated_at, content_digest(result))
+        monthly_schedule_cache.set(month_str, version, result, etag)
+        
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        set_etag_headers(response, etag)
+        
         return result
     
     except ValueError as e:
@@ -580,7 +456,7 @@ async def get_monthly_schedule(
                 description=error_msg
             )
             db.add(log)
-            db.commit()
+            await db.commit()
         except Exception:
             # 如果記錄日誌失敗，忽略它，不要再產生異常
             pass
@@ -595,7 +471,7 @@ async def update_schedule(
     schedule_id: int,
     schedule_update: MonthlyScheduleUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_head_nurse_user)
+    current_user: Principal = Depends(get_head_nurse_user)
 ):
     """更新特定排班記錄（僅護理長可操作）"""
     db_schedule = db.query(MonthlySchedule).filter(
@@ -613,6 +489,12 @@ async def update_schedule(
     for field, value in update_data.items():
         setattr(db_schedule, field, value)
     
+    if db_schedule.version:
+        refresh_packed_rows(db, db_schedule.version, [db_schedule.user_id])
+        mark_version_changed(db_schedule.version)
+        record_revision(db, db_schedule.version, "update_schedule", current_user.id, [db_schedule.user_id])
+        refresh_version_scores(db, db_schedule.version, [db_schedule.user_id])
+    
     db.commit()
     db.refresh(db_schedule)
     
@@ -632,7 +514,7 @@ async def update_schedule(
 async def publish_schedule_version(
     version_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_head_nurse_user)
+    current_user: Principal = Depends(get_head_nurse_user)
 ):
     """發布排班表版本（僅護理長可操作）"""
     db_version = db.query(ScheduleVersion).filter(
@@ -670,7 +552,7 @@ async def compare_versions(
     version_id1: int,
     version_id2: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """比較兩個版本之間的差異"""
     try:
@@ -691,88 +573,8 @@ async def compare_versions(
                 detail="只能比較相同月份的版本"
             )
         
-        # 獲取兩個版本的排班記錄
-        version1_schedules = db.query(MonthlySchedule).filter(MonthlySchedule.version_id == version_id1).all()
-        version2_schedules = db.query(MonthlySchedule).filter(MonthlySchedule.version_id == version_id2).all()
-        
-        # 將排班記錄轉換為字典，方便比較
-        version1_dict = {}
-        for schedule in version1_schedules:
-            key = f"{schedule.user_id}_{schedule.date}"
-            version1_dict[key] = {
-                "id": schedule.id,
-                "user_id": schedule.user_id,
-                "date": schedule.date.isoformat(),
-                "shift_type": schedule.shift_type,
-                "area_code": schedule.area_code,
-                "work_time": schedule.work_time
-            }
-        
-        version2_dict = {}
-        for schedule in version2_schedules:
-            key = f"{schedule.user_id}_{schedule.date}"
-            version2_dict[key] = {
-                "id": schedule.id,
-                "user_id": schedule.user_id,
-                "date": schedule.date.isoformat(),
-                "shift_type": schedule.shift_type,
-                "area_code": schedule.area_code,
-                "work_time": schedule.work_time
-            }
-        
-        # 計算差異
-        diff_items = []
-        all_keys = set(list(version1_dict.keys()) + list(version2_dict.keys()))
-        
-        for key in all_keys:
-            if key in version1_dict and key in version2_dict:
-                v1 = version1_dict[key]
-                v2 = version2_dict[key]
-                
-                if (v1["shift_type"] != v2["shift_type"] or 
-                    v1["area_code"] != v2["area_code"] or 
-                    v1["work_time"] != v2["work_time"]):
-                    
-                    user = db.query(User).filter(User.id == v1["user_id"]).first()
-                    user_name = user.full_name if user else None
-                    
-                    diff_items.append({
-                        "type": "modified",
-                        "user_id": v1["user_id"],
-                        "user_name": user_name,
-                        "date": v1["date"],
-                        "version1_value": v1["shift_type"],
-                        "version2_value": v2["shift_type"]
-                    })
-            elif key in version1_dict:
-                v1 = version1_dict[key]
-                user = db.query(User).filter(User.id == v1["user_id"]).first()
-                user_name = user.full_name if user else None
-                
-                diff_items.append({
-                    "type": "deleted",
-                    "user_id": v1["user_id"],
-                    "user_name": user_name,
-                    "date": v1["date"],
-                    "version1_value": v1["shift_type"],
-                    "version2_value": None
-                })
-            else:  # key in version2_dict
-                v2 = version2_dict[key]
-                user = db.query(User).filter(User.id == v2["user_id"]).first()
-                user_name = user.full_name if user else None
-                
-                diff_items.append({
-                    "type": "added",
-                    "user_id": v2["user_id"],
-                    "user_name": user_name,
-                    "date": v2["date"],
-                    "version1_value": None,
-                    "version2_value": v2["shift_type"]
-                })
-        
-        # 按日期排序
-        diff_items.sort(key=lambda x: x["date"])
+        # 單一查詢取出兩個版本的記錄並以集合運算比較，結果存入 schedule_version_diffs
+        diff = compare_schedule_versions(db, version1, version2)
         
         # 返回比較結果
         return {
@@ -786,12 +588,7 @@ async def compare_versions(
                 "version_number": version2.version_number,
                 "published_at": version2.published_at
             },
-            "diff": {
-                "items": diff_items,
-                "added": [item for item in diff_items if item["type"] == "added"],
-                "modified": [item for item in diff_items if item["type"] == "modified"],
-                "deleted": [item for item in diff_items if item["type"] == "deleted"]
-            }
+            "diff": diff
         }
     except HTTPException:
         raise
@@ -823,11 +620,57 @@ async def compare_versions(
             detail=error_msg
         )
 
+@router.get("/schedules/versions/{version_id}/history", response_model=Dict[str, Any])
+async def get_version_history(
+    version_id: int,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_head_nurse_user)
+):
+    """列出排班版本的所有歷史修訂（僅護理長可操作）"""
+    version = db.query(ScheduleVersion).filter(ScheduleVersion.id == version_id).first()
+    if not version:
+        raise HTTPException(status_code=404, detail="排班表版本不存在")
+
+    return {
+        "success": True,
+        "data": {
+            "version_id": version.id,
+            "month": version.month,
+            "revisions": list_revisions(db, version.id)
+        }
+    }
+
+@router.get("/schedules/versions/{version_id}/history/{revision}", response_model=Dict[str, Any])
+async def get_version_revision(
+    version_id: int,
+    revision: int,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_head_nurse_user)
+):
+    """重建排班版本在指定修訂後的內容（從最近的快照重播差異）"""
+    version = db.query(ScheduleVersion).filter(ScheduleVersion.id == version_id).first()
+    if not version:
+        raise HTTPException(status_code=404, detail="排班表版本不存在")
+
+    restored_revision, cells = reconstruct_cells(db, version.id, revision)
+    if restored_revision != revision:
+        raise HTTPException(status_code=404, detail=f"找不到修訂 {revision}")
+
+    return {
+        "success": True,
+        "data": {
+            "version_id": version.id,
+            "month": version.month,
+            "revision": restored_revision,
+            "schedule": cells_to_schedule(cells, version_days_in_month(version))
+        }
+    }
+
 @router.post("/schedules/updateShift", response_model=Dict[str, Any])
 async def update_shift(
     shift_data: Dict[str, Any],
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_shift_swap_privileged_user)  # 允許換班相關請求使用特權
+    current_user: Principal = Depends(get_shift_swap_privileged_user)  # 允許換班相關請求使用特權
 ):
     """更新單一護理師的單日班次，不創建新版本"""
     
@@ -866,9 +709,7 @@ async def update_shift(
     month_str = f"{year}{month:02d}"
     
     # 查找當前最新版本
-    latest_version = db.query(ScheduleVersion).filter(
-        ScheduleVersion.month == month_str
-    ).order_by(ScheduleVersion.id.desc()).first()
+    latest_version = get_latest_version(db, month_str)
     
     if not latest_version:
         raise HTTPException(
@@ -915,6 +756,13 @@ async def update_shift(
     )
     db.add(log_entry)
     
+    refresh_packed_rows(db, latest_version, [user_id])
+    mark_version_changed(latest_version)
+    record_revision(db, latest_version, "updateShift", current_user.id, [user_id])
+    # 只有白班增減（或人員首次出現在班表中）才會影響加班分數
+    if DAY_SHIFT in (old_shift_type, shift_type) or log_action == "創建":
+        refresh_version_scores(db, latest_version, [user_id])
+    
     db.commit()
     db.refresh(schedule_entry)
     
@@ -934,7 +782,7 @@ async def update_shift(
 async def save_monthly_schedule(
     schedule_data: Dict[str, Any],
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_head_nurse_user)  # 只允許護理長和管理員保存
+    current_user: Principal = Depends(get_head_nurse_user)  # 只允許護理長和管理員保存
 ):
     """保存月度排班表並創建新版本"""
     
@@ -956,9 +804,7 @@ async def save_monthly_schedule(
     month_str = f"{year}{month:02d}"
     
     # 查找當前最新版本
-    latest_version = db.query(ScheduleVersion).filter(
-        ScheduleVersion.month == month_str
-    ).order_by(ScheduleVersion.id.desc()).first()
+    latest_version = get_latest_version(db, month_str)
     
     if not latest_version:
         # 如果沒有找到現有版本，則創建一個新版本
@@ -978,53 +824,57 @@ async def save_monthly_schedule(
         db.add(new_version)
         db.commit()
         db.refresh(new_version)
+        latest_version_resolver.remember(new_version)
         latest_version = new_version
     
-    # 無論是否創建新版本，總是需要清空現有排班記錄並重新創建
-    # 清空現有排班記錄
-    db.query(MonthlySchedule).filter(
-        MonthlySchedule.version_id == latest_version.id
-    ).delete()
+    # 與現有版本比對，只寫入有變動的排班記錄
+    # 一次查出所有有效用戶，取代逐一查詢
+    requested_user_ids = set()
+    for schedule_item in schedule_data_list:
+        try:
+            requested_user_ids.add(int(schedule_item.get("user_id")))
+        except (TypeError, ValueError):
+            continue
+    valid_user_ids = {
+        user_id for (user_id,) in db.query(User.id).filter(User.id.in_(requested_user_ids)).all()
+    } if requested_user_ids else set()
+    
+    days_in_month = calendar.monthrange(year, month)[1]
+    month_dates = [date(year, month, day) for day in range(1, days_in_month + 1)]
     
-    # 重新創建排班記錄
+    schedule_rows = []
     for schedule_item in schedule_data_list:
-        user_id = schedule_item.get("user_id")
-        shifts = schedule_item.get("shifts", [])
-        area_codes = schedule_item.get("area_codes", [])
-        special_type = schedule_item.get("special_type")  # 獲取 special_type
-        
-        # 檢查用戶是否存在
-        nurse = db.query(User).filter(User.id == user_id).first()
-        if not nurse:
+        try:
+            user_id = int(schedule_item.get("user_id"))
+        except (TypeError, ValueError):
+            continue
+        if user_id not in valid_user_ids:
             continue  # 跳過無效用戶
         
-        # 為每天創建排班記錄
-        for day, shift in enumerate(shifts, 1):
-            try:
-                # 創建日期
-                schedule_date = date(year, month, day)
-                
-                # 獲取area_code（如果有）
-                area_code = area_codes[day-1] if len(area_codes) >= day else None
-                
-                # 創建排班記錄
-                schedule_entry = MonthlySchedule(
-                    user_id=user_id,
-                    date=schedule_date,
-                    shift_type=shift,
-                    area_code=area_code,
-                    special_type=special_type,  # 設置 special_type
-                    version_id=latest_version.id
-                )
-                db.add(schedule_entry)
-            except Exception as e:
-                logger.error(f"處理護理師 {user_id} 於 {year}-{month}-{day} 的排班記錄時出錯: {str(e)}")
-                continue
+        shifts = schedule_item.get("shifts") or []
+        if len(shifts) > days_in_month:
+            logger.error(f"護理師 {user_id} 的排班天數 {len(shifts)} 超過 {year}年{month}月 的天數，多餘的部分將被忽略")
+        
+        # 為每天建立排班記錄，area_code 不足的日期為 None
+        schedule_rows.extend(build_month_rows(
+            latest_version.id, user_id, month_dates, shifts,
+            area_codes=schedule_item.get("area_codes") or [],
+            special_type=schedule_item.get("special_type")
+        ))
+    
+    changes = apply_month_diff(db, latest_version.id, schedule_rows)
+    refresh_packed_rows(db, latest_version)
+    mark_version_changed(latest_version)
+    record_revision(db, latest_version, "saveMonth", current_user.id)
+    refresh_version_scores(db, latest_version)
     
     # 創建日誌記錄
     log_entry = Log(
         action="保存月度排班表",
-        description=f"{current_user.full_name}保存了{year}年{month}月排班表",
+        description=(
+            f"{current_user.full_name}保存了{year}年{month}月排班表"
+            f"（新增 {changes['inserted']}、更新 {changes['updated']}、刪除 {changes['deleted']}）"
+        ),
         user_id=current_user.id
     )
     db.add(log_entry)
@@ -1037,7 +887,8 @@ async def save_monthly_schedule(
         "message": f"已成功保存{year}年{month}月排班表",
         "data": {
             "version_id": latest_version.id,
-            "version_number": latest_version.version_number
+            "version_number": latest_version.version_number,
+            "changes": changes
         }
     }
 
@@ -1045,7 +896,7 @@ async def save_monthly_schedule(
 async def reset_area_codes(
     data: Dict[str, int],
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_head_nurse_user)  # 只允許護理長和管理員操作
+    current_user: Principal = Depends(get_head_nurse_user)  # 只允許護理長和管理員操作
 ):
     """批量重置指定月份所有排班記錄的area_code為NULL"""
     try:
@@ -1062,10 +913,8 @@ async def reset_area_codes(
         
         month_str = f"{year}{month:02d}"
         
-        # 獲取該月份的排班版本
-        version = db.query(ScheduleVersion).filter(
-            ScheduleVersion.month == month_str
-        ).first()
+        # 獲取該月份的最新排班版本
+        version = get_latest_version(db, month_str)
         
         if not version:
             return {
@@ -1083,6 +932,9 @@ async def reset_area_codes(
         
         result = db.execute(stmt)
         reset_count = result.rowcount
+        refresh_packed_rows(db, version)
+        mark_version_changed(version)
+        record_revision(db, version, "resetAreaCodes", current_user.id)
         
         # 添加操作日誌
         log = Log(
@@ -1137,10 +989,12 @@ async def reset_area_codes(
 async def get_monthly_schedule_details(
     year: int,
     month: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
-    """獲取特定月份的排班詳細記錄，包含所有字段"""
+    """獲取特定月份的排班詳細記錄，包含所有字段，支援 ETag / If-None-Match 條件式請求"""
     try:
         # 確保年月有效
         if month < 1 or month > 12:
@@ -1148,10 +1002,8 @@ async def get_monthly_schedule_details(
         
         month_str = f"{year}{month:02d}"
         
-        # 獲取該月份的排班版本
-        version = db.query(ScheduleVersion).filter(
-            ScheduleVersion.month == month_str
-        ).order_by(ScheduleVersion.id.desc()).first()
+        # 獲取該月份的最新排班版本
+        version = get_latest_version(db, month_str)
         
         if not version:
             return {
@@ -1160,10 +1012,16 @@ async def get_monthly_schedule_details(
                 "data": []
             }
         
+        # 詳細記錄只由版本內容決定，未變更時不需查詢排班記錄
+        etag = make_etag("details", version.id, version.updated_at)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        set_etag_headers(response, etag)
+        
         # 獲取所有排班記錄
         schedules = db.query(MonthlySchedule).filter(
             MonthlySchedule.version_id == version.id
-        ).all()
+        ).order_by(MonthlySchedule.id).all()
         
         # 轉換為字典列表
         result_data = []
@@ -1216,15 +1074,52 @@ async def get_monthly_schedule_details(
             detail=error_msg
         )
 
+@router.get("/schedules/export")
+async def export_schedule_details(
+    start_date: date,
+    end_date: date,
+    format: str = "ndjson",
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_active_user)
+):
+    """
+    串流匯出日期區間內的排班詳細記錄（各月份取最新版本）
+
+    format 可為 ndjson 或 csv；資料以伺服器端游標逐批讀取並逐列輸出。
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"不支援的匯出格式: {format}，可用格式為 ndjson、csv")
+    try:
+        months = months_in_range(start_date, end_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    versions = latest_version_resolver.resolve_many(db, months)
+    version_ids = sorted(version.id for version in versions.values())
+    content, media_type = export_stream(version_ids, start_date, end_date, format)
+    
+    filename = f"schedules_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}.{format}"
+    return StreamingResponse(
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @router.post("/schedules/bulkUpdateAreaCodes", response_model=Dict[str, Any])
 async def bulk_update_area_codes(
     updates: List[Dict[str, Any]],
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
-    """批量更新工作區域分配"""
+    """
+    批量更新工作區域分配
+
+    先驗證全部項目，每個月份只解析一次最新版本，以單一查詢載入所有目標記錄，
+    在記憶體中套用後一次提交；任一項目無效時整批不寫入。
+    """
     try:
-        results = []
+        # 驗證並正規化所有項目
+        items = []
         for update in updates:
             user_id = update.get("user_id")
             date = update.get("date")
@@ -1251,46 +1146,72 @@ async def bulk_update_area_codes(
                 # 如果month已經是字符串，確保它是兩位數格式
                 month_str = f"{year}{month.zfill(2)}"
             
-            # 查找當前最新版本
-            latest_version = db.query(ScheduleVersion).filter(
-                ScheduleVersion.month == month_str
-            ).order_by(ScheduleVersion.id.desc()).first()
-            
-            if not latest_version:
-                raise HTTPException(status_code=404, detail=f"找不到 {year}年{month}月的排班表版本")
-            
-            # 查找此用戶在該日期的排班記錄 - 現在使用date對象進行查詢
-            schedule = db.query(MonthlySchedule).filter(
-                MonthlySchedule.user_id == user_id,
-                MonthlySchedule.date == date_obj
-            ).first()
+            items.append((int(user_id), date_obj, area_code, month_str))
+        
+        if not items:
+            return {"success": True, "results": []}
+        
+        # 每個月份只解析一次最新版本
+        months = {item[3] for item in items}
+        latest_versions = latest_version_resolver.resolve_many(db, months)
+        
+        for month_str in sorted(months):
+            if month_str not in latest_versions:
+                raise HTTPException(status_code=404, detail=f"找不到 {month_str[:4]}年{int(month_str[4:])}月的排班表版本")
+        
+        # 單一查詢載入所有目標記錄（限定各月份的最新版本）
+        version_ids = [version.id for version in latest_versions.values()]
+        existing = {}
+        for schedule in db.query(MonthlySchedule).filter(
+            MonthlySchedule.version_id.in_(version_ids),
+            MonthlySchedule.user_id.in_({item[0] for item in items}),
+            MonthlySchedule.date.in_({item[1] for item in items})
+        ).order_by(MonthlySchedule.id).all():
+            existing[(schedule.version_id, schedule.user_id, schedule.date)] = schedule
+        
+        # 在記憶體中套用更新
+        results = []
+        touched_versions = {}  # 版本ID -> (版本, 受影響的用戶ID)
+        for user_id, date_obj, area_code, month_str in items:
+            latest_version = latest_versions[month_str]
+            key = (latest_version.id, user_id, date_obj)
+            schedule = existing.get(key)
             
-            if schedule:
-                # 更新工作區域編碼
-                schedule.area_code = area_code
-                db.commit()
-                results.append({
-                    "user_id": user_id,
-                    "date": date_obj.isoformat(),
-                    "area_code": area_code,
-                    "status": "updated"
-                })
+            if schedule is not None:
+                if schedule.area_code == area_code:
+                    item_status = "unchanged"
+                else:
+                    # 更新工作區域編碼
+                    schedule.area_code = area_code
+                    item_status = "updated"
             else:
                 # 如果找不到記錄，創建一個新的
-                new_schedule = MonthlySchedule(
+                schedule = MonthlySchedule(
                     user_id=user_id,
                     date=date_obj,
                     area_code=area_code,
                     version_id=latest_version.id
                 )
-                db.add(new_schedule)
-                db.commit()
-                results.append({
-                    "user_id": user_id,
-                    "date": date_obj.isoformat(),
-                    "area_code": area_code,
-                    "status": "created"
-                })
+                db.add(schedule)
+                existing[key] = schedule
+                item_status = "created"
+            
+            if item_status != "unchanged":
+                touched_versions.setdefault(latest_version.id, (latest_version, set()))[1].add(user_id)
+            results.append({
+                "user_id": user_id,
+                "date": date_obj.isoformat(),
+                "area_code": area_code,
+                "version_id": latest_version.id,
+                "status": item_status
+            })
+        
+        # 同步更新受影響人員的緊湊月班表
+        for version, user_ids in touched_versions.values():
+            refresh_packed_rows(db, version, user_ids)
+            mark_version_changed(version)
+            record_revision(db, version, "bulkUpdateAreaCodes", current_user.id, user_ids)
+        db.commit()
         
         return {"success": True, "results": results}
     except ValueError as e:
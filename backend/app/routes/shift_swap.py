@@ -17,6 +17,7 @@ from ..schemas.shift_swap import (
     ValidateSwapRequest
 )
 from ..core.security import get_current_active_user as get_current_user, get_shift_swap_privileged_user
+from ..core.principal import Principal
 from ..models.user import User
 
 router = APIRouter(
@@ -29,7 +30,7 @@ router = APIRouter(
 @router.get("/", response_model=List[ShiftSwapRequestFull])
 async def get_all_shift_swaps(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     skip: int = 0,
     limit: int = 100
 ):
@@ -95,7 +96,7 @@ async def get_all_shift_swaps(
 @router.get("/me", response_model=List[ShiftSwapRequestFull])
 async def get_my_shift_swaps(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     獲取當前用戶的換班請求
@@ -162,7 +163,7 @@ async def get_my_shift_swaps(
 @router.get("/available-months", response_model=List[str])
 def get_available_months(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     # 這裡需要根據你的系統設計返回可用的月份
     # 可能是從排班表或其他相關表中獲取
@@ -180,7 +181,7 @@ def get_available_months(
 def validate_shift_swap(
     validation_data: ValidateSwapRequest,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     request = db.query(ShiftSwapRequest).filter(ShiftSwapRequest.id == validation_data.request_id).first()
     if not request:
@@ -209,7 +210,7 @@ def validate_shift_swap(
 @router.get("/rules", response_model=List[ShiftRuleSchema])
 async def get_shift_rules(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     skip: int = 0,
     limit: int = 100
 ):
@@ -224,7 +225,7 @@ async def get_shift_rules(
 async def create_shift_rule(
     rule: ShiftRuleCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     創建新的班別規則
@@ -255,7 +256,7 @@ async def update_shift_rule(
     rule_id: int,
     rule_update: ShiftRuleUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     更新班別規則
@@ -290,7 +291,7 @@ async def update_shift_rule(
 async def delete_shift_rule(
     rule_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     刪除班別規則（邏輯刪除）
@@ -319,7 +320,7 @@ async def delete_shift_rule(
 async def create_shift_swap(
     request: ShiftSwapRequestCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     創建新的換班請求
@@ -359,7 +360,7 @@ async def create_shift_swap(
 async def get_shift_swap(
     request_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     獲取特定換班請求的詳細信息
@@ -435,7 +436,7 @@ async def update_shift_swap(
     request_id: int,
     request_update: ShiftSwapRequestUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     更新換班請求
@@ -479,7 +480,7 @@ async def update_shift_swap(
 async def accept_shift_swap(
     request_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_shift_swap_privileged_user)
+    current_user: Principal = Depends(get_shift_swap_privileged_user)
 ):
     """
     接受換班請求
@@ -546,7 +547,7 @@ async def accept_shift_swap(
 async def reject_shift_swap(
     request_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     拒絕或駁回換班請求
@@ -591,7 +592,7 @@ async def reject_shift_swap(
 async def update_areas_for_swap(
     updates: List[Dict[str, Any]],
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     批量更新護理師的工作區域代碼 - 專為換班功能提供的路由
@@ -607,7 +608,7 @@ async def update_areas_for_swap(
 async def update_shift_for_swap(
     shift_data: Dict[str, Any],
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     更新護理師的班次 - 專為換班功能提供的路由
@@ -623,7 +624,7 @@ async def update_shift_for_swap(
 async def update_overtime_for_swap(
     overtime_data: Dict[str, Any],
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     更新護理師的加班 - 專為換班功能提供的路由
@@ -686,7 +687,7 @@ async def update_overtime_for_swap(
 async def update_overtime_month_for_swap(
     overtime_data: Dict[str, Any],
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     整月更新護理師的加班 - 專為換班功能提供的路由
@@ -8,8 +8,8 @@ from sqlalchemy.sql import func
 
 from ..core.database import get_db
 from ..core.security import (
-    verify_password, 
-    get_password_hash, 
+    verify_password_async,
+    get_password_hash_async,
     create_access_token, 
     get_current_active_user,
     get_head_nurse_user
@@ -18,6 +18,12 @@ from ..core.config import settings
 from ..models.user import User
 from ..models.log import Log
 from ..schemas.user import UserCreate, UserUpdate, User as UserSchema, Token, PasswordChange
+from ..services.schedule_cache import monthly_schedule_cache
+from ..services.roster import roster_cache
+from ..core.auth_cache import authenticated_user_cache
+from ..core.password_pool import password_hash_pool
+from ..core.db_pool import get_pool_metrics
+from ..core.principal import Principal
 
 # 設置logger
 logger = logging.getLogger(__name__)
@@ -51,7 +57,7 @@ async def login_for_access_token(
             )
         
         # 驗證密碼
-        if not verify_password(form_data.password, user.hashed_password):
+        if not await verify_password_async(form_data.password, user.hashed_password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="用戶名或密碼不正確",
@@ -99,7 +105,7 @@ async def login_for_access_token(
 async def create_user(
     user_in: UserCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_head_nurse_user)
+    current_user: Principal = Depends(get_head_nurse_user)
 ):
     """創建新用戶（僅護理長可操作）"""
     # 檢查用戶名是否已存在
@@ -111,7 +117,7 @@ async def create_user(
         )
     
     # 創建新用戶
-    hashed_password = get_password_hash(user_in.password)
+    hashed_password = await get_password_hash_async(user_in.password)
     db_user = User(
         username=user_in.username,
         email=user_in.email,
@@ -123,6 +129,7 @@ async def create_user(
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    roster_cache.invalidate()
     
     # 添加操作日誌
     log = Log(
@@ -137,9 +144,15 @@ async def create_user(
     return db_user
 
 @router.get("/users/me", response_model=UserSchema)
-async def read_current_user(current_user: User = Depends(get_current_active_user)):
+async def read_current_user(
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_active_user)
+):
     """獲取當前登入用戶資料"""
-    return current_user
+    db_user = db.get(User, current_user.id)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="用戶不存在")
+    return db_user
 
 @router.get("/users", response_model=List[UserSchema])
 async def read_users(
@@ -147,7 +160,7 @@ async def read_users(
     limit: int = 100,
     include_inactive: bool = False,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """獲取所有用戶列表（所有登錄用戶可查看）"""
     query = db.query(User)
@@ -162,13 +175,14 @@ async def read_users(
 @router.post("/heartbeat")
 async def heartbeat(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """心跳端點 - 更新用戶活動時間"""
     try:
-        # 更新當前用戶的活動時間
-        current_user.last_activity_time = func.now()
-        db.add(current_user)
+        # 更新當前用戶的活動時間（直接以 UPDATE 寫入，不需載入 User）
+        db.query(User).filter(User.id == current_user.id).update(
+            {User.last_activity_time: func.now()}, synchronize_session=False
+        )
         db.commit()
         
         return {"status": "success", "message": "心跳更新成功"}
@@ -183,7 +197,7 @@ async def heartbeat(
 @router.get("/online-users", response_model=List[UserSchema])
 async def get_online_users(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """獲取在線用戶列表（最近4分鐘內有活動的用戶）"""
     from datetime import datetime, timedelta
@@ -228,7 +242,7 @@ async def get_online_users(
 @router.get("/debug/online-users-info")
 async def debug_online_users_info(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """調適端點：獲取在線用戶詳細資訊"""
     from datetime import datetime, timedelta
@@ -285,7 +299,7 @@ async def debug_online_users_info(
 @router.get("/debug/timezone-test")
 async def debug_timezone_test(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """調適端點：測試時區轉換功能"""
     from datetime import datetime, timedelta
@@ -335,7 +349,7 @@ async def update_user(
     user_id: int,
     user_in: UserUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_head_nurse_user)
+    current_user: Principal = Depends(get_head_nurse_user)
 ):
     """更新用戶資料（僅護理長可操作）"""
     db_user = db.query(User).filter(User.id == user_id).first()
@@ -348,13 +362,17 @@ async def update_user(
     # 更新用戶資料
     update_data = user_in.dict(exclude_unset=True)
     if "password" in update_data:
-        update_data["hashed_password"] = get_password_hash(update_data.pop("password"))
+        update_data["hashed_password"] = await get_password_hash_async(update_data.pop("password"))
     
     for field, value in update_data.items():
         setattr(db_user, field, value)
     
     db.commit()
     db.refresh(db_user)
+    # 月班表回應包含姓名、角色等用戶資料
+    monthly_schedule_cache.clear()
+    roster_cache.invalidate()
+    authenticated_user_cache.invalidate_user(db_user.id)
     
     # 添加操作日誌
     log = Log(
@@ -372,7 +390,7 @@ async def update_user(
 async def deactivate_user(
     user_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_head_nurse_user)
+    current_user: Principal = Depends(get_head_nurse_user)
 ):
     """停權用戶（僅護理長可操作）"""
     db_user = db.query(User).filter(User.id == user_id).first()
@@ -412,6 +430,9 @@ async def deactivate_user(
         
         db.commit()
         db.refresh(db_user)
+        monthly_schedule_cache.clear()
+        roster_cache.invalidate()
+        authenticated_user_cache.invalidate_user(db_user.id)
         
         return db_user
         
@@ -427,7 +448,7 @@ async def deactivate_user(
 async def activate_user(
     user_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_head_nurse_user)
+    current_user: Principal = Depends(get_head_nurse_user)
 ):
     """啟用用戶（僅護理長可操作）"""
     db_user = db.query(User).filter(User.id == user_id).first()
@@ -460,6 +481,9 @@ async def activate_user(
         
         db.commit()
         db.refresh(db_user)
+        monthly_schedule_cache.clear()
+        roster_cache.invalidate()
+        authenticated_user_cache.invalidate_user(db_user.id)
         
         return db_user
         
@@ -475,19 +499,24 @@ async def activate_user(
 async def change_password(
     password_data: PasswordChange,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """用戶修改自己的密碼"""
+    db_user = db.get(User, current_user.id)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="用戶不存在")
+    
     # 驗證當前密碼
-    if not verify_password(password_data.current_password, current_user.hashed_password):
+    if not await verify_password_async(password_data.current_password, db_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="當前密碼不正確"
         )
     
     # 更新密碼
-    current_user.hashed_password = get_password_hash(password_data.new_password)
+    db_user.hashed_password = await get_password_hash_async(password_data.new_password)
     db.commit()
+    authenticated_user_cache.invalidate_user(current_user.id)
     
     # 添加操作日誌
     log = Log(
@@ -505,7 +534,7 @@ async def change_password(
 async def update_current_user(
     user_in: UserUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """更新當前用戶的個人資料（自己的郵箱、姓名等）"""
     # 提取可以由用戶自己更新的字段
@@ -515,12 +544,19 @@ async def update_current_user(
     allowed_fields = {"email", "full_name"}
     update_data = {k: v for k, v in update_data.items() if k in allowed_fields}
     
+    db_user = db.get(User, current_user.id)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="用戶不存在")
+    
     # 更新用戶資料
     for field, value in update_data.items():
-        setattr(current_user, field, value)
+        setattr(db_user, field, value)
     
     db.commit()
-    db.refresh(current_user)
+    db.refresh(db_user)
+    monthly_schedule_cache.clear()
+    roster_cache.invalidate()
+    authenticated_user_cache.invalidate_user(current_user.id)
     
     # 添加操作日誌
     log = Log(
@@ -531,7 +567,7 @@ async def update_current_user(
     db.add(log)
     db.commit()
     
-    return current_user
+    return db_user
 
 @router.post("/test-login")
 async def test_login(
@@ -553,7 +589,7 @@ async def test_login(
             logger.debug(f"密碼哈希: {user.hashed_password[:10]}...")
             
             # 測試密碼驗證
-            is_valid = verify_password(password, user.hashed_password)
+            is_valid = await verify_password_async(password, user.hashed_password)
             logger.info(f"密碼驗證結果: {is_valid}")
             
             if is_valid:
@@ -567,6 +603,20 @@ async def test_login(
         logger.error(f"測試登錄發生錯誤: {str(e)}")
         return {"status": "error", "message": f"發生錯誤: {str(e)}"}
 
+@router.get("/admin/password-hash-metrics")
+async def get_password_hash_metrics(
+    current_user: Principal = Depends(get_head_nurse_user)
+):
+    """密碼雜湊執行緒池統計（排隊等待與執行時間），用於觀察登入尖峰"""
+    return password_hash_pool.metrics()
+
+@router.get("/admin/db-pool-metrics")
+async def get_db_pool_metrics(
+    current_user: Principal = Depends(get_head_nurse_user)
+):
+    """資料庫連線池統計（取得連線等待時間、飽和度、連線新建 / 關閉次數）"""
+    return get_pool_metrics()
+
 @router.post("/admin/fix-passwords")
 async def fix_all_passwords(
     master_password: str = Form(...),
@@ -584,12 +634,13 @@ async def fix_all_passwords(
         
         for user in users:
             # 為所有用戶重新生成哈希密碼
-            new_hashed_password = get_password_hash("changeme")
+            new_hashed_password = await get_password_hash_async("changeme")
             user.hashed_password = new_hashed_password
             updated_count += 1
         
         # 提交更改
         db.commit()
+        authenticated_user_cache.clear()
         
         return {
             "status": "success", 
@@ -26,6 +26,7 @@ from ..core.database import get_db
 from ..models.user import User
 from ..models.webauthn import WebAuthnCredential
 from ..core.security import get_current_user, create_access_token
+from ..core.principal import Principal
 from ..schemas.webauthn import WebAuthnRegistrationCredential, AuthenticatorAttestationResponseSchema
 from webauthn.helpers.structs import AuthenticatorAttestationResponse
 from ..core.config import settings
@@ -127,7 +128,7 @@ def verify_challenge_token(token: str, expected_user_id: Optional[int], purpose:
 async def register_start(
     request: Request,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """開始WebAuthn註冊流程"""
     logger.info("webauthn register_start user=%s ua=%s origin=%s",
@@ -204,7 +205,7 @@ async def register_finish(
     credential: WebAuthnRegistrationCredential,
     challenge_token: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """完成WebAuthn註冊流程"""
     try:
@@ -489,7 +490,7 @@ async def authenticate_finish(
 @router.get("/credentials")
 async def list_credentials(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """列出用戶的所有passkey"""
     credentials = db.query(WebAuthnCredential).filter(
@@ -508,7 +509,7 @@ async def list_credentials(
 async def delete_credential(
     credential_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """刪除指定的passkey"""
     credential = db.query(WebAuthnCredential).filter(
@@ -527,7 +528,7 @@ async def delete_credential(
 @router.get("/debug/session")
 async def debug_session(
     request: Request,
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """調試端點：檢查session狀態"""
     import time
@@ -562,7 +563,7 @@ async def debug_session(
 @router.post("/test/session")
 async def test_session(
     request: Request,
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """測試端點：檢查 session cookie 是否正確設置"""
     import time
@@ -30,6 +30,17 @@ class BulkOvertimeRecordUpdate(BaseModel):
 class MultipleDatesOvertimeUpdate(BaseModel):
     records: List[Dict]  # 包含多個日期、班次和用戶IDs的記錄列表
 
+# 加班自動分配請求模型
+class OvertimeAllocationRequest(BaseModel):
+    start_year: int
+    start_month: int
+    end_year: int
+    end_month: int
+    mode: str = "full"  # full：全部重新分配；fill：保留現有分配，只補齊缺少的班別
+    include_zero_score_shifts: bool = True  # 是否分配 E、F 班
+    seed: Optional[int] = None  # 指定時分配結果可重現
+    dry_run: Optional[bool] = False  # 只計算並返回結果，不寫入資料庫
+
 # 加班記錄響應模型
 class OvertimeRecord(OvertimeRecordBase):
     id: int
@@ -65,5 +76,15 @@ class BulkOvertimeMonthlyScoreUpdate(BaseModel):
 class OvertimeMonthlyScore(OvertimeMonthlyScoreBase):
     id: int
 
+    class Config:
+        from_attributes = True
+
+# 累計加班分數響應模型
+class OvertimeScoreBalance(BaseModel):
+    user_id: int
+    total_score: int  # 0.01 分為單位
+    months_count: int
+    updated_at: Optional[datetime] = None
+
     class Config:
         from_attributes = True 
\ No newline at end of file
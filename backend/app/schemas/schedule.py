@@ -91,6 +91,16 @@ class GenerateMonthScheduleRequest(BaseModel):
     as_base_version: Optional[bool] = False  # 是否作為基準版本
     temporary: Optional[bool] = False  # 是否為臨時生成（不保存到資料庫）
 
+# 多月份批次生成排班表的請求
+class GenerateScheduleBatchRequest(BaseModel):
+    start_year: int
+    start_month: int
+    end_year: int
+    end_month: int
+    description: Optional[str] = None
+    as_base_version: Optional[bool] = False  # 是否作為基準版本
+    dry_run: Optional[bool] = False  # 只計算並返回結果，不寫入資料庫
+
 # 获取月度排班详情的响应
 class MonthlyScheduleResponse(BaseModel):
     success: bool
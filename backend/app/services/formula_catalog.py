@@ -0,0 +1,171 @@
+"""
+公式班表目錄
+
+以單一 JOIN 查詢載入所有公式班表與其 patterns，整理為不可變的目錄：
+供列表 API 使用的公式 / pattern 資料，以及供排班生成使用的 組別 × 星期 班次矩陣。
+目錄在行程內共用，公式班表更新（PUT）後失效；其他 worker 的目錄在 TTL 到期後重新載入。
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models.formula import FormulaSchedule, FormulaSchedulePattern
+from .schedule_generator import WeekShifts, compile_formula_patterns, compile_week_matrices
+
+
+@dataclass(frozen=True)
+class FormulaPatternEntry:
+    id: int
+    formula_id: int
+    group_number: int
+    day_offset: Optional[int]
+    pattern: Optional[str]
+    shift_type: Optional[str]
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "group_number": self.group_number,
+            "day_offset": self.day_offset,
+            "pattern": self.pattern,
+            "shift_type": self.shift_type
+        }
+
+
+@dataclass(frozen=True)
+class FormulaEntry:
+    id: int
+    name: str
+    identity: Optional[str]
+    num_groups: Optional[int]
+    description: Optional[str]
+    is_active: bool
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+    patterns: Tuple[FormulaPatternEntry, ...]
+
+    def to_dict(self, include_patterns: bool = False) -> Dict[str, Any]:
+        data = {
+            "id": self.id,
+            "name": self.name,
+            "identity": self.identity,
+            "num_groups": self.num_groups,
+            "description": self.description,
+            "is_active": self.is_active,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at
+        }
+        if include_patterns:
+            data["patterns"] = [pattern.to_dict() for pattern in self.patterns]
+        return data
+
+
+class FormulaCatalog:
+    """某一時間點的公式班表快照，建立後不再變動"""
+
+    def __init__(self, formulas: List[FormulaEntry]):
+        self.formulas: Mapping[int, FormulaEntry] = MappingProxyType({formula.id: formula for formula in formulas})
+        self.patterns: Tuple[FormulaPatternEntry, ...] = tuple(
+            pattern for formula in formulas for pattern in formula.patterns
+        )
+        # 與原本逐公式查詢相同：同一組別有多筆時以 id 最小者為準
+        self.week_matrices: Mapping[int, Tuple[WeekShifts, ...]] = MappingProxyType(compile_week_matrices(
+            compile_formula_patterns(
+                (pattern.formula_id, pattern.group_number, pattern.pattern) for pattern in self.patterns
+            )
+        ))
+
+    def active_formulas(self) -> List[FormulaEntry]:
+        return [formula for formula in self.formulas.values() if formula.is_active]
+
+    def get_active(self, formula_id: int) -> Optional[FormulaEntry]:
+        formula = self.formulas.get(formula_id)
+        return formula if formula is not None and formula.is_active else None
+
+    @classmethod
+    def load(cls, db: Session) -> "FormulaCatalog":
+        """以單一 LEFT JOIN 查詢載入所有公式與 patterns"""
+        rows = db.query(FormulaSchedule, FormulaSchedulePattern).outerjoin(
+            FormulaSchedulePattern, FormulaSchedulePattern.formula_id == FormulaSchedule.id
+        ).order_by(
+            FormulaSchedule.id,
+            FormulaSchedulePattern.group_number,
+            FormulaSchedulePattern.id
+        ).all()
+
+        formulas: Dict[int, Tuple[FormulaSchedule, List[FormulaPatternEntry]]] = {}
+        for formula, pattern in rows:
+            _, patterns = formulas.setdefault(formula.id, (formula, []))
+            if pattern is not None:
+                patterns.append(FormulaPatternEntry(
+                    id=pattern.id,
+                    formula_id=pattern.formula_id,
+                    group_number=pattern.group_number,
+                    day_offset=pattern.day_offset,
+                    pattern=pattern.pattern,
+                    shift_type=pattern.shift_type,
+                    created_at=pattern.created_at,
+                    updated_at=pattern.updated_at
+                ))
+
+        return cls([
+            FormulaEntry(
+                id=formula.id,
+                name=formula.name,
+                identity=formula.identity,
+                num_groups=formula.num_groups,
+                description=formula.description,
+                is_active=bool(formula.is_active),
+                created_at=formula.created_at,
+                updated_at=formula.updated_at,
+                patterns=tuple(patterns)
+            )
+            for formula, patterns in formulas.values()
+        ])
+
+
+class FormulaCatalogCache:
+    """行程內共用的公式班表目錄"""
+
+    def __init__(self):
+        self._catalog: Optional[FormulaCatalog] = None
+        self._expires_at = 0.0
+        # 每次失效遞增，避免載入期間發生的失效被較舊的目錄覆蓋
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, db: Session) -> FormulaCatalog:
+        with self._lock:
+            if self._catalog is not None and self._expires_at > time.monotonic():
+                return self._catalog
+            generation = self._generation
+
+        catalog = FormulaCatalog.load(db)
+        with self._lock:
+            if generation == self._generation:
+                self._catalog = catalog
+                self._expires_at = time.monotonic() + settings.FORMULA_CATALOG_TTL_SECONDS
+        return catalog
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._catalog = None
+            self._expires_at = 0.0
+            self._generation += 1
+
+
+# 全局公式班表目錄
+formula_catalog = FormulaCatalogCache()
+
+
+def get_formula_catalog(db: Session) -> FormulaCatalog:
+    return formula_catalog.get(db)
@@ -0,0 +1,426 @@
+"""
+加班自動分配引擎
+
+伺服器端實作 docs/ROUND_ALLOCATION_LOGIC.md 的「統一分數導向輪次分配」：
+依 A → B → C → D（→ E → F）逐班別分配，每輪洗牌剩餘需求、篩選候選人（第 2 輪起
+分配後的潛在分數需 ≤ 0），候選人依目前分數由低到高輪流分配；A、B 班需間隔 7 天。
+
+與前端版本的差異：
+- 白班天數取自月班表的實際白班，而非依 user_id % 4 模擬的出勤率
+- 每次分配立即生效，同一輪中也會檢查同日重複與 A、B 班間隔
+- 不參與自動分配者（麻醉科Leader 等）既有的加班記錄一律保留並視為已分配
+
+分數以每位人員一格的 NumPy 陣列記錄，候選人篩選與排序以向量運算完成。
+"""
+
+import calendar
+import logging
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from ..models.overtime import OvertimeRecord
+from ..models.schedule import MonthlySchedule
+from .overtime_ledger import refresh_month_scores
+from .overtime_records import upsert_overtime_rows
+from .overtime_scoring import (
+    DAY_SHIFT, INTERVAL_SHIFTS, MIN_INTERVAL_DAYS, NO_OVERTIME_PENALTY, OVERTIME_IDENTITY,
+    SHIFT_ALLOCATION_ORDER, SHIFT_SCORES, ZERO_SCORE_SHIFTS
+)
+from .roster import get_roster
+from .schedule_versions import get_latest_version
+
+logger = logging.getLogger(__name__)
+
+# 分數差距在此範圍內視為同分，同分者隨機排序
+SCORE_TIE_EPSILON = 0.01
+
+CC_AREA = "CC"
+
+# full：全部重新分配；fill：保留現有分配，只補齊缺少的班別
+ALLOCATION_MODES = ("full", "fill")
+
+# 班別代碼 → 陣列中的編碼（0 表示未分配）
+SHIFT_CODES = {shift: index + 1 for index, shift in enumerate(SHIFT_ALLOCATION_ORDER)}
+
+Assignments = Dict[date, Dict[int, str]]
+
+
+@dataclass
+class AllocationInput:
+    """一個月份的分配輸入"""
+    year: int
+    month: int
+    user_ids: np.ndarray  # 參與自動分配的人員
+    days: List[date]  # 需要安排加班的日期（週日除外）
+    available: np.ndarray  # [日期, 人員]：當天上白班且非 CC
+    work_days: np.ndarray  # 每人當月（週日除外）白班天數
+    existing: Assignments = field(default_factory=dict)  # 當月既有的加班記錄
+
+    @classmethod
+    def from_day_shifts(
+        cls,
+        year: int,
+        month: int,
+        day_shifts: Iterable[Tuple[int, date, Optional[str]]],
+        existing: Optional[Assignments] = None
+    ) -> "AllocationInput":
+        """由 (user_id, 日期, area_code) 白班清單建立輸入"""
+        days_in_month = calendar.monthrange(year, month)[1]
+        days = [date(year, month, day) for day in range(1, days_in_month + 1)]
+        days = [day for day in days if day.weekday() != 6]
+        day_index = {day: index for index, day in enumerate(days)}
+
+        day_shifts = [item for item in day_shifts if item[1] in day_index]
+        user_ids = np.array(sorted({user_id for user_id, _, _ in day_shifts}), dtype=np.int64)
+        user_index = {int(user_id): index for index, user_id in enumerate(user_ids)}
+
+        available = np.zeros((len(days), len(user_ids)), dtype=bool)
+        work_days = np.zeros(len(user_ids), dtype=np.int64)
+        for user_id, day, area_code in day_shifts:
+            column = user_index[user_id]
+            work_days[column] += 1
+            if area_code != CC_AREA:
+                available[day_index[day], column] = True
+
+        return cls(year, month, user_ids, days, available, work_days, existing or {})
+
+
+@dataclass
+class MonthAllocation:
+    """一個月份的分配結果"""
+    year: int
+    month: int
+    mode: str
+    user_ids: np.ndarray
+    assignments: Assignments  # 分配後整月的加班（含保留的既有記錄）
+    new_assignments: Assignments  # 本次新增的分配
+    overtime_scores: np.ndarray
+    overtime_days: np.ndarray
+    work_days: np.ndarray
+    unfilled: Dict[str, List[date]]
+
+    @property
+    def penalties(self) -> np.ndarray:
+        return NO_OVERTIME_PENALTY * np.maximum(self.work_days - self.overtime_days, 0)
+
+    @property
+    def final_scores(self) -> np.ndarray:
+        return self.overtime_scores + self.penalties
+
+    def statistics(self) -> Dict[str, float]:
+        return score_statistics(self.final_scores)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "year": self.year,
+            "month": self.month,
+            "mode": self.mode,
+            "assignments": _assignments_to_dict(self.assignments),
+            "new_assignments_count": sum(len(marks) for marks in self.new_assignments.values()),
+            "scores": {
+                int(user_id): {
+                    "overtime_score": round(float(self.overtime_scores[index]), 3),
+                    "penalty": round(float(self.penalties[index]), 3),
+                    "total": round(float(self.final_scores[index]), 3),
+                    "overtime_days": int(self.overtime_days[index]),
+                    "work_days": int(self.work_days[index])
+                }
+                for index, user_id in enumerate(self.user_ids)
+            },
+            "unfilled": {
+                shift: [day.isoformat() for day in days]
+                for shift, days in self.unfilled.items() if days
+            },
+            "statistics": self.statistics()
+        }
+
+
+def score_statistics(scores: np.ndarray) -> Dict[str, float]:
+    """分數統計（範圍、平均、偏離零分程度）"""
+    if scores.size == 0:
+        return {
+            "min_score": 0.0, "max_score": 0.0, "avg_score": 0.0, "score_range": 0.0,
+            "std_score": 0.0, "avg_deviation_from_zero": 0.0, "max_deviation_from_zero": 0.0
+        }
+    deviations = np.abs(scores)
+    return {
+        "min_score": round(float(scores.min()), 3),
+        "max_score": round(float(scores.max()), 3),
+        "avg_score": round(float(scores.mean()), 3),
+        "score_range": round(float(scores.max() - scores.min()), 3),
+        "std_score": round(float(scores.std()), 3),
+        "avg_deviation_from_zero": round(float(deviations.mean()), 3),
+        "max_deviation_from_zero": round(float(deviations.max()), 3)
+    }
+
+
+def _assignments_to_dict(assignments: Assignments) -> Dict[str, Dict[int, str]]:
+    return {
+        day.isoformat(): dict(sorted(marks.items()))
+        for day, marks in sorted(assignments.items())
+    }
+
+
+def _interval_ok(assigned: np.ndarray, ordinals: np.ndarray, day: int, column: int, code: int) -> bool:
+    """同一人同一班別（A、B）的日期間隔需 ≥ MIN_INTERVAL_DAYS"""
+    same_shift = assigned[:, column] == code
+    if not same_shift.any():
+        return True
+    return bool(np.abs(ordinals[same_shift] - ordinals[day]).min() >= MIN_INTERVAL_DAYS)
+
+
+def allocate_month(
+    inputs: AllocationInput,
+    mode: str = "full",
+    include_zero_score_shifts: bool = True,
+    rng: Optional[np.random.Generator] = None
+) -> MonthAllocation:
+    """
+    對一個月份執行輪次分配（不讀寫資料庫）
+
+    Args:
+        mode: full 只保留非分配對象的既有記錄；fill 保留所有既有記錄並只補齊缺少的班別
+        include_zero_score_shifts: 是否分配 E、F 班
+    """
+    if mode not in ALLOCATION_MODES:
+        raise ValueError(f"不支援的分配模式: {mode}")
+    rng = rng if rng is not None else np.random.default_rng()
+
+    user_ids = inputs.user_ids
+    user_index = {int(user_id): index for index, user_id in enumerate(user_ids)}
+    day_index = {day: index for index, day in enumerate(inputs.days)}
+    ordinals = np.array([day.toordinal() for day in inputs.days], dtype=np.int64)
+    available = inputs.available
+    work_days = inputs.work_days
+
+    overtime_scores = np.zeros(len(user_ids), dtype=np.float64)
+    overtime_days = np.zeros(len(user_ids), dtype=np.int64)
+    assigned = np.zeros((len(inputs.days), len(user_ids)), dtype=np.int8)
+    filled = np.zeros((len(inputs.days), len(SHIFT_ALLOCATION_ORDER) + 1), dtype=bool)
+
+    # 保留的既有記錄：fill 模式全部保留；full 模式只保留不參與自動分配的人員
+    assignments: Assignments = {}
+    for day, marks in inputs.existing.items():
+        for user_id, shift in marks.items():
+            column = user_index.get(user_id)
+            if mode == "full" and column is not None:
+                continue
+            assignments.setdefault(day, {})[user_id] = shift
+            row = day_index.get(day)
+            if row is None or shift not in SHIFT_CODES:
+                continue
+            filled[row, SHIFT_CODES[shift]] = True
+            if column is not None:
+                assigned[row, column] = SHIFT_CODES[shift]
+                overtime_scores[column] += SHIFT_SCORES[shift]
+                overtime_days[column] += 1
+
+    new_assignments: Assignments = {}
+    unfilled: Dict[str, List[date]] = {}
+    shift_order = [
+        shift for shift in SHIFT_ALLOCATION_ORDER
+        if include_zero_score_shifts or shift not in ZERO_SCORE_SHIFTS
+    ]
+
+    for shift in shift_order:
+        code = SHIFT_CODES[shift]
+        shift_score = SHIFT_SCORES[shift]
+        # 平日需要 A-F 班，週六只需要 A 班
+        demands = [
+            row for row, day in enumerate(inputs.days)
+            if (shift == "A" or day.weekday() != 5) and not filled[row, code]
+        ]
+        if not demands:
+            continue
+        eligible = available[demands].any(axis=0)
+
+        remaining = [int(row) for row in rng.permutation(demands)]
+        round_number = 1
+        while remaining:
+            if round_number > 1:
+                rng.shuffle(remaining)
+
+            # 第 2 輪起，分配後的潛在分數（含白班負分）需 ≤ 0
+            mask = eligible.copy()
+            if round_number > 1:
+                potential = (
+                    overtime_scores + shift_score
+                    + NO_OVERTIME_PENALTY * np.maximum(work_days - (overtime_days + 1), 0)
+                )
+                mask &= potential <= 0
+            candidates = np.flatnonzero(mask)
+            if candidates.size == 0:
+                break
+
+            # 分數越低越優先，同分者隨機排序
+            order = np.lexsort((
+                rng.random(candidates.size),
+                np.floor(overtime_scores[candidates] / SCORE_TIE_EPSILON)
+            ))
+            candidates = candidates[order]
+
+            cursor = 0
+            unassigned = []
+            for row in remaining:
+                chosen = None
+                for _ in range(candidates.size):
+                    column = candidates[cursor % candidates.size]
+                    cursor += 1
+                    if not available[row, column] or assigned[row, column]:
+                        continue
+                    if shift in INTERVAL_SHIFTS and not _interval_ok(assigned, ordinals, row, column, code):
+                        continue
+                    chosen = column
+                    break
+
+                if chosen is None:
+                    unassigned.append(row)
+                    continue
+
+                day = inputs.days[row]
+                user_id = int(user_ids[chosen])
+                assigned[row, chosen] = code
+                overtime_scores[chosen] += shift_score
+                overtime_days[chosen] += 1
+                assignments.setdefault(day, {})[user_id] = shift
+                new_assignments.setdefault(day, {})[user_id] = shift
+
+            if len(unassigned) == len(remaining):
+                break
+            remaining = unassigned
+            round_number += 1
+
+        if remaining:
+            unfilled[shift] = sorted(inputs.days[row] for row in remaining)
+            logger.info(f"{inputs.year}年{inputs.month}月 {shift}班仍有 {len(remaining)} 個需求未分配")
+
+    return MonthAllocation(
+        year=inputs.year,
+        month=inputs.month,
+        mode=mode,
+        user_ids=user_ids,
+        assignments=assignments,
+        new_assignments=new_assignments,
+        overtime_scores=overtime_scores,
+        overtime_days=overtime_days,
+        work_days=work_days,
+        unfilled=unfilled
+    )
+
+
+def _month_bounds(year: int, month: int) -> Tuple[date, date]:
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def load_allocation_input(db: Session, year: int, month: int) -> AllocationInput:
+    """讀取月份最新版本的白班與當月既有加班記錄"""
+    version = get_latest_version(db, f"{year}{month:02d}")
+    if not version:
+        raise ValueError(f"找不到 {year}年{month}月的排班表")
+
+    roster = get_roster(db).by_id
+    rows = db.query(
+        MonthlySchedule.user_id,
+        MonthlySchedule.date,
+        MonthlySchedule.area_code
+    ).filter(
+        MonthlySchedule.version_id == version.id,
+        MonthlySchedule.shift_type == DAY_SHIFT
+    ).all()
+
+    # 只有麻醉專科護理師參與自動分配（護理長與麻醉科Leader 除外）
+    day_shifts = []
+    for user_id, day, area_code in rows:
+        entry = roster.get(user_id)
+        if entry is None or entry.role == "head_nurse" or entry.identity != OVERTIME_IDENTITY:
+            continue
+        day_shifts.append((user_id, day, area_code))
+
+    month_start, month_end = _month_bounds(year, month)
+    existing: Assignments = {}
+    for user_id, day, shift in db.query(
+        OvertimeRecord.user_id,
+        OvertimeRecord.date,
+        OvertimeRecord.overtime_shift
+    ).filter(
+        OvertimeRecord.date >= month_start,
+        OvertimeRecord.date <= month_end
+    ).all():
+        if shift:
+            existing.setdefault(day, {})[user_id] = shift
+
+    return AllocationInput.from_day_shifts(year, month, day_shifts, existing)
+
+
+def save_month_allocation(db: Session, allocation: MonthAllocation) -> int:
+    """
+    寫入分配結果（不提交）
+
+    full 模式先刪除分配對象當月的加班記錄再寫入其所有分配；fill 模式只寫入新增的分配。
+    """
+    if allocation.mode == "full":
+        month_start, month_end = _month_bounds(allocation.year, allocation.month)
+        user_ids = [int(user_id) for user_id in allocation.user_ids]
+        if user_ids:
+            db.query(OvertimeRecord).filter(
+                OvertimeRecord.user_id.in_(user_ids),
+                OvertimeRecord.date >= month_start,
+                OvertimeRecord.date <= month_end
+            ).delete(synchronize_session=False)
+        pool = set(user_ids)
+        source = {
+            day: {user_id: shift for user_id, shift in marks.items() if user_id in pool}
+            for day, marks in allocation.assignments.items()
+        }
+    else:
+        source = allocation.new_assignments
+
+    rows = [
+        {"user_id": user_id, "date": day, "overtime_shift": shift}
+        for day, marks in source.items()
+        for user_id, shift in marks.items()
+    ]
+    # fill 模式可能遇到班別為空的既有記錄，以 ON CONFLICT 更新
+    upsert_overtime_rows(db, rows)
+    return len(rows)
+
+
+def allocate_overtime(
+    db: Session,
+    months: Sequence[Tuple[int, int]],
+    mode: str = "full",
+    include_zero_score_shifts: bool = True,
+    seed: Optional[int] = None,
+    dry_run: bool = False
+) -> Dict[str, Any]:
+    """
+    依序分配多個月份，dry_run 以外寫入 overtime_records 並更新加班分數帳本（由呼叫端提交）
+
+    各月份獨立計分；指定 seed 時結果可重現。
+    """
+    rng = np.random.default_rng(seed)
+    results = []
+    records_count = 0
+    for year, month in months:
+        allocation = allocate_month(
+            load_allocation_input(db, year, month),
+            mode=mode,
+            include_zero_score_shifts=include_zero_score_shifts,
+            rng=rng
+        )
+        if not dry_run:
+            records_count += save_month_allocation(db, allocation)
+            refresh_month_scores(db, get_latest_version(db, f"{year}{month:02d}"), year, month)
+        results.append(allocation.to_dict())
+        logger.info(
+            f"{year}年{month}月加班分配完成：新增 {results[-1]['new_assignments_count']} 筆，"
+            f"平均偏離零分 {results[-1]['statistics']['avg_deviation_from_zero']}"
+        )
+
+    if not dry_run:
+        db.flush()
+    return {"months": results, "records_count": records_count}
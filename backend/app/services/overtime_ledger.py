@@ -0,0 +1,272 @@
+"""
+加班分數帳本
+
+月度分數（overtime_monthly_scores）與每人累計分數（overtime_score_balances）在加班記錄
+或白班變動時，只針對受影響的 (人員, 月份) 重新計分，再鎖定受影響人員的累計分數列、
+由月度分數重新加總，公平性統計只需讀取每人一列，不必再由整年的加班記錄重算。
+
+計分方式與前端 OvertimeStaff 相同：當月（週日除外）每個白班日，有加班得該班別分數，
+沒有加班扣 0.365 分；麻醉科Leader 只記錄天數不計分。分數以 0.01 分為單位存成整數。
+"""
+
+import calendar
+import json
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models.overtime import OvertimeMonthlyScore, OvertimeRecord, OvertimeScoreBalance
+from ..models.schedule import MonthlySchedule, ScheduleVersion
+from .overtime_scoring import DAY_SHIFT, LEADER_IDENTITY, NO_OVERTIME_PENALTY, OVERTIME_IDENTITY, SHIFT_SCORES
+from .roster import get_roster
+from .schedule_versions import get_latest_version
+
+logger = logging.getLogger(__name__)
+
+SCORED_IDENTITIES = (OVERTIME_IDENTITY, LEADER_IDENTITY)
+# total_score 的單位（與前端 Math.round(score * 100) 一致）
+SCORE_SCALE = 100
+
+
+@dataclass(frozen=True)
+class MonthScore:
+    """單一人員單月的分數"""
+    score: float
+    white_shift_days: int
+    overtime_count: int
+
+    @property
+    def total_score(self) -> int:
+        return int(round(self.score * SCORE_SCALE))
+
+    @property
+    def details(self) -> str:
+        return json.dumps({
+            "whiteShiftDays": self.white_shift_days,
+            "overtimeCount": self.overtime_count,
+            "rawScore": self.score
+        })
+
+
+def compute_month_scores(
+    db: Session,
+    version: Optional[ScheduleVersion],
+    year: int,
+    month: int,
+    user_ids: Optional[Set[int]] = None
+) -> Dict[int, MonthScore]:
+    """依版本的白班與當月加班記錄計算分數，只包含出現在該版本中的計分對象"""
+    if version is None:
+        return {}
+
+    targets = {
+        entry.id: entry for entry in get_roster(db).entries
+        if entry.identity in SCORED_IDENTITIES and entry.role != "head_nurse"
+        and (user_ids is None or entry.id in user_ids)
+    }
+    if not targets:
+        return {}
+
+    month_start = date(year, month, 1)
+    month_end = date(year, month, calendar.monthrange(year, month)[1])
+
+    present: Set[int] = set()
+    day_shifts: Dict[int, list] = defaultdict(list)
+    for user_id, day, shift_type in db.query(
+        MonthlySchedule.user_id,
+        MonthlySchedule.date,
+        MonthlySchedule.shift_type
+    ).filter(
+        MonthlySchedule.version_id == version.id,
+        MonthlySchedule.user_id.in_(list(targets))
+    ).all():
+        present.add(user_id)
+        if shift_type == DAY_SHIFT and day.weekday() != 6:
+            day_shifts[user_id].append(day)
+
+    overtime = {
+        (user_id, day): shift
+        for user_id, day, shift in db.query(
+            OvertimeRecord.user_id,
+            OvertimeRecord.date,
+            OvertimeRecord.overtime_shift
+        ).filter(
+            OvertimeRecord.user_id.in_(list(present)),
+            OvertimeRecord.date >= month_start,
+            OvertimeRecord.date <= month_end
+        ).all()
+        if shift
+    } if present else {}
+
+    scores = {}
+    for user_id in present:
+        is_leader = targets[user_id].identity == LEADER_IDENTITY
+        score = 0.0
+        overtime_count = 0
+        for day in day_shifts[user_id]:
+            shift = overtime.get((user_id, day))
+            if shift:
+                overtime_count += 1
+                if not is_leader:
+                    score += SHIFT_SCORES.get(shift, 0.0)
+            elif not is_leader:
+                score += NO_OVERTIME_PENALTY
+        scores[user_id] = MonthScore(round(score, 2), len(day_shifts[user_id]), overtime_count)
+    return scores
+
+
+def write_month_scores(
+    db: Session,
+    year: int,
+    month: int,
+    scores: Dict[int, MonthScore],
+    scope: Optional[Set[int]] = None
+) -> Set[int]:
+    """
+    以 INSERT ... ON CONFLICT 寫入月度分數並刪除不再計分的人員（不提交）
+
+    Returns:
+        月度分數有寫入或刪除的人員
+    """
+    if scores:
+        stmt = pg_insert(OvertimeMonthlyScore).values([
+            {
+                "user_id": user_id,
+                "year": year,
+                "month": month,
+                "total_score": score.total_score,
+                "details": score.details
+            }
+            for user_id, score in scores.items()
+        ])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[OvertimeMonthlyScore.user_id, OvertimeMonthlyScore.year, OvertimeMonthlyScore.month],
+            set_={"total_score": stmt.excluded.total_score, "details": stmt.excluded.details}
+        ))
+
+    stale = delete(OvertimeMonthlyScore).where(
+        OvertimeMonthlyScore.year == year,
+        OvertimeMonthlyScore.month == month,
+        OvertimeMonthlyScore.user_id.notin_(list(scores))
+    )
+    if scope is not None:
+        stale = stale.where(OvertimeMonthlyScore.user_id.in_(list(scope)))
+    removed = db.execute(
+        stale.returning(OvertimeMonthlyScore.user_id),
+        execution_options={"synchronize_session": False}
+    ).scalars().all()
+    return set(scores) | {user_id for user_id in removed if user_id is not None}
+
+
+def recompute_balances(db: Session, user_ids: Iterable[int]) -> None:
+    """
+    鎖定人員的累計分數列後由月度分數重新加總（不提交）
+
+    寫入同一人員分數的交易會在鎖上依序執行；取得鎖之後的加總會看到先前交易已提交的月度分數，
+    不會像差額累加一樣因為同時讀到舊值而偏移。沒有任何月度分數的人員不保留累計分數列。
+    """
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+
+    db.flush()
+    db.execute(
+        pg_insert(OvertimeScoreBalance).values([
+            {"user_id": user_id, "total_score": 0, "months_count": 0} for user_id in user_ids
+        ]).on_conflict_do_nothing(index_elements=[OvertimeScoreBalance.user_id])
+    )
+    db.execute(
+        select(OvertimeScoreBalance.id)
+        .where(OvertimeScoreBalance.user_id.in_(user_ids))
+        .order_by(OvertimeScoreBalance.user_id)
+        .with_for_update()
+    )
+
+    owner = OvertimeMonthlyScore.user_id == OvertimeScoreBalance.user_id
+    db.execute(
+        update(OvertimeScoreBalance)
+        .where(OvertimeScoreBalance.user_id.in_(user_ids))
+        .values(
+            total_score=select(func.coalesce(func.sum(OvertimeMonthlyScore.total_score), 0))
+            .where(owner).scalar_subquery(),
+            months_count=select(func.count(OvertimeMonthlyScore.id)).where(owner).scalar_subquery(),
+            updated_at=func.now()
+        ),
+        execution_options={"synchronize_session": False}
+    )
+    db.execute(
+        delete(OvertimeScoreBalance).where(
+            OvertimeScoreBalance.user_id.in_(user_ids),
+            OvertimeScoreBalance.months_count == 0
+        ),
+        execution_options={"synchronize_session": False}
+    )
+
+
+def refresh_month_scores(
+    db: Session,
+    version: Optional[ScheduleVersion],
+    year: int,
+    month: int,
+    user_ids: Optional[Iterable[int]] = None
+) -> int:
+    """
+    重新計算 (人員, 月份) 的月度分數並更新累計分數（不提交）
+
+    user_ids 為 None 時處理該月所有計分對象；不再出現於班表中的人員，其月度分數會被移除。
+    """
+    if not settings.OVERTIME_SCORE_LEDGER_ENABLED:
+        return 0
+
+    scope = set(user_ids) if user_ids is not None else None
+    if scope is not None and not scope:
+        return 0
+
+    db.flush()
+    scores = compute_month_scores(db, version, year, month, scope)
+    recompute_balances(db, write_month_scores(db, year, month, scores, scope))
+    return len(scores)
+
+
+def refresh_version_scores(
+    db: Session,
+    version: ScheduleVersion,
+    user_ids: Optional[Iterable[int]] = None
+) -> int:
+    """班表版本內容變動後更新分數；只有該月最新版本的變動會影響分數"""
+    latest = get_latest_version(db, version.month)
+    if latest is not None and latest.id != version.id:
+        return 0
+    return refresh_month_scores(db, version, int(version.month[:4]), int(version.month[4:]), user_ids)
+
+
+def refresh_overtime_scores(db: Session, entries: Iterable[Tuple[int, date]]) -> int:
+    """加班記錄變動後更新分數，entries 為受影響的 (user_id, 日期)"""
+    months: Dict[Tuple[int, int], Set[int]] = defaultdict(set)
+    for user_id, day in entries:
+        months[(day.year, day.month)].add(user_id)
+
+    refreshed = 0
+    for (year, month), user_ids in months.items():
+        version = get_latest_version(db, f"{year}{month:02d}")
+        refreshed += refresh_month_scores(db, version, year, month, user_ids)
+    return refreshed
+
+
+def rebuild_balances(db: Session, user_ids: Optional[Iterable[int]] = None) -> None:
+    """由月度分數重建累計分數（不提交），用於直接寫入月度分數之後或修復資料"""
+    if user_ids is None:
+        db.flush()
+        user_ids = {
+            user_id for (user_id,) in db.query(OvertimeMonthlyScore.user_id).filter(
+                OvertimeMonthlyScore.user_id.isnot(None)
+            ).distinct().all()
+        } | {user_id for (user_id,) in db.query(OvertimeScoreBalance.user_id).all()}
+    recompute_balances(db, user_ids)
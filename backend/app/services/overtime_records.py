@@ -0,0 +1,177 @@
+"""
+加班記錄批次寫入
+
+- 整月保存（換班流程與護理長的整月加班表）以單一批次處理：
+  一次 IN 查詢驗證所有人員、一次刪除整個月份區間、一次多列 INSERT 寫入新記錄。
+- 批量建立加班記錄與月度分數以 INSERT ... ON CONFLICT 一次寫入整批，
+  依 (user_id, date)、(user_id, year, month) 唯一索引決定新增或更新。
+"""
+
+import calendar
+import logging
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func, insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from ..models.overtime import OvertimeMonthlyScore, OvertimeRecord
+from ..models.user import User
+
+logger = logging.getLogger(__name__)
+
+# 前端以字串傳來的空班別
+EMPTY_SHIFT_VALUES = (None, "", "null", "undefined")
+
+
+@dataclass
+class BulkMonthWriteResult:
+    """整月批次寫入的統計"""
+    inserted: int = 0
+    deleted: int = 0
+    skipped_records: int = 0
+    unknown_user_ids: List[int] = field(default_factory=list)
+    entries: List[Tuple[int, date]] = field(default_factory=list)  # 受影響的 (user_id, 月份)
+
+
+def parse_bulk_month_records(records: Iterable[Any]) -> Tuple[Dict[Tuple[int, date], str], Set[int], Set[date], int]:
+    """
+    解析整月批次記錄 [{date, overtime_shift, user_ids}]
+
+    Returns:
+        ({(user_id, 日期): 班別}（空班別表示只清除）, 所有人員, 所有日期, 略過的記錄數)
+    """
+    shifts: Dict[Tuple[int, date], str] = {}
+    user_ids: Set[int] = set()
+    dates: Set[date] = set()
+    skipped = 0
+
+    for record in records:
+        if not isinstance(record, dict) or not record.get("date") or not record.get("user_ids"):
+            skipped += 1
+            continue
+        try:
+            day = datetime.strptime(record["date"], "%Y-%m-%d").date()
+            record_user_ids = [int(user_id) for user_id in record["user_ids"]]
+        except (TypeError, ValueError):
+            skipped += 1
+            continue
+
+        shift = record.get("overtime_shift")
+        shift = "" if shift in EMPTY_SHIFT_VALUES else shift
+        dates.add(day)
+        for user_id in record_user_ids:
+            user_ids.add(user_id)
+            shifts[(user_id, day)] = shift
+
+    return shifts, user_ids, dates, skipped
+
+
+def replace_month_overtime(db: Session, records: Iterable[Any]) -> BulkMonthWriteResult:
+    """
+    以批次記錄取代相關人員在涵蓋月份內的加班記錄（不提交）
+
+    刪除區間為記錄中最早日期的月初到最晚日期的月底；只寫入存在的人員與非空班別。
+    """
+    shifts, user_ids, dates, skipped = parse_bulk_month_records(records)
+    result = BulkMonthWriteResult(skipped_records=skipped)
+    if not shifts:
+        return result
+
+    existing_ids = existing_user_ids(db, user_ids)
+    result.unknown_user_ids = sorted(user_ids - existing_ids)
+
+    first_date, last_date = min(dates), max(dates)
+    month_start = date(first_date.year, first_date.month, 1)
+    month_end = date(last_date.year, last_date.month, calendar.monthrange(last_date.year, last_date.month)[1])
+
+    result.deleted = db.query(OvertimeRecord).filter(
+        OvertimeRecord.user_id.in_(list(user_ids)),
+        OvertimeRecord.date >= month_start,
+        OvertimeRecord.date <= month_end
+    ).delete(synchronize_session=False)
+
+    rows = [
+        {"user_id": user_id, "date": day, "overtime_shift": shift}
+        for (user_id, day), shift in shifts.items()
+        if shift and user_id in existing_ids
+    ]
+    if rows:
+        db.execute(insert(OvertimeRecord), rows)
+    result.inserted = len(rows)
+    result.entries = [(user_id, day) for user_id in existing_ids for day in _month_starts(month_start, month_end)]
+    return result
+
+
+def _month_starts(start: date, end: date) -> List[date]:
+    months = []
+    current = date(start.year, start.month, 1)
+    while current <= end:
+        months.append(current)
+        current = date(current.year + current.month // 12, current.month % 12 + 1, 1)
+    return months
+
+
+def existing_user_ids(db: Session, user_ids: Iterable[int]) -> Set[int]:
+    """以單一 IN 查詢取得存在的人員"""
+    user_ids = list(set(user_ids))
+    if not user_ids:
+        return set()
+    return {user_id for (user_id,) in db.query(User.id).filter(User.id.in_(user_ids)).all()}
+
+
+def upsert_overtime_rows(
+    db: Session,
+    rows: Iterable[Dict[str, Any]],
+    returning: bool = False
+) -> Optional[List[OvertimeRecord]]:
+    """
+    以單一 INSERT ... ON CONFLICT (user_id, date) 寫入加班記錄（不提交）
+
+    同一批中重複的 (user_id, date) 以最後一筆為準。returning 為 True 時返回寫入後的記錄。
+    """
+    values = list({(row["user_id"], row["date"]): row for row in rows}.values())
+    if not values:
+        return [] if returning else None
+
+    stmt = pg_insert(OvertimeRecord).values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[OvertimeRecord.user_id, OvertimeRecord.date],
+        set_={"overtime_shift": stmt.excluded.overtime_shift, "updated_at": func.now()}
+    )
+    if not returning:
+        db.execute(stmt)
+        return None
+    records = db.scalars(
+        stmt.returning(OvertimeRecord),
+        execution_options={"populate_existing": True}
+    ).all()
+    return sorted(records, key=lambda record: record.date)
+
+
+def upsert_monthly_scores(db: Session, scores: Iterable[Dict[str, Any]]) -> List[OvertimeMonthlyScore]:
+    """
+    以單一 INSERT ... ON CONFLICT (user_id, year, month) 寫入月度分數（不提交）
+
+    不存在的人員會被略過；同一批中重複的 (user_id, year, month) 以最後一筆為準。
+    """
+    scores = list(scores)
+    valid_ids = existing_user_ids(db, [score["user_id"] for score in scores])
+    values = list({
+        (score["user_id"], score["year"], score["month"]): score
+        for score in scores if score["user_id"] in valid_ids
+    }.values())
+    if not values:
+        return []
+
+    stmt = pg_insert(OvertimeMonthlyScore).values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[OvertimeMonthlyScore.user_id, OvertimeMonthlyScore.year, OvertimeMonthlyScore.month],
+        set_={"total_score": stmt.excluded.total_score, "details": stmt.excluded.details}
+    )
+    return db.scalars(
+        stmt.returning(OvertimeMonthlyScore),
+        execution_options={"populate_existing": True}
+    ).all()
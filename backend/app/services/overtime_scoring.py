@@ -0,0 +1,21 @@
+"""
+加班計分常數（與 frontend/src/constants/overtimeConstants.js 一致）
+
+供加班自動分配與加班分數帳本共用。
+"""
+
+# 班別分數
+SHIFT_SCORES = {"A": 2.0, "B": 1.0, "C": 0.8, "D": 0.3, "E": 0.0, "F": 0.0}
+# 未加班白班的負分
+NO_OVERTIME_PENALTY = -0.365
+SHIFT_ALLOCATION_ORDER = ("A", "B", "C", "D", "E", "F")
+ZERO_SCORE_SHIFTS = ("E", "F")
+# 需要最小間隔的班別
+INTERVAL_SHIFTS = ("A", "B")
+MIN_INTERVAL_DAYS = 7
+
+# 月班表中的白班代碼；只有當天上白班的人可以加班
+DAY_SHIFT = "A"
+# 參與加班分配與計分的身分；麻醉科Leader 只記錄天數不計分、不參與自動分配
+OVERTIME_IDENTITY = "麻醉專科護理師"
+LEADER_IDENTITY = "麻醉科Leader"
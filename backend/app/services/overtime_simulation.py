@@ -0,0 +1,236 @@
+"""
+加班分數平衡模擬
+
+以蒙地卡羅方式模擬多個月份的加班分配，評估分數表（各班別分數與未加班負分）
+在不同人數與出勤型態下，長期累計分數是否在 0 分附近震盪，以及分數的離散程度。
+
+模擬以 [試驗, 人員] 的 NumPy 陣列同時進行所有試驗：
+- 每天每位人員依其出勤率決定是否上白班（週日不排加班）
+- 依 A → B → C → D（→ E → F）逐班別、以打亂的日期順序分配，平日需要 A-F 班，週六只需要 A 班
+- 每個名額分配給當天上白班、當天尚未加班、符合 A、B 班 7 天間隔且分數最低的人
+- 月底依未加班的白班天數扣分
+
+分配規則是伺服器端分配引擎（overtime_allocation）的簡化版：不做第 2 輪起的潛在分數篩選，
+以便向量化並在數秒內模擬數千個月份。
+"""
+
+import calendar
+from dataclasses import dataclass, field, replace
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .overtime_scoring import (
+    INTERVAL_SHIFTS, MIN_INTERVAL_DAYS, NO_OVERTIME_PENALTY, SHIFT_ALLOCATION_ORDER, SHIFT_SCORES, ZERO_SCORE_SHIFTS
+)
+
+# 同分時以微小亂數決定順序
+TIE_BREAK_NOISE = 1e-6
+
+# 出勤型態：名稱 → 每位人員的白班出勤率（人數多於清單時循環使用）
+ATTENDANCE_PATTERNS: Dict[str, Tuple[float, ...]] = {
+    "normal": (0.9,),
+    "high": (0.95,),
+    "low": (0.8,),
+    "mixed": (0.95, 0.9, 0.9, 0.9, 0.8, 0.5),
+    "with_leave": (0.9, 0.9, 0.9, 0.9, 0.9, 0.3),
+}
+
+
+@dataclass(frozen=True)
+class ScoreTable:
+    """分數表"""
+    scores: Dict[str, float] = field(default_factory=lambda: dict(SHIFT_SCORES))
+    no_overtime_penalty: float = NO_OVERTIME_PENALTY
+
+    def vector(self) -> np.ndarray:
+        """依 SHIFT_ALLOCATION_ORDER 排列的班別分數"""
+        return np.array([self.scores.get(shift, 0.0) for shift in SHIFT_ALLOCATION_ORDER], dtype=np.float64)
+
+    def label(self) -> str:
+        shifts = ", ".join(f"{shift}={self.scores.get(shift, 0.0):g}" for shift in SHIFT_ALLOCATION_ORDER)
+        return f"{shifts}, 未加班={self.no_overtime_penalty:g}"
+
+
+@dataclass(frozen=True)
+class SimulationConfig:
+    """模擬設定"""
+    staff_count: int = 27
+    months: int = 12
+    trials: int = 100
+    start_year: int = 2026
+    start_month: int = 1
+    attendance: Tuple[float, ...] = ATTENDANCE_PATTERNS["normal"]
+    score_table: ScoreTable = field(default_factory=ScoreTable)
+    # True 時以累計分數決定分配順序（跨月延續）；False 時與正式分配相同，每月由 0 分開始
+    carry_over: bool = False
+    include_zero_score_shifts: bool = True
+    seed: Optional[int] = None
+
+    def attendance_rates(self) -> np.ndarray:
+        if not self.attendance:
+            raise ValueError("出勤率不可為空")
+        rates = np.resize(np.asarray(self.attendance, dtype=np.float64), self.staff_count)
+        if ((rates < 0) | (rates > 1)).any():
+            raise ValueError("出勤率需介於 0 與 1 之間")
+        return rates
+
+    def month_list(self) -> List[Tuple[int, int]]:
+        months = []
+        year, month = self.start_year, self.start_month
+        for _ in range(self.months):
+            months.append((year, month))
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return months
+
+
+@dataclass
+class SimulationResult:
+    """模擬結果；分數陣列的形狀皆為 [試驗, 月份, 人員]"""
+    config: SimulationConfig
+    monthly_scores: np.ndarray
+    white_days: np.ndarray
+    overtime_days: np.ndarray
+    unfilled_slots: np.ndarray  # [試驗, 月份]
+    total_slots: np.ndarray  # [月份]
+
+    @property
+    def balances(self) -> np.ndarray:
+        """各月月底的累計分數"""
+        return np.cumsum(self.monthly_scores, axis=1)
+
+    def summary(self) -> Dict[str, Any]:
+        balances = self.balances
+        final = balances[:, -1, :]
+        per_month = self.monthly_scores
+        return {
+            "score_table": self.config.score_table.label(),
+            "staff_count": self.config.staff_count,
+            "months": self.config.months,
+            "trials": self.config.trials,
+            "carry_over": self.config.carry_over,
+            # 單月分數：所有試驗、月份、人員合併統計
+            "monthly_mean": round(float(per_month.mean()), 3),
+            "monthly_std": round(float(per_month.std(axis=2).mean()), 3),
+            "monthly_range": round(float(np.ptp(per_month, axis=2).mean()), 3),
+            # 期末累計分數：每次試驗內的離散程度取平均
+            "final_mean": round(float(final.mean()), 3),
+            "final_std": round(float(final.std(axis=1).mean()), 3),
+            "final_range": round(float(np.ptp(final, axis=1).mean()), 3),
+            "final_max_abs": round(float(np.abs(final).max(axis=1).mean()), 3),
+            # 每月平均累計分數的趨勢（接近 0 表示長期平衡）
+            "drift_per_month": round(float(final.mean() / self.config.months), 3),
+            "unfilled_ratio": round(float(self.unfilled_slots.sum() / (self.total_slots.sum() * self.config.trials)), 4)
+            if self.total_slots.sum() else 0.0,
+        }
+
+
+def _month_days(year: int, month: int) -> List[date]:
+    days_in_month = calendar.monthrange(year, month)[1]
+    return [
+        day for day in (date(year, month, index) for index in range(1, days_in_month + 1))
+        if day.weekday() != 6
+    ]
+
+
+def simulate(config: SimulationConfig) -> SimulationResult:
+    """執行蒙地卡羅模擬"""
+    if config.staff_count <= 0 or config.months <= 0 or config.trials <= 0:
+        raise ValueError("人數、月份數與試驗次數需大於 0")
+
+    rng = np.random.default_rng(config.seed)
+    trials, staff = config.trials, config.staff_count
+    rates = config.attendance_rates()
+    shift_scores = config.score_table.vector()
+    penalty = config.score_table.no_overtime_penalty
+    shifts = [
+        (index, shift) for index, shift in enumerate(SHIFT_ALLOCATION_ORDER)
+        if config.include_zero_score_shifts or shift not in ZERO_SCORE_SHIFTS
+    ]
+    trial_index = np.arange(trials)
+
+    months = config.month_list()
+    monthly_scores = np.zeros((trials, len(months), staff), dtype=np.float64)
+    white_days = np.zeros((trials, len(months), staff), dtype=np.int64)
+    overtime_days = np.zeros((trials, len(months), staff), dtype=np.int64)
+    unfilled_slots = np.zeros((trials, len(months)), dtype=np.int64)
+    total_slots = np.zeros(len(months), dtype=np.int64)
+    balance = np.zeros((trials, staff), dtype=np.float64)
+
+    for month_index, (year, month) in enumerate(months):
+        days = _month_days(year, month)
+        ordinals = np.array([day.toordinal() for day in days], dtype=np.int64)
+        # [日期, 試驗, 人員]：當天是否上白班
+        present = rng.random((len(days), trials, staff)) < rates
+        busy = np.zeros((len(days), trials, staff), dtype=bool)
+        month_score = np.zeros((trials, staff), dtype=np.float64)
+        month_overtime = np.zeros((trials, staff), dtype=np.int64)
+
+        for shift_index, shift in shifts:
+            demands = [row for row, day in enumerate(days) if shift == "A" or day.weekday() != 5]
+            total_slots[month_index] += len(demands)
+            # [日期, 試驗, 人員]：本班別的分配，用於 A、B 班間隔（日期順序已打亂，需檢查前後兩側）
+            shift_assigned = np.zeros_like(busy) if shift in INTERVAL_SHIFTS else None
+
+            for row in rng.permutation(demands):
+                mask = present[row] & ~busy[row]
+                if shift_assigned is not None:
+                    nearby = np.flatnonzero(np.abs(ordinals - ordinals[row]) < MIN_INTERVAL_DAYS)
+                    mask &= ~shift_assigned[nearby].any(axis=0)
+                priority = (balance + month_score) if config.carry_over else month_score
+                priority = priority + rng.random((trials, staff)) * TIE_BREAK_NOISE
+                chosen = np.where(mask, priority, np.inf).argmin(axis=1)
+                filled = mask[trial_index, chosen]
+
+                unfilled_slots[:, month_index] += ~filled
+                winners = trial_index[filled], chosen[filled]
+                busy[row][winners] = True
+                month_score[winners] += shift_scores[shift_index]
+                month_overtime[winners] += 1
+                if shift_assigned is not None:
+                    shift_assigned[row][winners] = True
+
+        month_white_days = present.sum(axis=0)
+        month_score += penalty * np.maximum(month_white_days - month_overtime, 0)
+
+        monthly_scores[:, month_index] = month_score
+        white_days[:, month_index] = month_white_days
+        overtime_days[:, month_index] = month_overtime
+        balance += month_score
+
+    return SimulationResult(config, monthly_scores, white_days, overtime_days, unfilled_slots, total_slots)
+
+
+def compare_score_tables(config: SimulationConfig, tables: Sequence[ScoreTable]) -> List[Dict[str, Any]]:
+    """以相同的設定與亂數種子比較多個分數表"""
+    return [simulate(replace(config, score_table=table)).summary() for table in tables]
+
+
+def balanced_penalty(config: SimulationConfig) -> float:
+    """
+    依期望值計算使長期平均分數為 0 的未加班負分
+
+    期望加班分數 = Σ 各班別每月名額 × 分數；期望未加班白班 = 期望白班天數 − 期望加班次數。
+    """
+    shift_scores = config.score_table.vector()
+    rates = config.attendance_rates()
+    positive = 0.0
+    overtime_slots = 0
+    white_days = 0.0
+    for year, month in config.month_list():
+        days = _month_days(year, month)
+        saturdays = sum(1 for day in days if day.weekday() == 5)
+        white_days += len(days) * rates.sum()
+        for index, shift in enumerate(SHIFT_ALLOCATION_ORDER):
+            if not config.include_zero_score_shifts and shift in ZERO_SCORE_SHIFTS:
+                continue
+            slots = len(days) if shift == "A" else len(days) - saturdays
+            overtime_slots += slots
+            positive += slots * shift_scores[index]
+
+    no_overtime_days = white_days - overtime_slots
+    if no_overtime_days <= 0:
+        raise ValueError("白班天數不足以涵蓋加班名額，無法以未加班負分平衡")
+    return round(-positive / no_overtime_days, 4)
+
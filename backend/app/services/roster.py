@@ -0,0 +1,125 @@
+"""
+人員名冊快照
+
+將 users 表中排班需要的欄位一次讀出，並預先解析 group_data（公式ID、起始組別、夜班包班類型）
+與排序組別（沿用 last_login_ip 為純數字時作為組別的既有規則），
+整理為不可變的記錄供排班生成與月班表讀取使用，避免在迴圈中重複解析 JSON 與字串。
+快照以名冊修訂號快取：本行程修改人員資料時遞增修訂號，其他 worker 的快照在 TTL 到期後重新載入。
+"""
+
+import threading
+import time
+from types import MappingProxyType
+from typing import Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models.user import User
+from .schedule_generator import parse_group_data
+
+# 參與排班生成的角色
+SCHEDULED_ROLES = ('nurse', 'secretary', 'leader', 'head_nurse', 'supervise_nurse')
+
+
+class RosterEntry(NamedTuple):
+    """單一人員的排班相關資料（不可變、無 __dict__）"""
+    id: int
+    full_name: Optional[str]
+    role: Optional[str]
+    identity: Optional[str]
+    is_active: bool
+    formula_id: Optional[int]
+    start_group: int
+    night_type: Optional[str]
+    sort_group: int
+
+
+def _sort_group(last_login_ip: Optional[str]) -> int:
+    if last_login_ip and last_login_ip.isdigit():
+        return int(last_login_ip)
+    return 0
+
+
+class RosterSnapshot:
+    """某一名冊修訂的人員快照"""
+
+    def __init__(self, entries: Iterable[RosterEntry], revision: int):
+        self.revision = revision
+        self.entries: Tuple[RosterEntry, ...] = tuple(entries)
+        self.by_id: Mapping[int, RosterEntry] = MappingProxyType({entry.id: entry for entry in self.entries})
+
+    def scheduled(self, roles: Iterable[str] = SCHEDULED_ROLES) -> List[RosterEntry]:
+        """啟用中且參與排班的人員（依 id 排序）"""
+        roles = set(roles)
+        return [entry for entry in self.entries if entry.is_active and entry.role in roles]
+
+    @classmethod
+    def load(cls, db: Session, revision: int) -> "RosterSnapshot":
+        rows = db.query(
+            User.id,
+            User.full_name,
+            User.role,
+            User.identity,
+            User.is_active,
+            User.group_data,
+            User.last_login_ip
+        ).order_by(User.id).all()
+
+        entries = []
+        for row in rows:
+            formula_id, start_group, night_type = parse_group_data(row.group_data)
+            entries.append(RosterEntry(
+                id=row.id,
+                full_name=row.full_name,
+                role=row.role,
+                identity=row.identity,
+                is_active=bool(row.is_active),
+                formula_id=formula_id,
+                start_group=start_group,
+                night_type=night_type,
+                sort_group=_sort_group(row.last_login_ip)
+            ))
+        return cls(entries, revision)
+
+
+class RosterCache:
+    """行程內共用的名冊快照"""
+
+    def __init__(self):
+        self._snapshot: Optional[RosterSnapshot] = None
+        self._expires_at = 0.0
+        self._revision = 0
+        self._lock = threading.Lock()
+
+    @property
+    def revision(self) -> int:
+        return self._revision
+
+    def get(self, db: Session) -> RosterSnapshot:
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.revision == self._revision and self._expires_at > time.monotonic():
+                return snapshot
+            revision = self._revision
+
+        snapshot = RosterSnapshot.load(db, revision)
+        with self._lock:
+            if revision == self._revision:
+                self._snapshot = snapshot
+                self._expires_at = time.monotonic() + settings.ROSTER_SNAPSHOT_TTL_SECONDS
+        return snapshot
+
+    def invalidate(self) -> None:
+        """人員資料變更後呼叫，遞增名冊修訂號"""
+        with self._lock:
+            self._revision += 1
+            self._snapshot = None
+
+
+# 全局名冊快照
+roster_cache = RosterCache()
+
+
+def get_roster(db: Session) -> RosterSnapshot:
+    return roster_cache.get(db)
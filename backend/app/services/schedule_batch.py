@@ -0,0 +1,264 @@
+"""
+多月份批次排班生成
+
+一次讀取公式、人員與各月份現有的夜班班表，
+計算各月份的公式排班（純計算；月份數多時交給啟動時建立的常駐行程池），再於單一交易中批次寫入所有月份。
+夜班包班人員沿用各月份現有班表，規則與 /schedules/generate 相同；dry_run 時只返回結果不寫入。
+"""
+
+import calendar
+import logging
+import multiprocessing
+import threading
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models.schedule import MonthlySchedule, ScheduleVersion
+from ..core.principal import Principal
+from .schedule_cache import mark_version_changed
+from .roster import get_roster
+from .schedule_generator import MonthShifts, WeekShifts, generate_month_task, preserve_existing_month
+from .schedule_history import record_revision
+from .overtime_ledger import refresh_month_scores
+from .schedule_persistence import build_month_rows, bulk_insert_monthly_schedules
+from .schedule_rows import replace_packed_rows
+from .schedule_versions import latest_version_resolver
+
+logger = logging.getLogger(__name__)
+
+YearMonth = Tuple[int, int]
+
+
+def month_range(start_year: int, start_month: int, end_year: int, end_month: int) -> List[YearMonth]:
+    """列出起訖月份（含）之間的所有 (年, 月)"""
+    for month in (start_month, end_month):
+        if month < 1 or month > 12:
+            raise ValueError("月份必須在1至12之間")
+    if (start_year, start_month) > (end_year, end_month):
+        raise ValueError("開始月份不可晚於結束月份")
+
+    months = []
+    year, month = start_year, start_month
+    while (year, month) <= (end_year, end_month):
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+    if len(months) > settings.SCHEDULE_BATCH_MAX_MONTHS:
+        raise ValueError(f"一次最多只能生成 {settings.SCHEDULE_BATCH_MAX_MONTHS} 個月的排班表")
+    return months
+
+
+# 常駐行程池：於應用程式啟動時建立、關閉時釋放，避免每次請求重新 spawn 子行程
+_compute_pool: Optional[ProcessPoolExecutor] = None
+_compute_pool_lock = threading.Lock()
+
+
+def start_compute_pool() -> None:
+    """建立排班計算行程池（spawn，避免複製資料庫連線），並預先啟動子行程"""
+    global _compute_pool
+    workers = settings.SCHEDULE_BATCH_MAX_WORKERS
+    if workers <= 1:
+        return
+    with _compute_pool_lock:
+        if _compute_pool is not None:
+            return
+        try:
+            _compute_pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            # 子行程在首次提交工作時才啟動，先送出空工作讓匯入成本發生在啟動階段
+            for _ in range(workers):
+                _compute_pool.submit(int)
+        except OSError as e:
+            logger.warning(f"無法建立排班計算行程池，將依序計算: {str(e)}")
+            _compute_pool = None
+
+
+def shutdown_compute_pool() -> None:
+    global _compute_pool
+    with _compute_pool_lock:
+        pool, _compute_pool = _compute_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def compute_months(
+    months: List[YearMonth],
+    week_matrices: Mapping[int, Tuple[WeekShifts, ...]],
+    assignments: List[Tuple[Optional[str], Optional[int], int]]
+) -> Dict[YearMonth, List[MonthShifts]]:
+    """
+    計算各月份的公式排班
+
+    月份數達到 SCHEDULE_BATCH_PARALLEL_MIN_MONTHS 且常駐行程池可用時平行計算，
+    否則（或行程池損壞時）在目前行程依序計算。
+    """
+    # 轉為一般 dict 以便傳給子行程
+    week_matrices = dict(week_matrices)
+    tasks = [(year, month, week_matrices, assignments) for year, month in months]
+
+    results = None
+    pool = _compute_pool
+    if pool is not None and len(tasks) >= settings.SCHEDULE_BATCH_PARALLEL_MIN_MONTHS:
+        try:
+            results = list(pool.map(generate_month_task, tasks))
+        except BrokenProcessPool as e:
+            logger.warning(f"排班計算行程池已損壞，改為依序計算並重建行程池: {str(e)}")
+            shutdown_compute_pool()
+            start_compute_pool()
+    if results is None:
+        results = [generate_month_task(task) for task in tasks]
+
+    return {(year, month): rows for year, month, rows in results}
+
+
+def _load_night_shift_data(
+    db: Session,
+    versions: Dict[str, ScheduleVersion],
+    night_user_ids: List[int]
+) -> Dict[str, Dict[int, Dict[int, Dict[str, Optional[str]]]]]:
+    """一次查出各月份現有版本中夜班包班人員的班表：{月份: {user_id: {日: {...}}}}"""
+    existing: Dict[str, Dict[int, Dict[int, Dict[str, Optional[str]]]]] = defaultdict(dict)
+    if not versions or not night_user_ids:
+        return existing
+
+    month_by_version = {version.id: month_str for month_str, version in versions.items()}
+    rows = db.query(
+        MonthlySchedule.version_id,
+        MonthlySchedule.user_id,
+        MonthlySchedule.date,
+        MonthlySchedule.shift_type,
+        MonthlySchedule.area_code
+    ).filter(
+        MonthlySchedule.version_id.in_(list(month_by_version)),
+        MonthlySchedule.user_id.in_(night_user_ids)
+    ).order_by(MonthlySchedule.id).all()
+
+    for row in rows:
+        month_days = existing[month_by_version[row.version_id]].setdefault(row.user_id, {})
+        month_days[row.date.day] = {'shift_type': row.shift_type, 'area_code': row.area_code}
+    return existing
+
+
+def generate_schedule_batch(
+    db: Session,
+    months: List[YearMonth],
+    week_matrices: Mapping[int, Tuple[WeekShifts, ...]],
+    current_user: Principal,
+    description: Optional[str] = None,
+    as_base_version: bool = False,
+    dry_run: bool = False
+) -> Dict[str, Any]:
+    """
+    生成多個月份的排班表
+
+    dry_run 為 True 時返回各月份的排班內容而不寫入；
+    否則在單一交易中覆寫（或建立）各月份的最新版本並提交。
+    """
+    nurses = get_roster(db).scheduled()
+    if not nurses:
+        raise ValueError("未找到任何啟用的護理師，無法生成班表")
+
+    assignments = [(nurse.role, nurse.formula_id, nurse.start_group) for nurse in nurses]
+
+    month_strs = {(year, month): f"{year}{month:02d}" for year, month in months}
+    versions = latest_version_resolver.resolve_many(db, month_strs.values())
+    night_user_ids = [nurse.id for nurse in nurses if nurse.night_type]
+    night_data = _load_night_shift_data(db, versions, night_user_ids)
+
+    computed = compute_months(months, week_matrices, assignments)
+
+    month_results = []
+    schedule_entries = []
+    written_versions = []
+    for year, month in months:
+        month_str = month_strs[(year, month)]
+        month_dates = [date(year, month, day) for day in range(1, calendar.monthrange(year, month)[1] + 1)]
+        existing_night = night_data.get(month_str, {})
+
+        version = None
+        if not dry_run:
+            version = versions.get(month_str)
+            if version is not None:
+                db.query(MonthlySchedule).filter(
+                    MonthlySchedule.version_id == version.id
+                ).delete(synchronize_session=False)
+                version.is_base_version = as_base_version
+            else:
+                version = ScheduleVersion(
+                    version_number=f"v1.0_{month_str}",
+                    month=month_str,
+                    notes=description or f"{year}年{month}月排班表",
+                    is_published=False,
+                    published_by=current_user.id,
+                    is_base_version=as_base_version
+                )
+                db.add(version)
+                db.flush()
+
+        month_schedule = []
+        month_entries = []
+        for nurse, shifts in zip(nurses, computed[(year, month)]):
+            special_type = None
+            area_codes = None
+            if nurse.night_type and nurse.id in existing_night:
+                special_type = nurse.night_type
+                shifts, area_codes = preserve_existing_month(
+                    existing_night[nurse.id], len(month_dates), nurse.identity
+                )
+
+            if dry_run:
+                nurse_schedule = {
+                    "id": nurse.id,
+                    "name": nurse.full_name,
+                    "role": nurse.role,
+                    "identity": nurse.identity,
+                    "shifts": list(shifts)
+                }
+                if special_type:
+                    nurse_schedule["special_type"] = special_type
+                month_schedule.append(nurse_schedule)
+                continue
+
+            month_entries.extend(build_month_rows(
+                version.id, nurse.id, month_dates, shifts,
+                area_codes=area_codes,
+                special_type=special_type,
+                default_area_code=nurse.identity
+            ))
+
+        if dry_run:
+            month_results.append({"year": year, "month": month, "schedule": month_schedule})
+            continue
+
+        replace_packed_rows(db, version, month_entries)
+        schedule_entries.extend(month_entries)
+        written_versions.append(version)
+        month_results.append({
+            "year": year,
+            "month": month,
+            "version_id": version.id,
+            "entries_count": len(month_entries)
+        })
+
+    if dry_run:
+        return {"months": month_results}
+
+    # 所有月份的排班記錄以單一批次寫入，與刪除舊記錄同一交易提交
+    bulk_insert_monthly_schedules(db, schedule_entries)
+    for version in written_versions:
+        mark_version_changed(version)
+        record_revision(db, version, "generate_batch", current_user.id)
+        refresh_month_scores(db, version, int(version.month[:4]), int(version.month[4:]))
+    db.commit()
+
+    for version in written_versions:
+        latest_version_resolver.remember(version)
+
+    return {"months": month_results, "entries_count": len(schedule_entries)}
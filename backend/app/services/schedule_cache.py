@@ -0,0 +1,140 @@
+"""
+月班表回應快取
+
+快取 /schedules/monthly/{year}/{month} 組裝完成的回應，
+以 (月份, 版本ID, 版本更新時間) 判斷是否仍有效；排班寫入時會更新版本時間並主動失效。
+預設使用行程內 LRU 快取，可透過 set_backend() 替換為其他實作（如 Redis）。
+"""
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from ..core.config import settings
+from ..models.schedule import ScheduleVersion
+
+
+class CacheBackend(ABC):
+    """快取後端介面，替換實作時只需提供 get / set / delete / clear"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """執行緒安全的行程內 LRU 快取，每筆資料有各自的過期時間"""
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class MonthlyScheduleCache:
+    """月班表回應快取，每個月份只保留最新一份"""
+
+    def __init__(self, backend: Optional[CacheBackend] = None):
+        self.backend = backend or InMemoryCacheBackend(settings.SCHEDULE_CACHE_MAX_ENTRIES)
+
+    @staticmethod
+    def _key(month_str: str) -> str:
+        return f"monthly_schedule:{month_str}"
+
+    def get(self, month_str: str, version: ScheduleVersion) -> Optional[Tuple[Dict[str, Any], Optional[str]]]:
+        """
+        取得快取的 (回應, ETag)；版本ID或版本更新時間不符時視為未命中
+
+        返回的回應物件為共用資料，呼叫端不可修改。
+        """
+        if not settings.SCHEDULE_CACHE_ENABLED:
+            return None
+        item = self.backend.get(self._key(month_str))
+        if item is None:
+            return None
+        version_id, stamp, response, etag = item
+        if version_id != version.id or stamp != version.updated_at:
+            return None
+        return response, etag
+
+    def set(
+        self,
+        month_str: str,
+        version: ScheduleVersion,
+        response: Dict[str, Any],
+        etag: Optional[str] = None
+    ) -> None:
+        if not settings.SCHEDULE_CACHE_ENABLED:
+            return
+        self.backend.set(
+            self._key(month_str),
+            (version.id, version.updated_at, response, etag),
+            settings.SCHEDULE_CACHE_TTL_SECONDS
+        )
+
+    def invalidate(self, month_str: str) -> None:
+        self.backend.delete(self._key(month_str))
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def set_backend(self, backend: CacheBackend) -> None:
+        """替換快取後端（例如多個 worker 共用的外部快取）"""
+        self.backend = backend
+
+
+# 全局月班表快取實例
+monthly_schedule_cache = MonthlyScheduleCache()
+
+
+def mark_version_changed(version: ScheduleVersion) -> None:
+    """
+    標記版本內容已變更
+
+    更新版本的 updated_at（隨呼叫端交易一起提交），並使該月份的快取失效。
+    其他 worker 的快取會因版本更新時間不符而自動失效。
+    """
+    version.updated_at = datetime.now()
+    monthly_schedule_cache.invalidate(version.month)
@@ -0,0 +1,161 @@
+"""
+排班版本比較引擎
+
+以單一查詢取出兩個版本的所有排班記錄，一次查出相關人員姓名，
+再以字典 / 集合運算計算新增、修改與刪除的項目。
+比較結果會存入 schedule_version_diffs.diff_data，兩個版本內容未變時直接由儲存的結果回應。
+"""
+
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..models.schedule import MonthlySchedule, ScheduleVersion, ScheduleVersionDiff
+from ..models.user import User
+
+logger = logging.getLogger(__name__)
+
+# 儲存於 diff_data 的比較結果類型
+COMPARISON_DIFF_TYPE = "comparison"
+
+# 判斷記錄是否被修改時比較的欄位
+COMPARED_FIELDS = ("shift_type", "area_code", "work_time")
+
+CellKey = Tuple[int, str]
+
+
+def _stamp(version: ScheduleVersion) -> Optional[str]:
+    return version.updated_at.isoformat() if version.updated_at else None
+
+
+def load_version_cells(db: Session, version_ids: List[int]) -> Dict[int, Dict[CellKey, Dict[str, Any]]]:
+    """
+    一次查詢多個版本的排班記錄
+
+    Returns:
+        {版本ID: {(user_id, ISO日期): {shift_type, area_code, work_time}}}
+        同一人同一天有多筆記錄時以 id 較大者為準
+    """
+    cells: Dict[int, Dict[CellKey, Dict[str, Any]]] = {version_id: {} for version_id in version_ids}
+    rows = db.query(
+        MonthlySchedule.version_id,
+        MonthlySchedule.user_id,
+        MonthlySchedule.date,
+        MonthlySchedule.shift_type,
+        MonthlySchedule.area_code,
+        MonthlySchedule.work_time
+    ).filter(
+        MonthlySchedule.version_id.in_(version_ids)
+    ).order_by(MonthlySchedule.id).all()
+
+    for row in rows:
+        cells[row.version_id][(row.user_id, row.date.isoformat())] = {
+            "shift_type": row.shift_type,
+            "area_code": row.area_code,
+            "work_time": row.work_time,
+        }
+    return cells
+
+
+def diff_cells(
+    cells1: Dict[CellKey, Dict[str, Any]],
+    cells2: Dict[CellKey, Dict[str, Any]],
+    user_names: Dict[int, Optional[str]]
+) -> List[Dict[str, Any]]:
+    """以集合運算計算兩組排班記錄的差異，結果依日期、人員排序"""
+    keys1 = cells1.keys()
+    keys2 = cells2.keys()
+
+    items = []
+    for key in keys1 & keys2:
+        v1 = cells1[key]
+        v2 = cells2[key]
+        if any(v1[field] != v2[field] for field in COMPARED_FIELDS):
+            items.append(("modified", key, v1["shift_type"], v2["shift_type"]))
+    for key in keys1 - keys2:
+        items.append(("deleted", key, cells1[key]["shift_type"], None))
+    for key in keys2 - keys1:
+        items.append(("added", key, None, cells2[key]["shift_type"]))
+
+    items.sort(key=lambda item: (item[1][1], item[1][0]))
+    return [
+        {
+            "type": diff_type,
+            "user_id": user_id,
+            "user_name": user_names.get(user_id),
+            "date": date_str,
+            "version1_value": value1,
+            "version2_value": value2,
+        }
+        for diff_type, (user_id, date_str), value1, value2 in items
+    ]
+
+
+def group_diff_items(items: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """整理為 compare API 的 diff 回應格式"""
+    return {
+        "items": items,
+        "added": [item for item in items if item["type"] == "added"],
+        "modified": [item for item in items if item["type"] == "modified"],
+        "deleted": [item for item in items if item["type"] == "deleted"],
+    }
+
+
+def _find_stored_comparison(db: Session, version1: ScheduleVersion, version2: ScheduleVersion) -> Optional[ScheduleVersionDiff]:
+    candidates = db.query(ScheduleVersionDiff).filter(
+        ScheduleVersionDiff.base_version_id == version1.id,
+        ScheduleVersionDiff.version_id == version2.id
+    ).order_by(ScheduleVersionDiff.id.desc()).all()
+    for candidate in candidates:
+        if isinstance(candidate.diff_data, dict) and candidate.diff_data.get("type") == COMPARISON_DIFF_TYPE:
+            return candidate
+    return None
+
+
+def compare_schedule_versions(
+    db: Session,
+    version1: ScheduleVersion,
+    version2: ScheduleVersion,
+    persist: bool = True
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    比較兩個版本的排班差異
+
+    兩個版本的更新時間與已儲存的比較結果相同時直接使用儲存結果；
+    否則重新計算，persist 為 True 時寫回 schedule_version_diffs 並提交。
+    """
+    stamps = {"version1_updated_at": _stamp(version1), "version2_updated_at": _stamp(version2)}
+
+    stored = _find_stored_comparison(db, version1, version2) if persist else None
+    if stored is not None and all(stored.diff_data.get(k) == v for k, v in stamps.items()):
+        return group_diff_items(stored.diff_data.get("items", []))
+
+    cells = load_version_cells(db, [version1.id, version2.id])
+    cells1 = cells[version1.id]
+    cells2 = cells[version2.id]
+
+    user_ids = {user_id for user_id, _ in cells1.keys() | cells2.keys()}
+    user_names = dict(
+        db.query(User.id, User.full_name).filter(User.id.in_(user_ids)).all()
+    ) if user_ids else {}
+
+    items = diff_cells(cells1, cells2, user_names)
+
+    if persist:
+        diff_data = {"type": COMPARISON_DIFF_TYPE, **stamps, "items": items}
+        try:
+            if stored is not None:
+                stored.diff_data = diff_data
+            else:
+                db.add(ScheduleVersionDiff(
+                    version_id=version2.id,
+                    base_version_id=version1.id,
+                    diff_data=diff_data
+                ))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"儲存版本比較結果失敗: {str(e)}")
+
+    return group_diff_items(items)
@@ -0,0 +1,127 @@
+"""
+排班詳細記錄串流匯出
+
+以伺服器端游標逐批讀取任意日期區間（各月份的最新版本）的排班記錄，
+逐列輸出為 NDJSON 或 CSV，記憶體用量與區間長度無關。
+串流期間使用獨立連線，不依賴請求的 Session 生命週期。
+"""
+
+import csv
+import io
+import json
+import logging
+from datetime import date
+from typing import Dict, Iterator, List, Tuple
+
+from sqlalchemy import select
+
+from ..core.config import settings
+from ..core.database import engine
+from ..models.schedule import MonthlySchedule, ScheduleVersion
+from ..models.user import User
+
+logger = logging.getLogger(__name__)
+
+# 伺服器端游標每次取回的筆數
+EXPORT_BATCH_SIZE = 2000
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+EXPORT_COLUMNS = (
+    "id", "user_id", "user_name", "date", "shift_type", "area_code",
+    "work_time", "special_type", "version_id", "month"
+)
+
+
+def months_in_range(start_date: date, end_date: date) -> List[str]:
+    """列出區間涵蓋的所有月份（YYYYMM），區間顛倒或超過 SCHEDULE_EXPORT_MAX_MONTHS 時拋出 ValueError"""
+    if start_date > end_date:
+        raise ValueError("開始日期不可晚於結束日期")
+    span = (end_date.year - start_date.year) * 12 + end_date.month - start_date.month + 1
+    if span > settings.SCHEDULE_EXPORT_MAX_MONTHS:
+        raise ValueError(f"一次最多只能匯出 {settings.SCHEDULE_EXPORT_MAX_MONTHS} 個月的排班記錄")
+
+    months = []
+    year, month = start_date.year, start_date.month
+    while (year, month) <= (end_date.year, end_date.month):
+        months.append(f"{year}{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def _export_query(version_ids: List[int], start_date: date, end_date: date):
+    return select(
+        MonthlySchedule.id,
+        MonthlySchedule.user_id,
+        User.full_name.label("user_name"),
+        MonthlySchedule.date,
+        MonthlySchedule.shift_type,
+        MonthlySchedule.area_code,
+        MonthlySchedule.work_time,
+        MonthlySchedule.special_type,
+        MonthlySchedule.version_id,
+        ScheduleVersion.month,
+    ).join(
+        ScheduleVersion, ScheduleVersion.id == MonthlySchedule.version_id
+    ).outerjoin(
+        User, User.id == MonthlySchedule.user_id
+    ).where(
+        MonthlySchedule.version_id.in_(version_ids),
+        MonthlySchedule.date >= start_date,
+        MonthlySchedule.date <= end_date,
+    ).order_by(
+        MonthlySchedule.date, MonthlySchedule.user_id, MonthlySchedule.id
+    )
+
+
+def iter_export_rows(version_ids: List[int], start_date: date, end_date: date) -> Iterator[Dict[str, object]]:
+    """以伺服器端游標逐批產生排班記錄"""
+    if not version_ids:
+        return
+    with engine.connect() as connection:
+        result = connection.execution_options(
+            stream_results=True, max_row_buffer=EXPORT_BATCH_SIZE
+        ).execute(_export_query(version_ids, start_date, end_date))
+        for partition in result.mappings().partitions(EXPORT_BATCH_SIZE):
+            for row in partition:
+                item = dict(row)
+                item["date"] = item["date"].isoformat()
+                yield item
+
+
+def stream_ndjson(rows: Iterator[Dict[str, object]]) -> Iterator[bytes]:
+    for row in rows:
+        yield (json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def stream_csv(rows: Iterator[Dict[str, object]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    # 加上 BOM 讓 Excel 正確辨識 UTF-8 中文
+    buffer.write("\ufeff")
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue().encode("utf-8")
+
+
+def export_stream(version_ids: List[int], start_date: date, end_date: date, export_format: str) -> Tuple[Iterator[bytes], str]:
+    """
+    建立匯出串流
+
+    Returns:
+        (位元組串流, Content-Type)
+    """
+    rows = iter_export_rows(version_ids, start_date, end_date)
+    if export_format == "csv":
+        return stream_csv(rows), EXPORT_FORMATS["csv"]
+    return stream_ndjson(rows), EXPORT_FORMATS["ndjson"]
@@ -0,0 +1,231 @@
+"""
+公式排班生成引擎
+
+將公式班表的 (公式ID, 組別) × 星期 班次矩陣預先編譯一次，
+再以 (公式ID, 起始組別) 為鍵快取整月班次列，一次產生整月的排班陣列。
+本模組不依賴資料庫會話，可同時供 /schedules/generate 路由與離線腳本使用。
+"""
+
+import calendar
+import json
+from datetime import date
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+SHIFT_OFF = 'O'
+HEAD_NURSE_WEEKDAY_SHIFT = 'A'
+NIGHT_SHIFT_SPECIAL_TYPES = frozenset({'SNP', 'LNP'})
+
+# 一週七天的班次（索引 0=週一 ... 6=週日）
+WeekShifts = Tuple[str, ...]
+MonthShifts = Tuple[str, ...]
+
+
+def compile_formula_patterns(
+    patterns: Iterable[Tuple[int, int, Optional[str]]]
+) -> Dict[int, Dict[int, str]]:
+    """
+    將 (formula_id, group_number, pattern) 序列整理為 {公式ID: {組別: pattern字串}}
+
+    同一公式的同一組別若出現多次，以第一筆為準（與舊版去重邏輯一致）。
+    """
+    compiled: Dict[int, Dict[int, str]] = {}
+    for formula_id, group_number, pattern in patterns:
+        groups = compiled.setdefault(formula_id, {})
+        if group_number not in groups:
+            groups[group_number] = pattern or ''
+    return compiled
+
+
+def parse_group_data(group_data: Optional[str]) -> Tuple[Optional[int], int, Optional[str]]:
+    """
+    解析 User.group_data
+
+    group_data 為 ["公式ID", "起始組別"] 格式的 JSON 陣列；
+    夜班包班人員的第二個元素為 SNP 或 LNP。
+
+    Returns:
+        (公式ID, 起始組別, 夜班包班類型)，無法解析的部分分別為 None / 1 / None
+    """
+    if not group_data:
+        return None, 1, None
+
+    try:
+        data = json.loads(group_data)
+    except Exception:
+        return None, 1, None
+
+    if not isinstance(data, list) or len(data) < 2:
+        return None, 1, None
+
+    night_type = data[1] if data[1] in NIGHT_SHIFT_SPECIAL_TYPES else None
+
+    try:
+        return int(data[0]), int(data[1]), night_type
+    except (TypeError, ValueError):
+        return None, 1, night_type
+
+
+def preserve_existing_month(
+    existing_days: Mapping[int, Mapping[str, Optional[str]]],
+    days_in_month: int,
+    default_area_code: Optional[str] = None
+) -> Tuple[List[Optional[str]], List[Optional[str]]]:
+    """
+    以現有班表組出夜班包班人員的整月班次與區域代碼
+
+    Args:
+        existing_days: {日: {shift_type, area_code}}，缺少的日期視為休假、區域代碼為 default_area_code
+    """
+    shifts = []
+    area_codes = []
+    for day in range(1, days_in_month + 1):
+        existing_data = existing_days.get(day, {})
+        shifts.append(existing_data.get('shift_type', SHIFT_OFF))
+        area_codes.append(existing_data.get('area_code', default_area_code))
+    return shifts, area_codes
+
+
+def _compile_week_matrix(groups: Mapping[int, str]) -> Optional[Tuple[WeekShifts, ...]]:
+    """將單一公式的各組 pattern 編譯為 組別 × 星期 的班次矩陣（索引 0 對應第 1 組）"""
+    if not groups:
+        return None
+
+    max_group = max(groups)
+    if max_group < 1:
+        return None
+
+    matrix = []
+    for group_number in range(1, max_group + 1):
+        pattern = groups.get(group_number) or ''
+        # pattern 字串如 "DDDAAOO"，第一個字元代表週一；長度不足的部分視為休假
+        matrix.append(tuple(
+            pattern[weekday] if weekday < len(pattern) else SHIFT_OFF
+            for weekday in range(7)
+        ))
+    return tuple(matrix)
+
+
+def compile_week_matrices(formula_patterns: Mapping[int, Mapping[int, str]]) -> Dict[int, Tuple[WeekShifts, ...]]:
+    """將所有公式編譯為 {公式ID: 組別 × 星期 班次矩陣}，沒有任何 pattern 的公式不列入"""
+    matrices = {}
+    for formula_id, groups in formula_patterns.items():
+        matrix = _compile_week_matrix(groups)
+        if matrix is not None:
+            matrices[formula_id] = matrix
+    return matrices
+
+
+class MonthlyScheduleGenerator:
+    """
+    單月公式排班生成器
+
+    建構時預先計算每一天的星期與週次，並編譯所有公式的班次矩陣；
+    之後每個 (公式ID, 起始組別) 只需計算一次整月班次，相同設定的護理師共用結果。
+    """
+
+    def __init__(
+        self,
+        year: int,
+        month: int,
+        formula_patterns: Optional[Mapping[int, Mapping[int, str]]] = None,
+        week_matrices: Optional[Mapping[int, Tuple[WeekShifts, ...]]] = None
+    ):
+        """
+        Args:
+            formula_patterns: {公式ID: {組別: pattern字串}}，建構時編譯為班次矩陣
+            week_matrices: 已編譯的 {公式ID: 組別 × 星期 班次矩陣}（如 FormulaCatalog 提供），優先於 formula_patterns
+        """
+        if month < 1 or month > 12:
+            raise ValueError("月份必須在1至12之間")
+
+        self.year = year
+        self.month = month
+        _, self.days_in_month = calendar.monthrange(year, month)
+
+        first_weekday = date(year, month, 1).weekday()
+        self.dates: Tuple[date, ...] = tuple(
+            date(year, month, day) for day in range(1, self.days_in_month + 1)
+        )
+        self.weekdays: Tuple[int, ...] = tuple(
+            (first_weekday + offset) % 7 for offset in range(self.days_in_month)
+        )
+        # 第一天所在的週為第 0 週
+        self.week_indexes: Tuple[int, ...] = tuple(
+            (first_weekday + offset) // 7 for offset in range(self.days_in_month)
+        )
+
+        if week_matrices is None:
+            week_matrices = compile_week_matrices(formula_patterns or {})
+        self._matrices: Mapping[int, Tuple[WeekShifts, ...]] = week_matrices
+
+        self._rows: Dict[Tuple[int, int], MonthShifts] = {}
+
+        self.off_row: MonthShifts = (SHIFT_OFF,) * self.days_in_month
+        # 護理長：週一至週五為A班，週六日為O休假
+        self.head_nurse_row: MonthShifts = tuple(
+            HEAD_NURSE_WEEKDAY_SHIFT if weekday < 5 else SHIFT_OFF
+            for weekday in self.weekdays
+        )
+
+    def formula_row(self, formula_id: int, start_group: int) -> Optional[MonthShifts]:
+        """
+        取得某公式、某起始組別的整月班次
+
+        從起始組別開始，每過一週組別加一並循環使用。
+        公式不存在或沒有任何 pattern 時返回 None。
+        """
+        key = (formula_id, start_group)
+        row = self._rows.get(key)
+        if row is not None:
+            return row
+
+        matrix = self._matrices.get(formula_id)
+        if matrix is None:
+            return None
+
+        max_group = len(matrix)
+        row = tuple(
+            matrix[(start_group + week - 2) % max_group][weekday]
+            for week, weekday in zip(self.week_indexes, self.weekdays)
+        )
+        self._rows[key] = row
+        return row
+
+    def shifts_for(self, role: Optional[str], formula_id: Optional[int], start_group: int) -> MonthShifts:
+        """依角色與公式設定取得整月班次，無有效公式時全月休假"""
+        if role == 'head_nurse':
+            return self.head_nurse_row
+        if formula_id is None:
+            return self.off_row
+        return self.formula_row(formula_id, start_group) or self.off_row
+
+    def generate(
+        self, assignments: Iterable[Tuple[Optional[str], Optional[int], int]]
+    ) -> List[MonthShifts]:
+        """
+        一次產生多位人員的整月排班
+
+        Args:
+            assignments: (角色, 公式ID, 起始組別) 序列
+
+        Returns:
+            與輸入順序對應的整月班次列（人員 × 日期 的密集陣列）
+        """
+        return [
+            self.shifts_for(role, formula_id, start_group)
+            for role, formula_id, start_group in assignments
+        ]
+
+
+def generate_month_task(
+    task: Tuple[int, int, Mapping[int, Tuple[WeekShifts, ...]], List[Tuple[Optional[str], Optional[int], int]]]
+) -> Tuple[int, int, List[MonthShifts]]:
+    """
+    單月生成的行程池工作函式（只做純計算，可在子行程中執行）
+
+    Args:
+        task: (年, 月, 公式班次矩陣, (角色, 公式ID, 起始組別) 序列)
+    """
+    year, month, week_matrices, assignments = task
+    generator = MonthlyScheduleGenerator(year, month, week_matrices=week_matrices)
+    return year, month, generator.generate(assignments)
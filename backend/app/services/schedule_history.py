@@ -0,0 +1,214 @@
+"""
+排班版本歷史服務
+
+每次寫入排班後，將本次變更以緊湊差異的形式存入 schedule_version_diffs
+（version_id 與 base_version_id 皆為該版本，revision 為修訂編號，diff_data.type 為 "history"）。
+每隔固定修訂次數另存一份完整快照，重建任一歷史修訂時只需從最近的快照開始重播差異。
+
+版本列保存最新修訂編號與排班狀態（history_revision / history_cells），寫入時鎖定版本列取得，
+修訂編號因此不會重複（另有 (version_id, revision) 唯一索引），也不必重播歷史。
+
+儲存格式：
+    cells / upserts: {"<user_id>:<day>": [shift_type, area_code, special_type]}
+    deletes: ["<user_id>:<day>", ...]
+"""
+
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models.schedule import MonthlySchedule, ScheduleVersion, ScheduleVersionDiff
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DIFF_TYPE = "history"
+
+Cells = Dict[str, List[Optional[str]]]
+
+
+def cell_key(user_id: int, day: int) -> str:
+    return f"{user_id}:{day}"
+
+
+def split_cell_key(key: str) -> Tuple[int, int]:
+    user_id, day = key.split(":")
+    return int(user_id), int(day)
+
+
+def load_current_cells(db: Session, version_id: int, user_ids: Optional[Iterable[int]] = None) -> Cells:
+    """讀取版本目前（或指定人員）的排班狀態"""
+    query = db.query(
+        MonthlySchedule.user_id,
+        MonthlySchedule.date,
+        MonthlySchedule.shift_type,
+        MonthlySchedule.area_code,
+        MonthlySchedule.special_type
+    ).filter(MonthlySchedule.version_id == version_id)
+    if user_ids is not None:
+        query = query.filter(MonthlySchedule.user_id.in_(list(user_ids)))
+
+    cells: Cells = {}
+    for row in query.order_by(MonthlySchedule.id).all():
+        cells[cell_key(row.user_id, row.date.day)] = [row.shift_type, row.area_code, row.special_type]
+    return cells
+
+
+def _history_query(db: Session, version_id: int):
+    return db.query(ScheduleVersionDiff).filter(
+        ScheduleVersionDiff.version_id == version_id,
+        ScheduleVersionDiff.revision.isnot(None)
+    )
+
+
+def reconstruct_cells(db: Session, version_id: int, revision: Optional[int] = None) -> Tuple[int, Cells]:
+    """
+    重建版本在某次修訂後的排班狀態
+
+    由新到舊讀取歷史，找到不晚於目標修訂的最近快照後停止，再依序重播其後的差異。
+
+    Args:
+        revision: 目標修訂；None 表示最新修訂
+
+    Returns:
+        (實際重建到的修訂, 排班狀態)；尚無任何歷史時返回 (0, {})
+    """
+    pending: List[Dict[str, Any]] = []
+    base: Optional[Dict[str, Any]] = None
+
+    query = _history_query(db, version_id)
+    if revision is not None:
+        query = query.filter(ScheduleVersionDiff.revision <= revision)
+    for entry in query.order_by(ScheduleVersionDiff.revision.desc()).yield_per(20):
+        data = entry.diff_data
+        if data.get("snapshot"):
+            base = data
+            break
+        pending.append(data)
+
+    if base is None and not pending:
+        return 0, {}
+
+    cells: Cells = dict(base.get("cells", {})) if base else {}
+    current_revision = base.get("revision", 0) if base else 0
+    for data in reversed(pending):
+        for key in data.get("deletes", []):
+            cells.pop(key, None)
+        cells.update(data.get("upserts", {}))
+        current_revision = data.get("revision", current_revision)
+    return current_revision, cells
+
+
+def record_revision(
+    db: Session,
+    version: ScheduleVersion,
+    action: str,
+    saved_by: Optional[int] = None,
+    user_ids: Optional[Iterable[int]] = None
+) -> Optional[ScheduleVersionDiff]:
+    """
+    將本次寫入記錄為一筆歷史修訂（不提交交易，需在排班寫入之後呼叫）
+
+    Args:
+        action: 寫入來源，如 saveMonth、generate、updateShift
+        user_ids: 本次只影響這些人員時傳入，可縮小比較範圍
+
+    Returns:
+        新增的歷史記錄；功能關閉或內容沒有變化時返回 None
+    """
+    if not settings.SCHEDULE_HISTORY_ENABLED:
+        return None
+
+    db.flush()
+    # 鎖定版本列：同一版本的並行寫入依序取得修訂編號
+    latest_revision, before = db.query(
+        ScheduleVersion.history_revision,
+        ScheduleVersion.history_cells
+    ).filter(ScheduleVersion.id == version.id).with_for_update().one()
+    latest_revision = latest_revision or 0
+    if before is None:
+        # 尚未保存狀態的舊版本：重播一次歷史，之後由版本列延續
+        latest_revision, before = reconstruct_cells(db, version.id)
+
+    if latest_revision == 0:
+        # 版本第一次記錄歷史，以完整現況作為起始快照
+        user_ids = None
+    if user_ids is not None:
+        user_ids = set(user_ids)
+        scoped_before = {k: v for k, v in before.items() if split_cell_key(k)[0] in user_ids}
+    else:
+        scoped_before = before
+    after = load_current_cells(db, version.id, user_ids)
+
+    upserts = {key: value for key, value in after.items() if scoped_before.get(key) != value}
+    deletes = [key for key in scoped_before if key not in after]
+    if latest_revision and not upserts and not deletes:
+        return None
+
+    revision = latest_revision + 1
+    interval = max(settings.SCHEDULE_HISTORY_SNAPSHOT_INTERVAL, 1)
+    diff_data: Dict[str, Any] = {
+        "type": HISTORY_DIFF_TYPE,
+        "revision": revision,
+        "action": action,
+        "saved_by": saved_by,
+        "saved_at": datetime.now().isoformat(),
+        "snapshot": (revision - 1) % interval == 0,
+        "upserts": upserts,
+        "deletes": deletes,
+    }
+    cells = dict(before)
+    for key in deletes:
+        cells.pop(key, None)
+    cells.update(upserts)
+    if diff_data["snapshot"]:
+        diff_data["cells"] = cells
+
+    entry = ScheduleVersionDiff(
+        version_id=version.id, base_version_id=version.id, revision=revision, diff_data=diff_data
+    )
+    db.add(entry)
+    version.history_revision = revision
+    version.history_cells = cells
+    return entry
+
+
+def list_revisions(db: Session, version_id: int) -> List[Dict[str, Any]]:
+    """列出版本的所有歷史修訂摘要（由舊到新）"""
+    revisions = []
+    for entry in _history_query(db, version_id).order_by(ScheduleVersionDiff.revision).all():
+        data = entry.diff_data
+        revisions.append({
+            "revision": data.get("revision"),
+            "action": data.get("action"),
+            "saved_by": data.get("saved_by"),
+            "saved_at": data.get("saved_at"),
+            "snapshot": bool(data.get("snapshot")),
+            "changed_count": len(data.get("upserts", {})),
+            "deleted_count": len(data.get("deletes", [])),
+        })
+    return revisions
+
+
+def cells_to_schedule(cells: Cells, days_in_month: int) -> List[Dict[str, Any]]:
+    """將排班狀態整理為每位人員一列的整月格式"""
+    by_user: Dict[int, Dict[str, Any]] = {}
+    for key in sorted(cells, key=split_cell_key):
+        user_id, day = split_cell_key(key)
+        entry = by_user.get(user_id)
+        if entry is None:
+            entry = by_user[user_id] = {
+                "user_id": user_id,
+                "shifts": ["O"] * days_in_month,
+                "area_codes": [None] * days_in_month,
+                "special_type": None,
+            }
+        shift_type, area_code, special_type = cells[key]
+        if 1 <= day <= days_in_month:
+            entry["shifts"][day - 1] = shift_type
+            entry["area_codes"][day - 1] = area_code
+        if special_type and not entry["special_type"]:
+            entry["special_type"] = special_type
+    return list(by_user.values())
@@ -0,0 +1,240 @@
+"""
+月度排班批次寫入服務
+
+將整月排班以單一 PostgreSQL COPY 或多列 INSERT 寫入 monthly_schedules，
+失敗或非 PostgreSQL 環境時退回 ORM 逐筆新增；並提供與已存版本比對後只寫入差異的增量保存。
+本模組不提交交易，由呼叫端統一 commit。
+"""
+
+import logging
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import insert, select, update, func
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models.schedule import MonthlySchedule
+
+logger = logging.getLogger(__name__)
+
+# 批次寫入的欄位順序（created_at / updated_at 由寫入時統一填入）
+MONTHLY_SCHEDULE_COLUMNS = (
+    'user_id', 'date', 'shift_type', 'area_code', 'work_time', 'special_type', 'version_id'
+)
+TIMESTAMP_COLUMNS = ('created_at', 'updated_at')
+
+# 多列 INSERT 每批筆數，避免超過 PostgreSQL 單一語句 65535 個參數的限制
+INSERT_CHUNK_SIZE = 5000
+
+WRITE_MODES = ('copy', 'insert', 'orm')
+
+
+def build_month_rows(
+    version_id: int,
+    user_id: int,
+    dates: Sequence[date],
+    shifts: Sequence[Optional[str]],
+    area_codes: Optional[Sequence[Optional[str]]] = None,
+    special_type: Optional[str] = None,
+    default_area_code: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    將單一人員的整月班次轉為批次寫入用的資料列
+
+    Args:
+        dates: 與 shifts 對應的日期序列，多出的班次會被忽略
+        area_codes: 每日的區域代碼；未提供或長度不足時使用 default_area_code
+    """
+    rows = []
+    for index, (entry_date, shift_type) in enumerate(zip(dates, shifts)):
+        area_code = default_area_code
+        if area_codes is not None and index < len(area_codes):
+            area_code = area_codes[index]
+        rows.append({
+            'user_id': user_id,
+            'date': entry_date,
+            'shift_type': shift_type,
+            'area_code': area_code,
+            'work_time': None,
+            'special_type': special_type,
+            'version_id': version_id,
+        })
+    return rows
+
+
+def _normalize(rows: Iterable[Dict[str, Any]]) -> List[tuple]:
+    return [tuple(row.get(column) for column in MONTHLY_SCHEDULE_COLUMNS) for row in rows]
+
+
+def _supports_copy(db: Session) -> bool:
+    dialect = db.get_bind().dialect
+    return dialect.name == 'postgresql' and dialect.driver == 'psycopg'
+
+
+def _write_copy(db: Session, values: List[tuple]) -> None:
+    """使用 psycopg 的 COPY FROM STDIN 在目前交易中寫入"""
+    # 與 func.now() 寫入 timestamp 欄位的結果一致（交易開始時間、會話時區）
+    timestamp = db.execute(select(func.localtimestamp())).scalar()
+    columns = ', '.join(MONTHLY_SCHEDULE_COLUMNS + TIMESTAMP_COLUMNS)
+
+    dbapi_connection = db.connection().connection.dbapi_connection
+    with dbapi_connection.cursor() as cursor:
+        with cursor.copy(f"COPY {MonthlySchedule.__tablename__} ({columns}) FROM STDIN") as copy:
+            for value in values:
+                copy.write_row(value + (timestamp, timestamp))
+
+
+def _write_insert(db: Session, values: List[tuple]) -> None:
+    """使用多列 INSERT ... VALUES 寫入，每批一個語句"""
+    table = MonthlySchedule.__table__
+    now = func.now()
+    for start in range(0, len(values), INSERT_CHUNK_SIZE):
+        chunk = values[start:start + INSERT_CHUNK_SIZE]
+        db.execute(insert(table).values([
+            dict(zip(MONTHLY_SCHEDULE_COLUMNS, value), created_at=now, updated_at=now)
+            for value in chunk
+        ]))
+
+
+def _write_orm(db: Session, values: List[tuple]) -> None:
+    """舊版 ORM 逐筆新增，作為最後的退路"""
+    db.add_all([
+        MonthlySchedule(**dict(zip(MONTHLY_SCHEDULE_COLUMNS, value)))
+        for value in values
+    ])
+    db.flush()
+
+
+def bulk_insert_monthly_schedules(
+    db: Session,
+    rows: Iterable[Dict[str, Any]],
+    mode: Optional[str] = None
+) -> int:
+    """
+    批次寫入月度排班記錄（不提交交易）
+
+    依 mode（預設為 settings.SCHEDULE_BULK_WRITE_MODE）選擇 COPY、多列 INSERT 或 ORM；
+    COPY / INSERT 失敗時會回滾到保存點並改用下一種方式。
+
+    Returns:
+        寫入的記錄數
+    """
+    values = _normalize(rows)
+    if not values:
+        return 0
+
+    mode = (mode or settings.SCHEDULE_BULK_WRITE_MODE or 'copy').lower()
+    if mode not in WRITE_MODES:
+        logger.warning(f"未知的排班批次寫入方式 {mode}，改用 insert")
+        mode = 'insert'
+
+    if mode == 'copy' and not _supports_copy(db):
+        mode = 'insert'
+
+    # 已有待寫入的 ORM 變更（如刪除舊記錄）需先送出，確保批次寫入在其之後執行
+    db.flush()
+
+    writers = []
+    if mode == 'copy':
+        writers.append(('copy', _write_copy))
+    if mode in ('copy', 'insert'):
+        writers.append(('insert', _write_insert))
+
+    for name, writer in writers:
+        savepoint = db.begin_nested()
+        try:
+            writer(db, values)
+            savepoint.commit()
+            return len(values)
+        except Exception as e:
+            savepoint.rollback()
+            logger.warning(f"以 {name} 批次寫入排班記錄失敗，改用下一種方式: {str(e)}")
+
+    _write_orm(db, values)
+    return len(values)
+
+
+# 增量保存時比較的欄位
+DIFF_COLUMNS = ('shift_type', 'area_code', 'special_type')
+
+
+def apply_month_diff(
+    db: Session,
+    version_id: int,
+    rows: Iterable[Dict[str, Any]],
+    mode: Optional[str] = None
+) -> Dict[str, int]:
+    """
+    以增量方式將整月排班保存到指定版本（不提交交易）
+
+    以 (user_id, date) 為鍵比較 shift_type、area_code、special_type，
+    只對新增、變更與不再存在的記錄執行 INSERT / UPDATE / DELETE，
+    未變更的記錄不會被寫入，updated_at 也不會變動。
+
+    Returns:
+        {"inserted": n, "updated": n, "deleted": n, "unchanged": n}
+    """
+    existing = {}
+    delete_ids = []
+    stored_rows = db.query(
+        MonthlySchedule.id,
+        MonthlySchedule.user_id,
+        MonthlySchedule.date,
+        MonthlySchedule.shift_type,
+        MonthlySchedule.area_code,
+        MonthlySchedule.special_type
+    ).filter(
+        MonthlySchedule.version_id == version_id
+    ).order_by(MonthlySchedule.id.desc()).all()
+
+    for stored in stored_rows:
+        key = (stored.user_id, stored.date)
+        if key in existing:
+            # 同一人同一天的重複記錄只保留 id 最大（最新寫入）的一筆，與去重遷移及版本差異比對一致
+            delete_ids.append(stored.id)
+        else:
+            existing[key] = stored
+
+    inserts = []
+    updates = []
+    unchanged = 0
+    seen = set()
+    for row in rows:
+        key = (row['user_id'], row['date'])
+        if key in seen:
+            continue
+        seen.add(key)
+
+        stored = existing.pop(key, None)
+        if stored is None:
+            inserts.append(dict(row, version_id=version_id))
+        elif any(getattr(stored, column) != row.get(column) for column in DIFF_COLUMNS):
+            update_values = {column: row.get(column) for column in DIFF_COLUMNS}
+            update_values['id'] = stored.id
+            updates.append(update_values)
+        else:
+            unchanged += 1
+
+    delete_ids.extend(stored.id for stored in existing.values())
+
+    if delete_ids:
+        db.query(MonthlySchedule).filter(
+            MonthlySchedule.id.in_(delete_ids)
+        ).delete(synchronize_session=False)
+
+    if updates:
+        now = datetime.now()
+        for update_values in updates:
+            update_values['updated_at'] = now
+        # 依主鍵的 ORM 批次 UPDATE（executemany）
+        db.execute(update(MonthlySchedule), updates)
+
+    bulk_insert_monthly_schedules(db, inserts, mode=mode)
+
+    return {
+        "inserted": len(inserts),
+        "updated": len(updates),
+        "deleted": len(delete_ids),
+        "unchanged": unchanged,
+    }
@@ -0,0 +1,156 @@
+"""
+緊湊月班表列服務
+
+為每個 (版本, 人員) 維護一列 monthly_schedule_rows，保存整月的班次與區域代碼陣列，
+讀取月班表時只需讀取約 30 列，而非約 1000 筆逐日記錄。
+逐日的 monthly_schedules 仍是主要資料來源：每次寫入後由本模組同步更新緊湊列，
+既有資料由 migration 回填。讀取時不寫入，缺少緊湊列時呼叫端改讀逐日記錄。
+功能關閉期間寫入的版本會刪除整個版本的緊湊列，重新開啟後不會讀到過期的內容。
+"""
+
+import calendar
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models.schedule import MonthlySchedule, MonthlyScheduleRow, ScheduleVersion
+
+logger = logging.getLogger(__name__)
+
+
+def version_days_in_month(version: ScheduleVersion) -> int:
+    """由版本的 YYYYMM 月份字串計算當月天數，無法解析時返回 31"""
+    try:
+        return calendar.monthrange(int(version.month[:4]), int(version.month[4:6]))[1]
+    except (TypeError, ValueError, IndexError):
+        return 31
+
+
+def _get(row: Any, column: str) -> Any:
+    return row.get(column) if isinstance(row, dict) else getattr(row, column)
+
+
+def pack_rows(rows: Iterable[Any], days_in_month: int) -> Dict[int, Dict[str, Any]]:
+    """
+    將逐日記錄（dict 或具有同名屬性的物件）打包為每位人員一列
+
+    沒有記錄的日期班次為 "O"、區域代碼為 None；
+    special_type 取該人員第一筆非空值，與逐日讀取時的規則一致。
+    """
+    packed: Dict[int, Dict[str, Any]] = {}
+    for row in rows:
+        user_id = _get(row, 'user_id')
+        entry = packed.get(user_id)
+        if entry is None:
+            entry = packed[user_id] = {
+                'shifts': ['O'] * days_in_month,
+                'area_codes': [None] * days_in_month,
+                'special_type': None,
+            }
+
+        day_index = _get(row, 'date').day - 1
+        if 0 <= day_index < days_in_month:
+            entry['shifts'][day_index] = _get(row, 'shift_type')
+            entry['area_codes'][day_index] = _get(row, 'area_code')
+
+        special_type = _get(row, 'special_type')
+        if special_type and not entry['special_type']:
+            entry['special_type'] = special_type
+    return packed
+
+
+def discard_packed_rows(db: Session, version: ScheduleVersion) -> None:
+    """刪除版本的所有緊湊列（不提交交易），之後讀取改用逐日記錄，直到整個版本再次寫入"""
+    db.query(MonthlyScheduleRow).filter(
+        MonthlyScheduleRow.version_id == version.id
+    ).delete(synchronize_session=False)
+
+
+def replace_packed_rows(
+    db: Session,
+    version: ScheduleVersion,
+    rows: Iterable[Any],
+    user_ids: Optional[Iterable[int]] = None
+) -> int:
+    """
+    以給定的逐日記錄覆寫版本的緊湊列（不提交交易）
+
+    Args:
+        rows: 該版本（或 user_ids 範圍內）完整的逐日記錄
+        user_ids: 只覆寫這些人員的緊湊列；None 表示覆寫整個版本
+
+    Returns:
+        寫入的緊湊列數
+    """
+    if not settings.SCHEDULE_PACKED_ROWS_ENABLED:
+        # 功能關閉時不維護緊湊列，整個版本的緊湊列都已不再可信
+        discard_packed_rows(db, version)
+        return 0
+
+    packed = pack_rows(rows, version_days_in_month(version))
+
+    query = db.query(MonthlyScheduleRow).filter(MonthlyScheduleRow.version_id == version.id)
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        if not user_ids:
+            return 0
+        query = query.filter(MonthlyScheduleRow.user_id.in_(user_ids))
+    query.delete(synchronize_session=False)
+
+    if packed:
+        db.execute(insert(MonthlyScheduleRow.__table__).values([
+            {
+                'version_id': version.id,
+                'user_id': user_id,
+                'shifts': entry['shifts'],
+                'area_codes': entry['area_codes'],
+                'special_type': entry['special_type'],
+            }
+            for user_id, entry in packed.items()
+        ]))
+    return len(packed)
+
+
+def refresh_packed_rows(
+    db: Session,
+    version: ScheduleVersion,
+    user_ids: Optional[Iterable[int]] = None
+) -> int:
+    """由資料庫中的逐日記錄重建版本（或指定人員）的緊湊列（不提交交易）"""
+    if not settings.SCHEDULE_PACKED_ROWS_ENABLED:
+        discard_packed_rows(db, version)
+        return 0
+
+    db.flush()
+    query = db.query(
+        MonthlySchedule.user_id,
+        MonthlySchedule.date,
+        MonthlySchedule.shift_type,
+        MonthlySchedule.area_code,
+        MonthlySchedule.special_type
+    ).filter(MonthlySchedule.version_id == version.id)
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        query = query.filter(MonthlySchedule.user_id.in_(user_ids))
+
+    rows = query.order_by(MonthlySchedule.date, MonthlySchedule.id).all()
+    return replace_packed_rows(db, version, rows, user_ids=user_ids)
+
+
+def load_packed_rows(db: Session, version: ScheduleVersion) -> Optional[List[MonthlyScheduleRow]]:
+    """
+    讀取版本的緊湊列
+
+    功能關閉或版本尚無緊湊列時返回 None，由呼叫端改讀逐日記錄。
+    讀取路徑不重建緊湊列：同時開啟同一月份的多個請求若都寫入，會違反 (version_id, user_id) 唯一限制。
+    """
+    if not settings.SCHEDULE_PACKED_ROWS_ENABLED:
+        return None
+
+    rows = db.query(MonthlyScheduleRow).filter(
+        MonthlyScheduleRow.version_id == version.id
+    ).all()
+    return rows or None
@@ -0,0 +1,99 @@
+"""
+排班版本解析服務
+
+各排班路由都需要「某月份的最新版本」。此處以 (month, id) 複合索引查詢，
+並在行程內快取 月份 -> 最新版本ID，命中時只需一次主鍵查詢（通常直接由 Session 取得）。
+本行程建立新版本時以 remember() 更新快取；其他 worker 建立的版本在 TTL 到期後生效。
+"""
+
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models.schedule import ScheduleVersion
+
+
+class LatestVersionResolver:
+    """月份 -> 最新排班版本的解析器"""
+
+    def __init__(self, ttl: Optional[int] = None):
+        self.ttl = settings.SCHEDULE_VERSION_CACHE_TTL_SECONDS if ttl is None else ttl
+        self._entries: Dict[str, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def _cached_id(self, month_str: str) -> Optional[int]:
+        with self._lock:
+            item = self._entries.get(month_str)
+            if item is None:
+                return None
+            expires_at, version_id = item
+            if expires_at < time.monotonic():
+                del self._entries[month_str]
+                return None
+            return version_id
+
+    def _store(self, month_str: str, version_id: int) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[month_str] = (time.monotonic() + self.ttl, version_id)
+
+    def resolve(self, db: Session, month_str: str) -> Optional[ScheduleVersion]:
+        """取得月份（YYYYMM）的最新版本，沒有版本時返回 None"""
+        version_id = self._cached_id(month_str)
+        if version_id is not None:
+            version = db.get(ScheduleVersion, version_id)
+            if version is not None and version.month == month_str:
+                return version
+            self.invalidate(month_str)
+
+        version = db.query(ScheduleVersion).filter(
+            ScheduleVersion.month == month_str
+        ).order_by(ScheduleVersion.id.desc()).first()
+        if version is not None:
+            self._store(month_str, version.id)
+        return version
+
+    def resolve_many(self, db: Session, months: Iterable[str]) -> Dict[str, ScheduleVersion]:
+        """一次解析多個月份的最新版本，未快取的月份以單一查詢取得"""
+        resolved: Dict[str, ScheduleVersion] = {}
+        missing = []
+        for month_str in set(months):
+            version_id = self._cached_id(month_str)
+            version = db.get(ScheduleVersion, version_id) if version_id is not None else None
+            if version is not None and version.month == month_str:
+                resolved[month_str] = version
+            else:
+                missing.append(month_str)
+
+        if missing:
+            for version in db.query(ScheduleVersion).filter(
+                ScheduleVersion.month.in_(missing)
+            ).order_by(ScheduleVersion.id.desc()).all():
+                if version.month not in resolved:
+                    resolved[version.month] = version
+                    self._store(version.month, version.id)
+        return resolved
+
+    def remember(self, version: ScheduleVersion) -> None:
+        """新版本建立（並提交）後呼叫，使該月份直接解析到新版本"""
+        self.invalidate(version.month)
+        self._store(version.month, version.id)
+
+    def invalidate(self, month_str: Optional[str] = None) -> None:
+        with self._lock:
+            if month_str is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(month_str, None)
+
+
+# 全局最新版本解析器
+latest_version_resolver = LatestVersionResolver()
+
+
+def get_latest_version(db: Session, month_str: str) -> Optional[ScheduleVersion]:
+    return latest_version_resolver.resolve(db, month_str)
@@ -0,0 +1,54 @@
+"""
+HTTP 條件式請求工具
+提供 ETag 產生與 If-None-Match 比對，讓內容未變時回應 304 Not Modified
+"""
+
+import hashlib
+import json
+from typing import Any
+
+from fastapi import Request, Response
+
+# 客戶端可快取，但每次使用前都必須以 ETag 向伺服器驗證
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts: Any) -> str:
+    """由多個組成部分產生強 ETag（含雙引號）"""
+    raw = ":".join(str(part) for part in parts)
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest() + '"'
+
+
+def content_digest(content: Any) -> str:
+    """計算可 JSON 序列化內容的摘要，用於以回應內容產生 ETag"""
+    raw = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """檢查請求的 If-None-Match 是否包含指定的 ETag（依規範採弱比對）"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def set_etag_headers(response: Response, etag: str) -> None:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = REVALIDATE_CACHE_CONTROL
+
+
+def not_modified(etag: str) -> Response:
+    """產生不含內容的 304 回應"""
+    response = Response(status_code=304)
+    set_etag_headers(response, etag)
+    return response
@@ -19,9 +19,10 @@ from datetime import datetime
 from pathlib import Path
 
 from app.core.config import settings
-from app.core.database import engine, Base, create_tables
+from app.core.database import engine, async_engine, Base, create_tables
 from app.routes import routers
 from app.tasks.doctor_schedule_tasks import doctor_schedule_task_manager
+from app.services.schedule_batch import start_compute_pool, shutdown_compute_pool
 from app.utils.timezone import get_timezone_info
 
 # 設定時區為台灣時區 (UTC+8)
@@ -150,6 +151,9 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"啟動醫師班表定時任務失敗: {str(e)}")
     
+    # 建立多月份排班計算的常駐行程池
+    start_compute_pool()
+    
     yield
 
     # 關閉時執行
@@ -170,6 +174,18 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"停止定時任務時發生錯誤: {str(e)}")
 
+    # 關閉排班計算行程池
+    try:
+        shutdown_compute_pool()
+    except Exception as e:
+        logger.error(f"關閉排班計算行程池時發生錯誤: {str(e)}")
+
+    # 釋放非同步資料庫連線池
+    try:
+        await async_engine.dispose()
+    except Exception as e:
+        logger.error(f"關閉非同步資料庫連線池時發生錯誤: {str(e)}")
+
     logger.info("✅ 系統已安全關閉")
 
 app = FastAPI(
@@ -218,11 +234,12 @@ app.add_middleware(
         "X-Requested-With",
         "Access-Control-Request-Method",
         "Access-Control-Request-Headers",
-        "Cookie"  # 添加Cookie header
+        "Cookie",  # 添加Cookie header
+        "If-None-Match"  # 班表條件式請求
     ],
     # 重要：設置 preflight 緩存時間為 24 小時
     max_age=86400,  # 24小時內瀏覽器不會重複發送 preflight 請求
-    expose_headers=["Set-Cookie"]  # 確保Set-Cookie header被暴露
+    expose_headers=["Set-Cookie", "ETag"]  # 確保Set-Cookie與ETag header被暴露
 )
 
 # 註冊所有路由
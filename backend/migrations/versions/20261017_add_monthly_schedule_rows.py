@@ -0,0 +1,36 @@
+"""add monthly_schedule_rows table
+
+Revision ID: 20261017_add_monthly_schedule_rows
+Revises: 20251211_add_line_accounts
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "20261017_add_monthly_schedule_rows"
+down_revision = "20251211_add_line_accounts"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "monthly_schedule_rows",
+        sa.Column("id", sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column("version_id", sa.Integer, sa.ForeignKey("schedule_versions.id"), nullable=False),
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("shifts", sa.JSON, nullable=True),
+        sa.Column("area_codes", sa.JSON, nullable=True),
+        sa.Column("special_type", sa.String, nullable=True),
+        sa.Column("created_at", sa.DateTime, server_default=sa.func.now(), nullable=True),
+        sa.Column("updated_at", sa.DateTime, server_default=sa.func.now(), nullable=True),
+        sa.UniqueConstraint("version_id", "user_id"),
+    )
+    op.create_index("ix_monthly_schedule_rows_id", "monthly_schedule_rows", ["id"])
+
+
+def downgrade():
+    op.drop_index("ix_monthly_schedule_rows_id", table_name="monthly_schedule_rows")
+    op.drop_table("monthly_schedule_rows")
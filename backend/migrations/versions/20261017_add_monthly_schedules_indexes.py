@@ -0,0 +1,50 @@
+"""add composite indexes on monthly_schedules
+
+Revision ID: 20261017_add_monthly_schedules_indexes
+Revises: 20261017_add_schedule_versions_month_index
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "20261017_add_monthly_schedules_indexes"
+down_revision = "20261017_add_schedule_versions_month_index"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 建立唯一索引前移除同一版本同一人同一天的重複記錄（保留 id 最大、也就是讀取時生效的一筆）
+    op.execute(
+        sa.text(
+            """
+            DELETE FROM monthly_schedules a
+            USING monthly_schedules b
+            WHERE a.version_id = b.version_id
+              AND a.user_id = b.user_id
+              AND a.date = b.date
+              AND a.id < b.id
+            """
+        )
+    )
+
+    # (version_id, user_id, date) 同時涵蓋 version_id = ? 與 updateShift 的三欄等值查詢
+    op.create_index(
+        "uq_monthly_schedules_version_user_date",
+        "monthly_schedules",
+        ["version_id", "user_id", "date"],
+        unique=True,
+    )
+    op.create_index(
+        "ix_monthly_schedules_user_date",
+        "monthly_schedules",
+        ["user_id", "date"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index("ix_monthly_schedules_user_date", table_name="monthly_schedules")
+    op.drop_index("uq_monthly_schedules_version_user_date", table_name="monthly_schedules")
@@ -0,0 +1,46 @@
+"""add overtime_score_balances table
+
+Revision ID: 20261017_add_overtime_score_balances
+Revises: 20261017_add_monthly_schedules_indexes
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "20261017_add_overtime_score_balances"
+down_revision = "20261017_add_monthly_schedules_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "overtime_score_balances",
+        sa.Column("id", sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("total_score", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("months_count", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime, server_default=sa.func.now(), nullable=True),
+        sa.UniqueConstraint("user_id"),
+    )
+    op.create_index("ix_overtime_score_balances_id", "overtime_score_balances", ["id"])
+
+    # 以既有的月度分數建立初始累計分數
+    op.execute(
+        sa.text(
+            """
+            INSERT INTO overtime_score_balances (user_id, total_score, months_count, updated_at)
+            SELECT user_id, COALESCE(SUM(total_score), 0), COUNT(*), now()
+            FROM overtime_monthly_scores
+            WHERE user_id IS NOT NULL
+            GROUP BY user_id
+            """
+        )
+    )
+
+
+def downgrade():
+    op.drop_index("ix_overtime_score_balances_id", table_name="overtime_score_balances")
+    op.drop_table("overtime_score_balances")
@@ -0,0 +1,75 @@
+"""add unique indexes on overtime_records and overtime_monthly_scores
+
+Revision ID: 20261017_add_overtime_unique_indexes
+Revises: 20261017_add_overtime_score_balances
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "20261017_add_overtime_unique_indexes"
+down_revision = "20261017_add_overtime_score_balances"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 建立唯一索引前移除重複記錄（保留 id 最大、也就是最後寫入的一筆）
+    op.execute(
+        sa.text(
+            """
+            DELETE FROM overtime_records a
+            USING overtime_records b
+            WHERE a.user_id = b.user_id
+              AND a.date = b.date
+              AND a.id < b.id
+            """
+        )
+    )
+    op.execute(
+        sa.text(
+            """
+            DELETE FROM overtime_monthly_scores a
+            USING overtime_monthly_scores b
+            WHERE a.user_id = b.user_id
+              AND a.year = b.year
+              AND a.month = b.month
+              AND a.id < b.id
+            """
+        )
+    )
+
+    # 移除重複的月度分數後，累計分數需依剩下的月度分數重建
+    op.execute(sa.text("DELETE FROM overtime_score_balances"))
+    op.execute(
+        sa.text(
+            """
+            INSERT INTO overtime_score_balances (user_id, total_score, months_count, updated_at)
+            SELECT user_id, COALESCE(SUM(total_score), 0), COUNT(*), now()
+            FROM overtime_monthly_scores
+            WHERE user_id IS NOT NULL
+            GROUP BY user_id
+            """
+        )
+    )
+
+    # ON CONFLICT (user_id, date) / (user_id, year, month) 的衝突目標
+    op.create_index(
+        "uq_overtime_records_user_date",
+        "overtime_records",
+        ["user_id", "date"],
+        unique=True,
+    )
+    op.create_index(
+        "uq_overtime_monthly_scores_user_year_month",
+        "overtime_monthly_scores",
+        ["user_id", "year", "month"],
+        unique=True,
+    )
+
+
+def downgrade():
+    op.drop_index("uq_overtime_monthly_scores_user_year_month", table_name="overtime_monthly_scores")
+    op.drop_index("uq_overtime_records_user_date", table_name="overtime_records")
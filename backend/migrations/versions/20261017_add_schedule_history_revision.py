@@ -0,0 +1,73 @@
+"""add revision numbering and latest state for schedule version history
+
+Revision ID: 20261017_add_schedule_history_revision
+Revises: 20261017_backfill_monthly_schedule_rows
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "20261017_add_schedule_history_revision"
+down_revision = "20261017_backfill_monthly_schedule_rows"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("schedule_version_diffs", sa.Column("revision", sa.Integer, nullable=True))
+    op.add_column(
+        "schedule_versions",
+        sa.Column("history_revision", sa.Integer, nullable=False, server_default="0"),
+    )
+    op.add_column("schedule_versions", sa.Column("history_cells", sa.JSON, nullable=True))
+
+    # 既有的歷史修訂以 diff_data 中的編號填入新欄位
+    op.execute(
+        sa.text(
+            """
+            UPDATE schedule_version_diffs
+            SET revision = (diff_data->>'revision')::integer
+            WHERE version_id = base_version_id
+              AND diff_data->>'type' = 'history'
+            """
+        )
+    )
+    # 最新狀態（history_cells）保持 NULL，下次寫入時重播一次後即由版本列延續
+    op.execute(
+        sa.text(
+            """
+            UPDATE schedule_versions v
+            SET history_revision = h.max_revision
+            FROM (
+                SELECT version_id, MAX(revision) AS max_revision
+                FROM schedule_version_diffs
+                WHERE revision IS NOT NULL
+                GROUP BY version_id
+            ) h
+            WHERE v.id = h.version_id
+            """
+        )
+    )
+
+    op.create_index(
+        "uq_schedule_version_diffs_version_revision",
+        "schedule_version_diffs",
+        ["version_id", "revision"],
+        unique=True,
+    )
+    op.create_index(
+        "ix_schedule_version_diffs_version_base",
+        "schedule_version_diffs",
+        ["version_id", "base_version_id"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index("ix_schedule_version_diffs_version_base", table_name="schedule_version_diffs")
+    op.drop_index("uq_schedule_version_diffs_version_revision", table_name="schedule_version_diffs")
+    op.drop_column("schedule_versions", "history_cells")
+    op.drop_column("schedule_versions", "history_revision")
+    op.drop_column("schedule_version_diffs", "revision")
@@ -0,0 +1,26 @@
+"""add updated_at to schedule_versions
+
+Revision ID: 20261017_add_schedule_version_updated_at
+Revises: 20261017_add_monthly_schedule_rows
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "20261017_add_schedule_version_updated_at"
+down_revision = "20261017_add_monthly_schedule_rows"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "schedule_versions",
+        sa.Column("updated_at", sa.DateTime, server_default=sa.func.now(), nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_column("schedule_versions", "updated_at")
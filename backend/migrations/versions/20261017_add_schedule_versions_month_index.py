@@ -0,0 +1,27 @@
+"""add composite index on schedule_versions (month, id)
+
+Revision ID: 20261017_add_schedule_versions_month_index
+Revises: 20261017_add_schedule_version_updated_at
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20261017_add_schedule_versions_month_index"
+down_revision = "20261017_add_schedule_version_updated_at"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "ix_schedule_versions_month_id",
+        "schedule_versions",
+        ["month", "id"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index("ix_schedule_versions_month_id", table_name="schedule_versions")
@@ -0,0 +1,61 @@
+"""backfill monthly_schedule_rows from monthly_schedules
+
+Revision ID: 20261017_backfill_monthly_schedule_rows
+Revises: 20261017_add_overtime_unique_indexes
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "20261017_backfill_monthly_schedule_rows"
+down_revision = "20261017_add_overtime_unique_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 讀取路徑不再重建緊湊列，既有版本在此一次回填；規則與 schedule_rows.pack_rows 相同：
+    # 沒有記錄的日期班次為 'O'、區域代碼為 NULL，special_type 取第一筆非空值
+    op.execute(
+        sa.text(
+            """
+            INSERT INTO monthly_schedule_rows (version_id, user_id, shifts, area_codes, special_type, created_at, updated_at)
+            SELECT p.version_id,
+                   p.user_id,
+                   json_agg(CASE WHEN d.id IS NULL THEN 'O' ELSE d.shift_type END ORDER BY g.day),
+                   json_agg(d.area_code ORDER BY g.day),
+                   p.special_type,
+                   now(),
+                   now()
+            FROM (
+                SELECT ms.version_id,
+                       ms.user_id,
+                       sv.month,
+                       (array_agg(ms.special_type ORDER BY ms.date, ms.id)
+                            FILTER (WHERE ms.special_type IS NOT NULL AND ms.special_type <> ''))[1] AS special_type
+                FROM monthly_schedules ms
+                JOIN schedule_versions sv ON sv.id = ms.version_id
+                WHERE ms.user_id IS NOT NULL
+                  AND sv.month ~ '^[0-9]{6}$'
+                GROUP BY ms.version_id, ms.user_id, sv.month
+            ) p
+            CROSS JOIN LATERAL generate_series(
+                1,
+                EXTRACT(DAY FROM to_date(p.month, 'YYYYMM') + INTERVAL '1 month' - INTERVAL '1 day')::int
+            ) AS g(day)
+            LEFT JOIN monthly_schedules d
+              ON d.version_id = p.version_id
+             AND d.user_id = p.user_id
+             AND EXTRACT(DAY FROM d.date)::int = g.day
+            GROUP BY p.version_id, p.user_id, p.special_type
+            ON CONFLICT (version_id, user_id) DO NOTHING
+            """
+        )
+    )
+
+
+def downgrade():
+    # 緊湊列可由逐日記錄重新產生，降版時不需移除
+    pass
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+"""
+在伺服器端執行加班自動分配（不需開啟前端頁面）
+用法：python3 allocate_overtime.py 2026-11 [2027-01] [--mode fill] [--no-zero-score-shifts] [--seed N] [--dry-run]
+
+未指定 --dry-run 時結果寫入 overtime_records 並提交。
+"""
+
+import argparse
+import json
+import sys
+import os
+import logging
+
+# 設置logger
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+# 將項目根目錄添加到路徑，確保可以導入應用模塊
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.core.database import SessionLocal
+from app.services.overtime_allocation import ALLOCATION_MODES, allocate_overtime
+from app.services.schedule_batch import month_range
+
+
+def parse_month(value: str):
+    year, month = value.split("-")
+    return int(year), int(month)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="依月班表自動分配加班")
+    parser.add_argument("start", type=parse_month, help="開始月份 YYYY-MM")
+    parser.add_argument("end", type=parse_month, nargs="?", help="結束月份 YYYY-MM（預設與開始月份相同）")
+    parser.add_argument("--mode", choices=ALLOCATION_MODES, default="full", help="full：全部重新分配；fill：只補齊缺少的班別")
+    parser.add_argument("--no-zero-score-shifts", action="store_true", help="不分配 E、F 班")
+    parser.add_argument("--seed", type=int, default=None, help="亂數種子（結果可重現）")
+    parser.add_argument("--dry-run", action="store_true", help="只輸出結果，不寫入資料庫")
+    args = parser.parse_args()
+
+    start = args.start
+    end = args.end or start
+    db = SessionLocal()
+    try:
+        result = allocate_overtime(
+            db,
+            month_range(start[0], start[1], end[0], end[1]),
+            mode=args.mode,
+            include_zero_score_shifts=not args.no_zero_score_shifts,
+            seed=args.seed,
+            dry_run=args.dry_run
+        )
+        if not args.dry_run:
+            db.commit()
+            logger.info(f"已寫入 {result['records_count']} 筆加班記錄")
+        for month in result["months"]:
+            print(json.dumps({
+                "year": month["year"],
+                "month": month["month"],
+                "new_assignments_count": month["new_assignments_count"],
+                "unfilled": month["unfilled"],
+                "statistics": month["statistics"]
+            }, ensure_ascii=False))
+        return 0
+    except ValueError as e:
+        logger.error(str(e))
+        db.rollback()
+        return 1
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
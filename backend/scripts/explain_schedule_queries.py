@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+"""
+檢查 monthly_schedules 熱門查詢的執行計畫，任一查詢對該表使用循序掃描時以非零狀態結束
+用法：python3 explain_schedule_queries.py [--seed 筆數]
+
+--seed 會在交易中寫入模擬排班資料並 ANALYZE，檢查完畢後整個交易回滾，不會留下資料。
+"""
+
+import argparse
+import sys
+import os
+import logging
+from datetime import date, timedelta
+
+# 設置logger
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+# 將項目根目錄添加到路徑，確保可以導入應用模塊
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import text
+
+from app.core.database import engine
+
+TABLE_NAME = "monthly_schedules"
+
+# 熱門查詢：(名稱, SQL)，參數以 :version_id / :user_id / :date 帶入
+HOT_QUERIES = [
+    (
+        "version_id = ?（月班表讀取、saveMonth 比對）",
+        "SELECT * FROM monthly_schedules WHERE version_id = :version_id",
+    ),
+    (
+        "(user_id, date, version_id)（updateShift）",
+        "SELECT * FROM monthly_schedules WHERE user_id = :user_id AND date = :date AND version_id = :version_id",
+    ),
+    (
+        "(user_id, date)（跨版本查詢個人班次）",
+        "SELECT * FROM monthly_schedules WHERE user_id = :user_id AND date = :date",
+    ),
+]
+
+
+def seed(connection, total_rows):
+    """以現有的人員建立模擬版本與排班記錄"""
+    user_ids = [row[0] for row in connection.execute(text("SELECT id FROM users ORDER BY id LIMIT 60"))]
+    if not user_ids:
+        raise RuntimeError("資料庫中沒有任何人員，無法建立模擬資料")
+
+    months = max(total_rows // (len(user_ids) * 30), 1)
+    start = date(2000, 1, 1)
+    inserted = 0
+    for month_index in range(months):
+        version_id = connection.execute(
+            text(
+                "INSERT INTO schedule_versions (version_number, month, notes, is_published) "
+                "VALUES (:number, :month, 'explain seed', false) RETURNING id"
+            ),
+            {"number": f"seed_{month_index}", "month": f"seed{month_index:04d}"},
+        ).scalar()
+        first_day = start + timedelta(days=30 * month_index)
+        rows = [
+            {"user_id": user_id, "date": first_day + timedelta(days=day), "version_id": version_id}
+            for user_id in user_ids
+            for day in range(30)
+        ]
+        connection.execute(
+            text(
+                "INSERT INTO monthly_schedules (user_id, date, shift_type, version_id) "
+                "VALUES (:user_id, :date, 'D', :version_id)"
+            ),
+            rows,
+        )
+        inserted += len(rows)
+    connection.execute(text(f"ANALYZE {TABLE_NAME}"))
+    logger.info(f"已寫入 {inserted} 筆模擬排班記錄")
+
+
+def find_seq_scans(plan):
+    """遞迴找出執行計畫中對 monthly_schedules 的循序掃描"""
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") == TABLE_NAME:
+        found.append(plan)
+    for child in plan.get("Plans", []):
+        found.extend(find_seq_scans(child))
+    return found
+
+
+def sample_params(connection):
+    row = connection.execute(
+        text("SELECT version_id, user_id, date FROM monthly_schedules WHERE version_id IS NOT NULL ORDER BY id DESC LIMIT 1")
+    ).first()
+    if row is None:
+        raise RuntimeError("monthly_schedules 沒有資料，請使用 --seed 建立模擬資料")
+    return {"version_id": row.version_id, "user_id": row.user_id, "date": row.date}
+
+
+def audit(seed_rows=0):
+    """返回發生循序掃描的查詢數量"""
+    failures = 0
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            if seed_rows:
+                seed(connection, seed_rows)
+            params = sample_params(connection)
+
+            for name, sql in HOT_QUERIES:
+                plan = connection.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), params).scalar()
+                root = plan[0]["Plan"]
+                if find_seq_scans(root):
+                    failures += 1
+                    logger.error(f"❌ {name}: 使用循序掃描")
+                else:
+                    logger.info(f"✅ {name}: {root.get('Node Type')} ({root.get('Index Name', '-')})")
+        finally:
+            transaction.rollback()
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="檢查 monthly_schedules 熱門查詢是否使用索引")
+    parser.add_argument("--seed", type=int, default=0, help="寫入的模擬排班記錄筆數（檢查後回滾）")
+    args = parser.parse_args()
+
+    failed = audit(args.seed)
+    if failed:
+        logger.error(f"{failed} 個查詢使用循序掃描")
+        sys.exit(1)
+    logger.info("所有熱門查詢皆使用索引")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+"""
+加班分數平衡模擬（蒙地卡羅）
+用法：python3 simulate_overtime_scores.py [--staff 27] [--months 12] [--trials 1000] [--attendance mixed]
+                                          [--table A=2,B=1,C=0.8,D=0.3,penalty=-0.365 ...] [--balance-penalty]
+                                          [--carry-over] [--seed N] [--json]
+
+可重複指定 --table 以相同亂數種子比較多個分數表；未指定時使用目前的正式分數表。
+"""
+
+import argparse
+import json
+import sys
+import os
+import time
+from dataclasses import replace
+
+# 將項目根目錄添加到路徑，確保可以導入應用模塊
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.overtime_simulation import (
+    ATTENDANCE_PATTERNS, ScoreTable, SimulationConfig, balanced_penalty, compare_score_tables
+)
+from app.services.overtime_scoring import NO_OVERTIME_PENALTY, SHIFT_SCORES
+
+
+def parse_table(value: str) -> ScoreTable:
+    """解析 A=2,B=1,...,penalty=-0.365，未指定的班別沿用正式分數"""
+    scores = dict(SHIFT_SCORES)
+    penalty = NO_OVERTIME_PENALTY
+    for item in filter(None, value.split(",")):
+        key, _, number = item.partition("=")
+        key = key.strip()
+        try:
+            number = float(number)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"分數格式錯誤: {item}")
+        if key.lower() == "penalty":
+            penalty = number
+        elif key.upper() in scores:
+            scores[key.upper()] = number
+        else:
+            raise argparse.ArgumentTypeError(f"未知的班別: {key}")
+    return ScoreTable(scores, penalty)
+
+
+def parse_attendance(value: str):
+    if value in ATTENDANCE_PATTERNS:
+        return ATTENDANCE_PATTERNS[value]
+    try:
+        return tuple(float(rate) for rate in value.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"出勤型態需為 {', '.join(ATTENDANCE_PATTERNS)} 或以逗號分隔的出勤率"
+        )
+
+
+def parse_month(value: str):
+    year, month = value.split("-")
+    return int(year), int(month)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="以蒙地卡羅模擬評估加班分數表的長期平衡與離散程度")
+    parser.add_argument("--staff", type=int, default=27, help="參與分配的人數")
+    parser.add_argument("--months", type=int, default=12, help="每次試驗模擬的月份數")
+    parser.add_argument("--trials", type=int, default=1000, help="試驗次數")
+    parser.add_argument("--start", type=parse_month, default=(2026, 1), help="開始月份 YYYY-MM")
+    parser.add_argument("--attendance", type=parse_attendance, default=ATTENDANCE_PATTERNS["normal"],
+                        help=f"出勤型態（{', '.join(ATTENDANCE_PATTERNS)}）或以逗號分隔的每人出勤率")
+    parser.add_argument("--table", type=parse_table, action="append", help="分數表，例如 A=2,B=1,penalty=-0.3（可重複）")
+    parser.add_argument("--balance-penalty", action="store_true", help="另外比較以期望值平衡的未加班負分")
+    parser.add_argument("--carry-over", action="store_true", help="以跨月累計分數決定分配順序")
+    parser.add_argument("--no-zero-score-shifts", action="store_true", help="不分配 E、F 班")
+    parser.add_argument("--seed", type=int, default=None, help="亂數種子（結果可重現）")
+    parser.add_argument("--json", action="store_true", help="以 JSON 輸出")
+    args = parser.parse_args()
+
+    tables = args.table or [ScoreTable()]
+    config = SimulationConfig(
+        staff_count=args.staff,
+        months=args.months,
+        trials=args.trials,
+        start_year=args.start[0],
+        start_month=args.start[1],
+        attendance=args.attendance,
+        score_table=tables[0],
+        carry_over=args.carry_over,
+        include_zero_score_shifts=not args.no_zero_score_shifts,
+        seed=args.seed
+    )
+
+    try:
+        if args.balance_penalty:
+            tables = tables + [
+                ScoreTable(table.scores, balanced_penalty(replace(config, score_table=table)))
+                for table in tables
+            ]
+            # 相同的分數表只模擬一次
+            tables = list({table.label(): table for table in tables}.values())
+        started_at = time.perf_counter()
+        summaries = compare_score_tables(config, tables)
+        elapsed = time.perf_counter() - started_at
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+
+    if args.json:
+        print(json.dumps({"elapsed_seconds": round(elapsed, 3), "results": summaries}, ensure_ascii=False))
+        return 0
+
+    print(f"模擬 {len(tables)} 個分數表 × {config.trials} 次試驗 × {config.months} 個月，耗時 {elapsed:.2f} 秒")
+    for summary in summaries:
+        print()
+        print(f"分數表: {summary['score_table']}")
+        print(f"  單月分數: 平均 {summary['monthly_mean']:.3f}，標準差 {summary['monthly_std']:.3f}，範圍 {summary['monthly_range']:.3f}")
+        print(f"  期末累計: 平均 {summary['final_mean']:.3f}，標準差 {summary['final_std']:.3f}，"
+              f"範圍 {summary['final_range']:.3f}，最大偏離 {summary['final_max_abs']:.3f}")
+        print(f"  每月趨勢: {summary['drift_per_month']:.3f}，未分配名額比例: {summary['unfilled_ratio']:.2%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
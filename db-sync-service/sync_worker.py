@@ -26,6 +26,7 @@ TABLE_SYNC_ORDER = [
     'formula_schedules',            # 依賴 users
     'monthly_schedules',            # 依賴 users
     'schedule_versions',            # 依賴 users
+    'monthly_schedule_rows',        # 依賴 users, schedule_versions
     'schedule_version_diffs',       # 依賴 schedule_versions
     'schedule_changes',             # 依賴 schedule_versions
     'shift_swap_requests',          # 依賴 users, schedules